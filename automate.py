@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# One entry point for the whole pipeline. Only the standard library is imported
+# at module level and every command imports what it needs when it runs, so
+# status and validate answer without loading torch, EasyOCR or the Google client.
+
+# Modules that must not be imported just to start the CLI or read results
+HEAVY_MODULES = ('torch', 'easyocr', 'gspread', 'google.oauth2', 'google_auth_oauthlib')
+# Modules checked by the startup command, and the cold import time each may take
+STARTUP_MODULES = ('automate', 'automate_2k', 'automate_sheet', 'pipeline', 'storage', 'validation')
+STARTUP_BUDGET_SECONDS = 1.0
+
+STARTUP_PROBE = '''
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+
+def count_files(folder, extensions=None):
+    if not os.path.isdir(folder):
+        return 0
+    return sum(1 for filename in os.listdir(folder)
+               if extensions is None or filename.lower().endswith(extensions))
+
+
+def pending_results(folder):
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, filename) for filename in sorted(os.listdir(folder))
+            if filename.endswith('.json')]
+
+
+def known_hashes(database_path, index_path):
+    # Hashes of games already logged, from whichever local stores exist.
+    # Neither is created if it isn't there yet.
+    hashes = set()
+    if os.path.exists(database_path):
+        from storage import SQLiteSink
+        store = SQLiteSink(database_path)
+        hashes |= store.hashes()
+        store.close()
+    if os.path.exists(index_path):
+        from automate_sheet import GameIndex
+        hashes |= GameIndex(index_path).hashes()
+    return hashes
+
+
+def status(args):
+    from automate_2k import IMAGE_EXTENSIONS, IMAGE_INPUT_FOLDER, IMAGE_OUTPUT_FOLDER, JSON_OUTPUT_FOLDER
+    from automate_sheet import GAME_INDEX_PATH, PROCESSED_FOLDER, REVIEW_FOLDER
+    from storage import DATABASE_PATH
+    from video_ingest import VIDEO_EXTENSIONS, VIDEO_INPUT_FOLDER
+    database_path = args.database or DATABASE_PATH
+
+    print(f'Screenshots waiting for OCR: {count_files(IMAGE_INPUT_FOLDER, IMAGE_EXTENSIONS)}')
+    print(f'Videos waiting for OCR: {count_files(VIDEO_INPUT_FOLDER, VIDEO_EXTENSIONS)}')
+    paths = pending_results(JSON_OUTPUT_FOLDER)
+    print(f'Results waiting for upload: {len(paths)}')
+    print(f'Results waiting for review: {len(pending_results(REVIEW_FOLDER))}')
+    print(f'Processed screenshots: {count_files(IMAGE_OUTPUT_FOLDER, IMAGE_EXTENSIONS)}, '
+          f'processed results: {len(pending_results(PROCESSED_FOLDER))}')
+
+    if os.path.exists(database_path):
+        from storage import SQLiteSink
+        store = SQLiteSink(database_path)
+        games = store.query('SELECT COUNT(*) FROM games')[1][0][0]
+        print(f'Local database: {games} games, last GameID {store.max_game_id()}')
+        store.close()
+
+    hashes = known_hashes(database_path, GAME_INDEX_PATH)
+    seen = {}
+    for path in paths:
+        with open(path, 'r') as json_file:
+            hash_value = json.load(json_file).get('hash')
+        if hash_value in hashes:
+            print(f'  {os.path.basename(path)}: already logged')
+        elif hash_value in seen:
+            print(f'  {os.path.basename(path)}: same game as {seen[hash_value]}')
+        seen.setdefault(hash_value, os.path.basename(path))
+    return 0
+
+
+def validate(args):
+    from automate_2k import JSON_OUTPUT_FOLDER
+    from validation import result_problems
+
+    paths = args.files or pending_results(JSON_OUTPUT_FOLDER)
+    failed = 0
+    for path in paths:
+        try:
+            with open(path, 'r') as json_file:
+                problems = result_problems(json.load(json_file))
+        except (OSError, ValueError) as e:
+            problems = [f'could not be read: {e}']
+        if problems:
+            failed += 1
+            print(f'{path}:')
+            for problem in problems:
+                print(f'  {problem}')
+        elif args.verbose:
+            print(f'{path}: ok')
+    print(f'{len(paths) - failed} of {len(paths)} results passed')
+    return 1 if failed else 0
+
+
+def startup(args):
+    # Imports each module in a fresh interpreter so the measurement is a cold
+    # start; fails if one pulls in a heavy dependency or goes over the budget
+    failed = False
+    for module in STARTUP_MODULES:
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if output.returncode != 0:
+            print(f'{module}: import failed\n{output.stderr.strip()}')
+            failed = True
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        problems = []
+        if result['loaded']:
+            problems.append(f"imports {', '.join(result['loaded'])}")
+        if result['seconds'] > args.budget:
+            problems.append(f'over the {args.budget:.2f}s budget')
+        print(f"{module}: {result['seconds'] * 1000:.0f} ms" + (f" ({'; '.join(problems)})" if problems else ''))
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NBA 2K box score pipeline.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # Their options, --help included, are passed on to the scripts' own parsers
+    subparsers.add_parser('ocr', help='Read box scores from screenshots (automate_2k.py)', add_help=False)
+    subparsers.add_parser('upload', help='Log results to the sheets and database (automate_sheet.py)',
+                          add_help=False)
+    subparsers.add_parser('run', help='Read screenshots and log them in one resumable pass (pipeline.py)',
+                          add_help=False)
+
+    status_parser = subparsers.add_parser('status', help='Show pending files and games already logged')
+    status_parser.add_argument('--database', help='Local SQLite database (default: ./boxscores.sqlite3)')
+
+    validate_parser = subparsers.add_parser('validate', help='Check result JSON files for missing fields and '
+                                                             'stats that do not add up')
+    validate_parser.add_argument('files', nargs='*', help='Files to check (default: results waiting for upload)')
+    validate_parser.add_argument('--verbose', action='store_true', help='Also list files that passed')
+
+    startup_parser = subparsers.add_parser('startup', help='Check that the CLI and light modules still start '
+                                                           'quickly')
+    startup_parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_SECONDS,
+                                help='Seconds a cold import may take')
+
+    args, extra_args = parser.parse_known_args()
+    if extra_args and args.command not in ('ocr', 'upload', 'run'):
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+    if args.command == 'ocr':
+        import automate_2k
+        automate_2k.main(extra_args)
+    elif args.command == 'upload':
+        import automate_sheet
+        automate_sheet.main(extra_args)
+    elif args.command == 'run':
+        import pipeline
+        pipeline.main(extra_args)
+    elif args.command == 'status':
+        sys.exit(status(args))
+    elif args.command == 'validate':
+        sys.exit(validate(args))
+    else:
+        sys.exit(startup(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,137 +1,183 @@
 import os
+import sys
 import json
 import shutil
 import re
+import math
 import numpy as np
 from PIL import Image
-import easyocr
-import torch
 import logging
 import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import time
 import cv2
+from digit_classifier import DigitClassifier
+from metrics import add_metrics_arguments, enable_from_args, export_from_args, metrics
+from video_ingest import (SCAN_INTERVAL, VIDEO_INPUT_FOLDER, VIDEO_OUTPUT_FOLDER, BoxScoreTemplate,
+                          VideoScanner)
+from validation import (MAX_CANDIDATES, MAX_REPAIR_CELLS, REPAIR_ROUNDS, best_combination, checked_regions, derived_cells,
+                        derived_points, find_violations, format_cell, parse_cell, rank_suspects)
+from records import GameRecord, write_record
+from layout import ANCHOR_PATH, Alignment, Anchor, Layout, content_bounds
+from automate_sheet import REVIEW_FOLDER
+from ocr_cache import RegionCache, ResultCache, content_hash, layout_key, region_key, scoreboard_thumbnails
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+# torch and easyocr take seconds to import, so they are only imported by the
+# code that runs the model; reading, formatting and validating results don't.
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-PLAYERS = 10
-TEAM1_QUARTERS = 4
-TEAM2_QUARTERS = 4
-
 JSON_OUTPUT_FOLDER = './toProcess/json/'
 IMAGE_INPUT_FOLDER = './toProcess/images/'
 IMAGE_OUTPUT_FOLDER = './processed/images/'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+NUMERIC_SCALE_FACTOR = 2
+NUMERIC_BLUR_KERNEL = (5, 5)
+# Upscale factors for re-reading cells that failed validation
+REREAD_SCALE_FACTORS = (3, 4)
+# Most channels one Mat can have (CV_CN_MAX): 512 up to OpenCV 4 and 128 from
+# OpenCV 5. The Python bindings don't export the constant.
+MAT_MAX_CHANNELS = getattr(cv2, 'CV_CN_MAX', 512 if int(cv2.__version__.split('.')[0]) < 5 else 128)
+
+OCR_LANGUAGES = ['en']
+DIGIT_MIN_CONFIDENCE = 0.3
+
+DEVICES = ('auto', 'cuda', 'cpu')
+
+def select_device(preference='auto'):
+    # Resolve 'auto'/'cuda'/'cpu' to the device that can actually be used
+    if preference not in DEVICES:
+        raise ValueError(f"Unknown device '{preference}', expected one of {DEVICES}")
+    if preference == 'cpu':
+        logging.info('Using CPU for OCR')
+        return 'cpu'
+    import torch
+    cuda_available = torch.cuda.is_available()
+    if preference == 'cuda' and not cuda_available:
+        logging.warning('CUDA was requested but is not available, falling back to CPU')
+    if preference != 'cpu' and cuda_available:
+        logging.info(f"Using GPU: {torch.cuda.get_device_name(0)}")
+        return 'cuda'
+    logging.info('Using CPU for OCR')
+    return 'cpu'
+
+def configure_torch_threads(intra_op_threads=None, inter_op_threads=None):
+    if not intra_op_threads and not inter_op_threads:
+        return
+    import torch
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        # Can only be set once, before any inter-op parallel work has run
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            logging.warning('torch inter-op threads were already configured, keeping the existing value')
+
+class ReaderPool:
+    # One warm easyocr.Reader per (languages, device, quantize) in this process.
+    # Worker processes get their own pool since class state is not shared.
+    _readers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, languages=None, device='cpu', quantize=False):
+        key = (tuple(languages or OCR_LANGUAGES), device, quantize)
+        reader = cls._readers.get(key)
+        if reader is None:
+            with cls._lock:
+                reader = cls._readers.get(key)
+                if reader is None:
+                    import easyocr
+                    logging.info(f"Loading EasyOCR model (languages={list(key[0])}, device={device}, "
+                                 f"quantize={quantize})")
+                    reader = easyocr.Reader(list(key[0]), gpu=device == 'cuda')
+                    if quantize:
+                        cls.quantize_recognizer(reader)
+                    cls._readers[key] = reader
+        return reader
 
-BASE_X_PLAYER = 1219
-PLAYER_Y_COORDINATES = [520, 602, 683, 765, 843, 1148, 1233, 1318, 1398, 1479]
-
-PLAYER_WIDTHS = {
-    'name': 485,
-    'grade': 105,
-    'points': 135,
-    'rebounds': 135,
-    'assists': 135,
-    'steals': 135,
-    'blocks': 135,
-    'fouls': 135,
-    'tos': 135,
-    'FGMFGA': 205,
-    '3PM3PA': 205,
-    'FTMFTA': 205,
-}
-
-PLAYER_X_OFFSETS = {
-    'name': 0,
-    'grade': 480,
-    'points': 620,
-    'rebounds': 777,
-    'assists': 923,
-    'steals': 1075,
-    'blocks': 1224,
-    'fouls': 1368,
-    'tos': 1513,
-    'FGMFGA': 1665,
-    '3PM3PA': 1898,
-    'FTMFTA': 2099,
-}
-
-PLAYER_HEIGHTS = 77
-PLAYER_NAME_HEIGHT = 81
-
-BASE_X_TEAM = 317
-BASE_Y_TEAM1 = 778
-BASE_Y_TEAM2 = 1115
-X_OFFSET_TEAM = 110
-TEAM_QUARTER_WIDTH = 85
-TEAM_QUARTER_HEIGHT = 145
-
-# Check GPU availability
-logging.info(f"CUDA available: {torch.cuda.is_available()}")
-logging.info(f"GPU: {torch.cuda.get_device_name(0)}")
+    @staticmethod
+    def quantize_recognizer(reader):
+        # Dynamic int8 quantization of the recognizer's LSTM and linear layers.
+        # Quantized kernels only exist on the CPU.
+        import torch
+        reader.recognizer = torch.ao.quantization.quantize_dynamic(
+            reader.recognizer, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8)
+        reader.recognizer.eval()
+
+    @classmethod
+    def shutdown(cls):
+        with cls._lock:
+            cls._readers.clear()
+        # Nothing to release if the model was never loaded
+        torch = sys.modules.get('torch')
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
 
 class OCRProcessor:
-    def __init__(self):
-        self.regions = self.generate_regions()
-
-    def generate_regions(self):
-        regions = []
-
-        # Generate player regions
-        for i in range(1, PLAYERS + 1):
-            current_y = PLAYER_Y_COORDINATES[i - 1]
-            regions.append({
-                'name': f'player{i}_name',
-                'x': BASE_X_PLAYER,
-                'y': current_y,
-                'width': PLAYER_WIDTHS['name'],
-                'height': PLAYER_NAME_HEIGHT
-            })
-            for stat, width in PLAYER_WIDTHS.items():
-                if stat != 'name':
-                    regions.append({
-                        'name': f'player{i}_{stat}',
-                        'x': BASE_X_PLAYER + PLAYER_X_OFFSETS[stat],
-                        'y': current_y,
-                        'width': width,
-                        'height': PLAYER_HEIGHTS
-                    })
-
-        # Generate team regions
-        for i in range(1, TEAM1_QUARTERS + 1):
-            regions.append({
-                'name': f'team1_q{i}',
-                'x': BASE_X_TEAM + (i - 1) * X_OFFSET_TEAM,
-                'y': BASE_Y_TEAM1,
-                'width': TEAM_QUARTER_WIDTH,
-                'height': TEAM_QUARTER_HEIGHT
-            })
-
-        for i in range(1, TEAM2_QUARTERS + 1):
-            regions.append({
-                'name': f'team2_q{i}',
-                'x': BASE_X_TEAM + (i - 1) * X_OFFSET_TEAM,
-                'y': BASE_Y_TEAM2,
-                'width': TEAM_QUARTER_WIDTH,
-                'height': TEAM_QUARTER_HEIGHT
-            })
-
-        return regions
-
-    def crop_and_save_regions(self, image_path):
-        image = Image.open(image_path)
-        width, height = image.size
-
-        cropped_images = []
-        region_names = []
-
-        for region in self.regions:
-            left = int(region['x'] * width / 3840)
-            upper = int(region['y'] * height / 2160)
-            right = left + int(region['width'] * width / 3840)
-            lower = upper + int(region['height'] * height / 2160)
-            cropped_image = image.crop((left, upper, right, lower))
-            cropped_images.append(cropped_image)
-            region_names.append(region['name'])
-
-        return cropped_images, region_names
+    def __init__(self, languages=None, device='cpu', quantize=False, batched=False, use_cache=False, region_cache=None,
+                 digit_classifier=None, min_digit_confidence=DIGIT_MIN_CONFIDENCE,
+                 image_output_folder=IMAGE_OUTPUT_FOLDER, validate=False, layout=None, anchor=None):
+        self.languages = languages or OCR_LANGUAGES
+        self.device = device
+        # Quantized kernels are CPU-only, so the flag is ignored on the GPU
+        self.quantize = quantize and device == 'cpu'
+        self.batched = batched
+        self.layout = layout or Layout.load()
+        # Without an anchor, frames are only trimmed of letterbox bars
+        self.anchor = anchor
+        self.regions = self.layout.regions
+        self.region_names = self.layout.region_names
+        self.result_cache = ResultCache(layout_key(self.regions)) if use_cache else None
+        self.region_cache = region_cache
+        self.digit_classifier = digit_classifier
+        self.min_digit_confidence = min_digit_confidence
+        self.image_output_folder = image_output_folder
+        self.validate = validate
+        self.checked_regions = set(checked_regions())
+
+    @property
+    def reader(self):
+        return ReaderPool.get(self.languages, self.device, self.quantize)
+
+    def region_boxes(self, width, height):
+        return self.layout.boxes(width, height)
+
+    def align(self, image):
+        content = content_bounds(image, self.layout.reference_size)
+        if self.anchor is None:
+            return Alignment(content)
+        with metrics.span('ocr.align'):
+            alignment = self.anchor.align(image, self.layout, content)
+        if alignment is None:
+            logging.warning('Box score layout not found in the screenshot, cropping it unaligned')
+            metrics.count('ocr.align_failed')
+            return Alignment(content)
+        return alignment
+
+    @staticmethod
+    def decode_image(data):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError('Could not decode image data')
+        return image
+
+    def crop_and_save_regions(self, image):
+        # Crops are views into the decoded BGR image, nothing is copied here
+        height, width = image.shape[:2]
+        cropped_images = [image[upper:lower, left:right]
+                          for left, upper, right, lower in self.layout.boxes(width, height, self.align(image))]
+        return cropped_images, list(self.region_names)
 
     @staticmethod
     def filter_text(text):
@@ -152,22 +198,43 @@ class OCRProcessor:
 
         return stat
 
-    def detect_text_in_image(self, image, region_name, allowlist=None):
-        reader = easyocr.Reader(['en'], gpu=True)
-    
-        # Convert PIL image to OpenCV format
-        img_cropped = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    
+    @staticmethod
+    def is_numeric_region(region_name):
+        return "name" not in region_name and "grade" not in region_name
+
+    @staticmethod
+    def preprocess_region(image, region_name):
         # Apply scaling and blurring only to numeric regions
-        if "name" not in region_name and "grade" not in region_name:
-            scale_factor = 2
-            upscaled = cv2.resize(img_cropped, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_LINEAR)
-            blur = cv2.blur(upscaled, (5, 5))
-            img_cropped = blur
-    
-        # Perform OCR on the processed image
-        result = reader.readtext(img_cropped, detail=0, allowlist=allowlist, text_threshold=0.3)
+        if OCRProcessor.is_numeric_region(region_name):
+            upscaled = cv2.resize(image, None, fx=NUMERIC_SCALE_FACTOR, fy=NUMERIC_SCALE_FACTOR,
+                                  interpolation=cv2.INTER_LINEAR)
+            return cv2.blur(upscaled, NUMERIC_BLUR_KERNEL)
+        return image
+
+    def preprocess_regions(self, cropped_images, region_names):
+        # Same as preprocess_region, but numeric crops of equal size are stacked
+        # along the channel axis so one resize and one blur cover the whole group.
+        processed_images = list(cropped_images)
+        groups = {}
+        for i, region_name in enumerate(region_names):
+            if self.is_numeric_region(region_name):
+                groups.setdefault(cropped_images[i].shape, []).append(i)
+
+        for (height, width, channels), indices in groups.items():
+            per_batch = max(1, MAT_MAX_CHANNELS // channels)
+            for start in range(0, len(indices), per_batch):
+                batch = indices[start:start + per_batch]
+                stacked = np.stack([cropped_images[i] for i in batch], axis=2).reshape(height, width, -1)
+                upscaled = cv2.resize(stacked, (width * NUMERIC_SCALE_FACTOR, height * NUMERIC_SCALE_FACTOR),
+                                      interpolation=cv2.INTER_LINEAR)
+                blurred = cv2.blur(upscaled, NUMERIC_BLUR_KERNEL)
+                blurred = blurred.reshape(blurred.shape[0], blurred.shape[1], len(batch), channels)
+                for i, image in zip(batch, np.ascontiguousarray(blurred.transpose(2, 0, 1, 3))):
+                    processed_images[i] = image
+        return processed_images
 
+    @staticmethod
+    def clean_detected_texts(result, region_name):
         detected_texts = ['0' if text.strip() == '' else text for text in result]
 
         # Remove spaces from numeric stats
@@ -175,6 +242,109 @@ class OCRProcessor:
             detected_texts = [text.replace(' ', '') for text in detected_texts]
         return detected_texts
 
+    def detect_text_in_image(self, image, region_name, allowlist=None):
+        return self.read_region(self.preprocess_region(image, region_name), region_name, allowlist)
+
+    def read_region(self, img_cropped, region_name, allowlist=None):
+        # Perform OCR on the processed image
+        import torch
+        start = time.perf_counter()
+        with torch.inference_mode():
+            result = self.reader.readtext(img_cropped, detail=0, allowlist=allowlist, text_threshold=0.3)
+        metrics.region(region_name, time.perf_counter() - start)
+        return self.clean_detected_texts(result, region_name)
+
+    def recognize_regions_batched(self, processed_images, region_names):
+        # The region boxes are already known, so skip CRAFT detection and run
+        # each allowlist group through the recognizer as one batch.
+        # Reader.recognize handles boxes one at a time on the CPU, so the
+        # crops are sized and batched here the way its GPU path does it.
+        import torch
+        from easyocr import easyocr as easyocr_module
+        from easyocr.recognition import get_text
+        from easyocr.utils import compute_ratio_and_resize
+        reader = self.reader
+        model_height = easyocr_module.imgH
+        groups = {}
+        for index, region_name in enumerate(region_names):
+            groups.setdefault(self.get_allowlist(region_name), []).append(index)
+
+        ocr_results = [None] * len(region_names)
+        for allowlist, indices in groups.items():
+            image_list = []
+            max_ratio = 1
+            for i in indices:
+                gray = cv2.cvtColor(processed_images[i], cv2.COLOR_BGR2GRAY)
+                height, width = gray.shape
+                if not height or not width:
+                    continue
+                resized, ratio = compute_ratio_and_resize(gray, width, height, model_height)
+                image_list.append((i, resized))
+                max_ratio = max(max_ratio, ratio)
+            if not image_list:
+                continue
+
+            ignore_char = ''.join(set(reader.character) - set(allowlist))
+            with metrics.span('ocr.recognize_batch'), torch.inference_mode():
+                result = get_text(reader.character, model_height, math.ceil(max_ratio) * model_height,
+                                  reader.recognizer, reader.converter, image_list, ignore_char,
+                                  batch_size=len(image_list), workers=0, device=reader.device)
+            for i, text, _confidence in result:
+                ocr_results[i] = self.clean_detected_texts([text], region_names[i])
+
+        # Crops the recognizer couldn't take read as empty, like an empty readtext result
+        return [result if result is not None else [] for result in ocr_results]
+
+    def recognize_regions(self, cropped_images, region_names):
+        with metrics.span('ocr.preprocess'):
+            processed_images = self.preprocess_regions(cropped_images, region_names)
+        ocr_results = [None] * len(region_names)
+
+        # Serve repeated cells (names, grades, common values) from the region cache
+        cache_keys = [None] * len(region_names)
+        if self.region_cache is not None:
+            with metrics.span('ocr.region_cache'):
+                for i, region_name in enumerate(region_names):
+                    cache_keys[i] = region_key(processed_images[i], self.get_allowlist(region_name))
+                    ocr_results[i] = self.region_cache.get(cache_keys[i])
+                    if ocr_results[i] is not None:
+                        metrics.region(region_name, cache_hits=1)
+
+        # Digit-only cells go to the template classifier; only names, grades
+        # and low-confidence cells are left for EasyOCR
+        if self.digit_classifier is not None:
+            with metrics.span('ocr.digit_classifier'):
+                for i, region_name in enumerate(region_names):
+                    allowlist = self.get_allowlist(region_name)
+                    if ocr_results[i] is not None or not self.digit_classifier.supports(allowlist):
+                        continue
+                    text, confidence = self.digit_classifier.classify(cropped_images[i], allowlist)
+                    if text and confidence >= self.min_digit_confidence:
+                        ocr_results[i] = self.clean_detected_texts([text], region_name)
+                    else:
+                        metrics.count('ocr.digit_fallbacks')
+                        metrics.region(region_name, digit_fallbacks=1)
+
+        missing = [i for i, result in enumerate(ocr_results) if result is None]
+        metrics.count('ocr.model_regions', len(missing))
+        if missing:
+            with metrics.span('ocr.model'):
+                if self.batched:
+                    recognized = self.recognize_regions_batched([processed_images[i] for i in missing],
+                                                                [region_names[i] for i in missing])
+                else:
+                    recognized = [self.read_region(processed_images[i], region_names[i],
+                                                   allowlist=self.get_allowlist(region_names[i]))
+                                  for i in missing]
+            for i, texts in zip(missing, recognized):
+                ocr_results[i] = texts
+                if self.region_cache is not None:
+                    self.region_cache.put(cache_keys[i], texts)
+
+        if self.region_cache is not None:
+            self.region_cache.checkpoint()
+        return ocr_results
+
     def format_ocr_results(self, ocr_results, region_names):
         formatted_output = {"players": [], "teams": {"team1_quarters": {}, "team2_quarters": {}}}
         current_player = None
@@ -246,35 +416,279 @@ class OCRProcessor:
 
         return formatted_output
 
-    def process_images(self, input_folder, output_folder):
-
-        for filename in os.listdir(input_folder):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                input_image_path = os.path.join(input_folder, filename)
-                logging.info(f'Processing file: {input_image_path}')
-
-                cropped_images, region_names = self.crop_and_save_regions(input_image_path)
-
-                ocr_results = []
-                for cropped_image, region_name in zip(cropped_images, region_names):
-                    allowlist = self.get_allowlist(region_name)
-                    ocr_text = self.detect_text_in_image(cropped_image, region_name, allowlist=allowlist)
-                    ocr_results.append(ocr_text)
+    @staticmethod
+    def reread_variants(image):
+        # Stronger preprocessing than the first pass: larger upscales,
+        # binarized both ways round, and a sharpened copy
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        for factor in REREAD_SCALE_FACTORS:
+            upscaled = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+            _, binary = cv2.threshold(upscaled, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            yield binary
+            yield cv2.bitwise_not(binary)
+        upscaled = cv2.resize(gray, None, fx=REREAD_SCALE_FACTORS[0], fy=REREAD_SCALE_FACTORS[0],
+                              interpolation=cv2.INTER_CUBIC)
+        yield cv2.filter2D(upscaled, -1, np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]]))
+
+    def reread_region(self, image, region_name):
+        # Texts read from the variants, most frequent first
+        allowlist = self.get_allowlist(region_name)
+        texts = []
+        if self.digit_classifier is not None and self.digit_classifier.supports(allowlist):
+            text, confidence = self.digit_classifier.classify(image, allowlist)
+            if text:
+                texts.append(text)
+        for variant in self.reread_variants(image):
+            texts.append(" ".join(self.read_region(variant, region_name, allowlist=allowlist)).strip())
+        metrics.count('ocr.cells_reread')
+        metrics.region(region_name, rereads=1)
+        return sorted(set(texts), key=lambda text: -texts.count(text))
+
+    def cell_value(self, region_name, text):
+        if region_name.endswith(('FGMFGA', '3PM3PA', 'FTMFTA')):
+            text = self.fix_slash_in_stats(text)
+        return parse_cell(region_name, text)
+
+    def validate_and_repair(self, cropped_images, region_names, ocr_results):
+        # Check the box score's own arithmetic; when it doesn't add up, re-read
+        # only the cells most likely to blame and keep the combination of
+        # values that breaks the fewest rules. Returns what is still wrong and
+        # what was changed; ocr_results is updated in place.
+        index = {region_name: i for i, region_name in enumerate(region_names)}
+        values = {region_name: self.cell_value(region_name, " ".join(ocr_results[i]).strip())
+                  for region_name, i in index.items() if region_name in self.checked_regions}
+        violations = find_violations(values)
+        if not violations:
+            return [], {}
+        metrics.count('ocr.validation_failures')
+
+        corrections = {}
+        reread = set()
+        for _ in range(REPAIR_ROUNDS):
+            suspects = [region_name for region_name in rank_suspects(violations) if region_name not in reread]
+            candidates = {}
+            for region_name in suspects[:MAX_REPAIR_CELLS]:
+                reread.add(region_name)
+                options = [(values[region_name], 0, 'ocr')]
+                for text in self.reread_region(cropped_images[index[region_name]], region_name):
+                    value = self.cell_value(region_name, text)
+                    if value is not None and value not in [option[0] for option in options]:
+                        options.append((value, 1, 'reread'))
+                if region_name.endswith('_points'):
+                    value = derived_points(region_name, values)
+                    if value is not None and value not in [option[0] for option in options]:
+                        options.append((value, 2, 'derived'))
+                if len(options) > 1:
+                    candidates[region_name] = options[:MAX_CANDIDATES]
+
+            for region_name, (value, source) in best_combination(values, candidates).items():
+                original = values[region_name]
+                values[region_name] = value
+                ocr_results[index[region_name]] = [format_cell(value)]
+                corrections[region_name] = {'from': format_cell(original) if original is not None else None,
+                                            'to': format_cell(value), 'source': source}
+                metrics.count('ocr.cells_corrected')
+            violations = find_violations(values)
+            if not violations:
+                break
+        return [description for description, _ in violations], corrections
 
-                formatted_results = self.format_ocr_results(ocr_results, region_names)
+    @staticmethod
+    def list_images(input_folder):
+        return [filename for filename in sorted(os.listdir(input_folder))
+                if filename.lower().endswith(IMAGE_EXTENSIONS)]
+
+    def process_image(self, image_path):
+        with open(image_path, 'rb') as image_file:
+            data = image_file.read()
+        return self.process_image_data(data)
+
+    def process_image_data(self, data):
+        key = None
+        if self.result_cache is not None:
+            key = content_hash(data)
+            cached = self.result_cache.get_exact(key)
+            if cached is not None:
+                logging.info('Screenshot found in the result cache, skipping OCR')
+                metrics.count('ocr.result_cache_hits')
+                return cached
+
+        formatted_results, thumbnails = self.ocr_image_data(data)
+        if self.result_cache is not None:
+            self.result_cache.put(key, thumbnails, formatted_results)
+        return formatted_results
+
+    def ocr_image_data(self, data):
+        with metrics.span('ocr.image'):
+            return self._ocr_image_data(data)
+
+    def _ocr_image_data(self, data):
+        with metrics.span('ocr.decode'):
+            image = self.decode_image(data)
+        with metrics.span('ocr.crop'):
+            cropped_images, region_names = self.crop_and_save_regions(image)
+
+        with metrics.span('ocr.hash'):
+            thumbnails = scoreboard_thumbnails(cropped_images)
+        if self.result_cache is not None:
+            cached = self.result_cache.get_similar(thumbnails)
+            if cached is not None:
+                logging.info('Near-identical screenshot found in the result cache, skipping OCR')
+                metrics.count('ocr.result_cache_similar_hits')
+                return cached, thumbnails
+
+        with metrics.span('ocr.recognize'):
+            ocr_results = self.recognize_regions(cropped_images, region_names)
+        violations, corrections = [], {}
+        if self.validate:
+            with metrics.span('ocr.validate'):
+                violations, corrections = self.validate_and_repair(cropped_images, region_names, ocr_results)
+        with metrics.span('ocr.format'):
+            formatted_results = self.format_ocr_results(ocr_results, region_names)
+
+        # Generate hash of the formatted results
+        results_json_str = json.dumps(formatted_results, sort_keys=True)
+        results_hash = hashlib.sha256(results_json_str.encode('utf-8')).hexdigest()
+        formatted_results['hash'] = results_hash
+
+        # The validation report is added after hashing so it never affects duplicate detection
+        for region_name, correction in corrections.items():
+            logging.info(f"Corrected {region_name}: {correction['from']} -> {correction['to']} "
+                         f"({correction['source']})")
+        for violation in violations:
+            logging.warning(f'Box score does not add up: {violation}')
+        if violations or corrections:
+            formatted_results['validation'] = {'violations': violations, 'corrections': corrections}
+        return formatted_results, thumbnails
 
-                # Generate hash of the formatted results
-                results_json_str = json.dumps(formatted_results, sort_keys=True)
-                results_hash = hashlib.sha256(results_json_str.encode('utf-8')).hexdigest()
-                formatted_results['hash'] = results_hash
+    @staticmethod
+    def write_results(filename, formatted_results, output_folder):
+        output_json_path = os.path.join(output_folder, f'{filename}_results.json')
+        with metrics.span('ocr.write_json'):
+            with open(output_json_path, 'w') as json_file:
+                json.dump(formatted_results, json_file, indent=4)
+        logging.info(f'Formatted results saved to {output_json_path}')
+
+        # Parsed once here; the uploader reads the typed record instead of the strings
+        with metrics.span('ocr.write_record'):
+            try:
+                write_record(output_json_path, GameRecord.from_json(formatted_results))
+            except (KeyError, ValueError) as e:
+                logging.warning(f'No binary record for {filename}, fix the JSON by hand: {e}')
 
-                output_json_path = os.path.join(output_folder, f'{filename}_results.json')
-                with open(output_json_path, 'w') as json_file:
-                    json.dump(formatted_results, json_file, indent=4)
-                logging.info(f'Formatted results saved to {output_json_path}')
+    @staticmethod
+    def results_folder(filename, formatted_results, output_folder):
+        # Results with points worked out instead of read wait for a person
+        derived = derived_cells(formatted_results)
+        if not derived:
+            return output_folder
+        logging.warning(f"{filename}: {', '.join(derived)} filled in from the shooting line, "
+                        f"sending the result to {REVIEW_FOLDER} to be checked")
+        os.makedirs(REVIEW_FOLDER, exist_ok=True)
+        return REVIEW_FOLDER
+
+    def save_results(self, filename, formatted_results, input_folder, output_folder):
+        self.write_results(filename, formatted_results, self.results_folder(filename, formatted_results, output_folder))
+
+        # Move processed image to the image output folder
+        with metrics.span('ocr.move_image'):
+            shutil.move(os.path.join(input_folder, filename), os.path.join(self.image_output_folder, filename))
+        metrics.count('ocr.images')
 
-                # Move processed image to IMAGE_OUTPUT_FOLDER
-                shutil.move(input_image_path, os.path.join(IMAGE_OUTPUT_FOLDER, filename))
+    def process_images(self, input_folder, output_folder):
+        for filename in self.list_images(input_folder):
+            input_image_path = os.path.join(input_folder, filename)
+            logging.info(f'Processing file: {input_image_path}')
+
+            formatted_results = self.process_image(input_image_path)
+            self.save_results(filename, formatted_results, input_folder, output_folder)
+
+    def video_scanner(self, reference_folder, scan_interval=SCAN_INTERVAL):
+        reference_paths = [os.path.join(reference_folder, filename) for filename in self.list_images(reference_folder)]
+        template = BoxScoreTemplate.from_images(reference_paths, self.region_boxes)
+        return VideoScanner(template, self.region_boxes, scan_interval=scan_interval)
+
+    def process_videos(self, input_folder, output_folder, scanner, video_output_folder=VIDEO_OUTPUT_FOLDER):
+        # Every box score found in a recording is OCR'd from its sharpest
+        # frame; the frame is kept as a PNG next to the processed screenshots
+        for filename in scanner.list_videos(input_folder):
+            video_path = os.path.join(input_folder, filename)
+            logging.info(f'Scanning video: {video_path}')
+            found = 0
+            for timestamp, frame in scanner.box_score_frames(video_path):
+                minutes, seconds = divmod(int(timestamp), 60)
+                frame_name = f'{os.path.splitext(filename)[0]}_{minutes // 60:02d}h{minutes % 60:02d}m{seconds:02d}s.png'
+                logging.info(f'Box score found at {timestamp:.1f}s, saved as {frame_name}')
+                data = cv2.imencode('.png', frame)[1].tobytes()
+                formatted_results = self.process_image_data(data)
+                with open(os.path.join(self.image_output_folder, frame_name), 'wb') as frame_file:
+                    frame_file.write(data)
+                self.write_results(frame_name, formatted_results,
+                                   self.results_folder(frame_name, formatted_results, output_folder))
+                found += 1
+            logging.info(f'Found {found} box scores in {filename}')
+            os.makedirs(video_output_folder, exist_ok=True)
+            shutil.move(video_path, os.path.join(video_output_folder, filename))
+
+    def process_images_parallel(self, input_folder, output_folder, workers):
+        # Each worker process loads its own model once; torch threads are split
+        # between workers so they don't oversubscribe the cores.
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        processor_kwargs = {'languages': self.languages, 'device': self.device, 'quantize': self.quantize,
+                            'batched': self.batched,
+                            'digit_classifier': self.digit_classifier,
+                            'min_digit_confidence': self.min_digit_confidence,
+                            'validate': self.validate, 'layout': self.layout, 'anchor': self.anchor}
+        # Workers start from the region cache file and send back what they
+        # read; only this process writes the file
+        use_region_cache = self.region_cache is not None
+        max_pending = workers * 2
+
+        filenames = iter(self.list_images(input_folder))
+        pending = {}
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(processor_kwargs, threads_per_worker, use_region_cache)) as executor:
+            while True:
+                while len(pending) < max_pending:
+                    filename = next(filenames, None)
+                    if filename is None:
+                        break
+                    input_image_path = os.path.join(input_folder, filename)
+                    with open(input_image_path, 'rb') as image_file:
+                        data = image_file.read()
+
+                    # Workers run without the cache; exact hits are served here
+                    # and fresh results are stored as they come back.
+                    key = None
+                    if self.result_cache is not None:
+                        key = content_hash(data)
+                        cached = self.result_cache.get_exact(key)
+                        if cached is not None:
+                            logging.info(f'{filename} found in the result cache, skipping OCR')
+                            self.save_results(filename, cached, input_folder, output_folder)
+                            continue
+
+                    logging.info(f'Queued file: {input_image_path}')
+                    pending[executor.submit(_process_image_in_worker, data)] = (filename, key)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    filename, key = pending.pop(future)
+                    try:
+                        formatted_results, thumbnails, cache_changes = future.result()
+                    except Exception:
+                        logging.exception(f'Failed to process {filename}; leaving it in {input_folder}')
+                        continue
+                    if cache_changes is not None:
+                        self.region_cache.merge(cache_changes)
+                        self.region_cache.checkpoint()
+                    if self.result_cache is not None:
+                        self.result_cache.put(key, thumbnails, formatted_results)
+                    self.save_results(filename, formatted_results, input_folder, output_folder)
 
     @staticmethod
     def correct_common_errors(text):
@@ -310,12 +724,296 @@ class OCRProcessor:
             return '0123456789'
         return '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz+-_/ '
 
-def main():
+class FolderWatcher:
+    # Keeps one OCRProcessor (and its model) resident and processes screenshots
+    # as they land in the input folder. inotify is only used to wake up early;
+    # each wakeup rescans the folder so nothing is missed if an event is dropped.
+    def __init__(self, processor, input_folder, output_folder, poll_interval=2.0, settle_seconds=2.0):
+        self.processor = processor
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.seen = {}
+        self.failed = {}
+        self.inotify = None
+
+        if INotify is not None:
+            self.inotify = INotify()
+            self.inotify.add_watch(input_folder, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE)
+            logging.info(f'Watching {input_folder} with inotify')
+        else:
+            logging.info(f'Watching {input_folder} by polling every {poll_interval}s')
+
+    def wait_for_changes(self):
+        if self.inotify is not None:
+            self.inotify.read(timeout=int(self.poll_interval * 1000))
+        else:
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def is_complete_image(path):
+        try:
+            with Image.open(path) as image:
+                image.verify()
+            return True
+        except Exception:
+            return False
+
+    def ready_files(self):
+        # A file is ready once its size and mtime haven't changed for
+        # settle_seconds and it decodes as an image.
+        now = time.monotonic()
+        ready = []
+        current = set(self.processor.list_images(self.input_folder))
+        for filename in list(self.seen):
+            if filename not in current:
+                del self.seen[filename]
+
+        for filename in current:
+            path = os.path.join(self.input_folder, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            if self.failed.get(filename) == signature:
+                continue
+
+            previous = self.seen.get(filename)
+            if previous is None or previous[0] != signature:
+                self.seen[filename] = (signature, now)
+                continue
+            if now - previous[1] >= self.settle_seconds and self.is_complete_image(path):
+                ready.append((filename, signature))
+        return sorted(ready)
+
+    def run(self):
+        logging.info('Waiting for screenshots, press Ctrl+C to stop')
+        try:
+            while True:
+                for filename, signature in self.ready_files():
+                    input_image_path = os.path.join(self.input_folder, filename)
+                    logging.info(f'Processing file: {input_image_path}')
+                    try:
+                        formatted_results = self.processor.process_image(input_image_path)
+                        self.processor.save_results(filename, formatted_results, self.input_folder, self.output_folder)
+                    except Exception:
+                        logging.exception(f'Failed to process {filename}; it will be retried if it changes')
+                        self.failed[filename] = signature
+                    self.seen.pop(filename, None)
+                self.wait_for_changes()
+        except KeyboardInterrupt:
+            logging.info('Stopping watcher')
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+def reference_pairs(image_folder, json_folder):
+    # (image path, verified results) for every *_results.json with its screenshot
+    pairs = []
+    for json_name in sorted(os.listdir(json_folder)):
+        if not json_name.endswith('_results.json'):
+            continue
+        image_path = os.path.join(image_folder, json_name[:-len('_results.json')])
+        if os.path.exists(image_path):
+            with open(os.path.join(json_folder, json_name), 'r') as json_file:
+                pairs.append((image_path, json.load(json_file)))
+    return pairs
+
+def result_fields(results):
+    # Flatten formatted results into {field: value} so two runs can be compared
+    fields = {}
+    for player in results.get('players', []):
+        for stat, value in player.items():
+            if stat in ('player_number', 'position', 'team'):
+                continue
+            value = str(value).strip()
+            fields[f"player{player['player_number']}_{stat}"] = value.lower() if stat == 'name' else value
+    for team in ('team1', 'team2'):
+        for quarter, value in results.get('teams', {}).get(f'{team}_quarters', {}).items():
+            fields[f'{team}_{quarter}'] = str(value).strip()
+    return fields
+
+def field_accuracy(expected, actual):
+    expected_fields = result_fields(expected)
+    actual_fields = result_fields(actual)
+    wrong = [field for field, value in expected_fields.items() if actual_fields.get(field) != value]
+    return len(expected_fields) - len(wrong), len(expected_fields), wrong
+
+def compare_quantized(image_folder, json_folder, languages=None, batched=False):
+    # Speed and accuracy of the float recognizer against the int8 one on CPU
+    pairs = reference_pairs(image_folder, json_folder)
+    if not pairs:
+        raise ValueError(f'No screenshot/JSON pairs found in {image_folder} and {json_folder}')
+
+    report = {}
+    for label, quantize in (('float', False), ('int8', True)):
+        processor = OCRProcessor(languages=languages, device='cpu', quantize=quantize, batched=batched)
+        # Load the model before timing anything
+        processor.reader
+        correct = total = 0
+        elapsed = 0.0
+        for image_path, expected in pairs:
+            with open(image_path, 'rb') as image_file:
+                data = image_file.read()
+            start = time.perf_counter()
+            actual, _ = processor.ocr_image_data(data)
+            elapsed += time.perf_counter() - start
+            image_correct, image_total, _ = field_accuracy(expected, actual)
+            correct += image_correct
+            total += image_total
+        report[label] = {
+            'seconds_per_image': elapsed / len(pairs),
+            'accuracy': correct / total if total else 0.0,
+        }
+        logging.info(f"{label}: {report[label]['seconds_per_image']:.2f}s per image, "
+                     f"{report[label]['accuracy']:.2%} of fields correct")
+
+    speedup = report['float']['seconds_per_image'] / max(report['int8']['seconds_per_image'], 1e-9)
+    accuracy_delta = report['int8']['accuracy'] - report['float']['accuracy']
+    logging.info(f'int8 vs float on {len(pairs)} screenshots: {speedup:.2f}x speed, '
+                 f'{accuracy_delta:+.2%} accuracy')
+    report['images'] = len(pairs)
+    report['speedup'] = speedup
+    report['accuracy_delta'] = accuracy_delta
+    return report
+
+_worker_processor = None
+
+def _init_worker(processor_kwargs, threads_per_worker, use_region_cache):
+    global _worker_processor
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    os.environ['MKL_NUM_THREADS'] = str(threads_per_worker)
+    configure_torch_threads(threads_per_worker, 1)
+    region_cache = RegionCache(read_only=True) if use_region_cache else None
+    _worker_processor = OCRProcessor(region_cache=region_cache, **processor_kwargs)
+    # Load the model up front so the first image doesn't pay for it
+    _worker_processor.reader
+
+def _process_image_in_worker(data):
+    formatted_results, thumbnails = _worker_processor.ocr_image_data(data)
+    region_cache = _worker_processor.region_cache
+    return formatted_results, thumbnails, None if region_cache is None else region_cache.take_changes()
+
+def add_layout_arguments(parser):
+    parser.add_argument('--layout', metavar='PATH', help='Box score layout file (default: boxscore_layout.json)')
+    parser.add_argument('--anchor', metavar='PATH',
+                        help=f'Anchor from layout.py build-anchor, used to align screenshots before cropping '
+                             f'(default: {ANCHOR_PATH} when it exists)')
+    parser.add_argument('--no-align', action='store_true',
+                        help='Only trim letterbox bars, without locating the scoreboard')
+
+def layout_from_args(args):
+    layout = Layout.load(args.layout)
+    anchor = None if args.no_align else Anchor.load_if_exists(args.anchor or ANCHOR_PATH, layout)
+    return layout, anchor
+
+def add_model_arguments(parser, cache=True):
+    # How a screenshot is read; shared by every command that runs the OCR so
+    # they all give the same result for it
+    parser.add_argument('--languages', nargs='+', default=OCR_LANGUAGES, help='EasyOCR language codes')
+    parser.add_argument('--device', choices=DEVICES, default='auto',
+                        help='Where to run EasyOCR; auto uses the GPU when CUDA is available')
+    parser.add_argument('--cpu', action='store_true', help='Shortcut for --device cpu')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Use a dynamically int8-quantized recognizer (CPU only)')
+    parser.add_argument('--threads', type=int, help='torch intra-op threads')
+    parser.add_argument('--interop-threads', type=int, help='torch inter-op threads')
+    parser.add_argument('--batched', action='store_true',
+                        help='Recognize the fixed scoreboard cells in batches without text detection')
+    parser.add_argument('--digit-templates', metavar='PATH',
+                        help='Glyph templates from digit_classifier.py; numeric cells are read with them '
+                             'and only low-confidence cells fall back to EasyOCR')
+    parser.add_argument('--digit-confidence', type=float, default=DIGIT_MIN_CONFIDENCE,
+                        help='Minimum template match confidence before falling back to EasyOCR')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Skip the box score arithmetic checks and the re-reads of cells that fail them')
+    if cache:
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Always run OCR, even for screenshots that were processed before')
+    add_layout_arguments(parser)
+
+def device_from_args(args):
+    return select_device('cpu' if args.cpu else args.device)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Extract NBA 2K box score data from screenshots.')
+    add_model_arguments(parser)
+    parser.add_argument('--compare-quantized', action='store_true',
+                        help='Report speed and accuracy of the int8 recognizer against the float one '
+                             'on a reference set, then exit')
+    parser.add_argument('--reference-images', default=IMAGE_OUTPUT_FOLDER,
+                        help='Screenshots for --compare-quantized')
+    parser.add_argument('--reference-json', default='./processed/json/',
+                        help='Verified *_results.json files for --compare-quantized')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of OCR worker processes, each with its own loaded model')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='Empty the result and region caches before processing')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and process new screenshots as they land in the input folder')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Seconds between input folder checks in watch mode')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='Seconds a new file must stay unchanged before it is processed in watch mode')
+    parser.add_argument('--videos', action='store_true',
+                        help=f'Find box scores in recordings in {VIDEO_INPUT_FOLDER} instead of reading screenshots')
+    parser.add_argument('--video-reference', default=IMAGE_OUTPUT_FOLDER,
+                        help='Box score screenshots used to recognize box score frames in videos')
+    parser.add_argument('--scan-interval', type=float, default=SCAN_INTERVAL,
+                        help='Seconds of video skipped between checks while looking for a box score')
+    add_metrics_arguments(parser, regions=True)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     input_folder = IMAGE_INPUT_FOLDER
     output_folder = JSON_OUTPUT_FOLDER
-
-    ocr_processor = OCRProcessor()
-    ocr_processor.process_images(input_folder, output_folder)
+    enable_from_args(args)
+
+    configure_torch_threads(args.threads, args.interop_threads)
+    if args.compare_quantized:
+        try:
+            compare_quantized(args.reference_images, args.reference_json, args.languages, args.batched)
+        finally:
+            ReaderPool.shutdown()
+        return
+
+    device = device_from_args(args)
+    region_cache = None if args.no_cache else RegionCache()
+    digit_classifier = DigitClassifier(args.digit_templates) if args.digit_templates else None
+    layout, anchor = layout_from_args(args)
+    ocr_processor = OCRProcessor(languages=args.languages, device=device, quantize=args.quantize,
+                                 batched=args.batched,
+                                 use_cache=not args.no_cache, region_cache=region_cache,
+                                 digit_classifier=digit_classifier, min_digit_confidence=args.digit_confidence,
+                                 validate=not args.no_validate, layout=layout, anchor=anchor)
+    if args.clear_cache and ocr_processor.result_cache is not None:
+        ocr_processor.result_cache.clear()
+        region_cache.clear()
+    try:
+        if args.videos:
+            scanner = ocr_processor.video_scanner(args.video_reference, args.scan_interval)
+            ocr_processor.process_videos(VIDEO_INPUT_FOLDER, output_folder, scanner)
+        elif args.watch:
+            FolderWatcher(ocr_processor, input_folder, output_folder,
+                          poll_interval=args.poll_interval, settle_seconds=args.settle).run()
+        elif args.workers > 1:
+            ocr_processor.process_images_parallel(input_folder, output_folder, args.workers)
+        else:
+            ocr_processor.process_images(input_folder, output_folder)
+    finally:
+        if region_cache is not None:
+            region_cache.save()
+            stats = region_cache.stats()
+            logging.info(f"Region cache: {stats['hits']} hits, {stats['misses']} misses "
+                         f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)")
+        if metrics.enabled:
+            for line in metrics.report_lines():
+                logging.info(f'Metrics: {line}')
+            export_from_args(args)
+        ReaderPool.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,27 +1,56 @@
 import os
-import json
 import time
-import gspread
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import argparse
+import sqlite3
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import shutil
 from datetime import datetime
+from metrics import add_metrics_arguments, enable_from_args, export_from_args, metrics
+from records import load_game, record_path
+from roster import ROSTER_FILE, RosterIndex
+from season_stats import SEASON_STATS_PATH, SeasonStats
+from storage import DATABASE_PATH, FRIENDLY_PLAYERS, GAME_COLUMNS, GAMES, OPPONENT_PLAYERS, SQLiteSink, StorageSink
 
 # Constants
 TO_PROCESS_FOLDER = './toProcess/json/'
 PROCESSED_FOLDER = './processed/json/'
+REVIEW_FOLDER = './review/json/'
 SPREADSHEET_NAME = 'SPREADSHEET_NAME'
 F_DB_SHEET = 'F DB'
 O_DB_SHEET = 'O DB'
 GAME_DB_SHEET = 'GAME DB'
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+# Upper bound on rows sent in a single append_rows call
+MAX_ROWS_PER_APPEND = 500
+GAME_INDEX_PATH = './game_index.sqlite3'
+# GAME DB columns read by the local index (1-based)
+GAME_COLUMN_NAMES = [name for name, _ in GAME_COLUMNS]
+GAME_ID_COLUMN = GAME_COLUMN_NAMES.index('game_id') + 1
+HASH_COLUMN = GAME_COLUMN_NAMES.index('hash') + 1
+# Bumped when what the index stores changes; an index from another version is
+# emptied and rebuilt on the next sync (version 1 read o_fta as the hash)
+GAME_INDEX_VERSION = 2
+# Sheets API per-user quotas and how many calls may be in flight at once
+READ_REQUESTS_PER_MINUTE = 60
+WRITE_REQUESTS_PER_MINUTE = 60
+UPLOAD_WORKERS = 3
+RETRYABLE_STATUS_CODES = (429, 500, 503)
+
+# gspread and the Google auth libraries are imported where the sheets are
+# used, so local-only runs and the status/validate commands start quickly
 
 class GoogleSheetsClient:
     def __init__(self):
         self.client = self.authenticate_google_sheets()
 
     def authenticate_google_sheets(self):
+        import gspread
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
         creds = None
         if os.path.exists('token.json'):
             creds = Credentials.from_authorized_user_file('token.json', SCOPES)
@@ -36,6 +65,7 @@ class GoogleSheetsClient:
         return gspread.authorize(creds)
 
     def get_sheet(self, sheet_name):
+        import gspread
         try:
             spreadsheet = self.client.open(SPREADSHEET_NAME)
             return spreadsheet.worksheet(sheet_name)
@@ -45,243 +75,503 @@ class GoogleSheetsClient:
             print(f"Worksheet '{sheet_name}' not found.")
         return None
 
+class TokenBucket:
+    # Allows at most requests_per_minute calls in any 60 second window: the
+    # burst is taken out of the refill rate so burst + refill never exceeds
+    # the quota. acquire() blocks until a token is free and returns the wait.
+    def __init__(self, requests_per_minute, burst=None):
+        self.capacity = burst or max(1, requests_per_minute // 10)
+        self.rate = max(requests_per_minute - self.capacity, 1) / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class SheetsScheduler:
+    # Proactively spaces Sheets API calls under the read and write quotas and
+    # runs them on a small thread pool. Calls submitted with the same key (a
+    # worksheet title) run one at a time in submission order.
+    def __init__(self, read_per_minute=READ_REQUESTS_PER_MINUTE, write_per_minute=WRITE_REQUESTS_PER_MINUTE,
+                 workers=UPLOAD_WORKERS, max_retries=5, base_delay=1.0, max_delay=64.0):
+        self.buckets = {'read': TokenBucket(read_per_minute), 'write': TokenBucket(write_per_minute)}
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.active = set()
+        self.futures = []
+        self.started = time.monotonic()
+        self.counters = {'read': 0, 'write': 0, 'retries': 0, 'failures': 0,
+                         'throttle_seconds': 0.0, 'backoff_seconds': 0.0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def call(self, kind, func, *args, **kwargs):
+        from gspread.exceptions import APIError
+        for attempt in range(self.max_retries):
+            self.count('throttle_seconds', self.buckets[kind].acquire())
+            try:
+                with metrics.span(f'sheets.{kind}'):
+                    result = func(*args, **kwargs)
+                self.count(kind)
+                return result
+            except APIError as e:
+                if e.response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.count('failures')
+                    raise
+                # Full jitter so parallel callers don't retry in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"Sheets API returned {e.response.status_code}. Retrying in {delay:.1f} seconds...")
+                self.count('retries')
+                self.count('backoff_seconds', delay)
+                metrics.count(f'sheets.retries.{e.response.status_code}')
+                time.sleep(delay)
+        self.count('failures')
+        raise Exception("Max retries exceeded")
+
+    def submit(self, key, kind, func, *args, **kwargs):
+        future = Future()
+        with self.lock:
+            self.queues.setdefault(key, deque()).append((future, kind, func, args, kwargs))
+            self.futures.append(future)
+            if key not in self.active:
+                self.active.add(key)
+                self.executor.submit(self.drain, key)
+        return future
+
+    def drain(self, key):
+        while True:
+            with self.lock:
+                if not self.queues[key]:
+                    self.active.discard(key)
+                    return
+                future, kind, func, args, kwargs = self.queues[key].popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.call(kind, func, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+    def wait(self):
+        # Block until everything submitted so far is done; re-raise the first error
+        with self.lock:
+            futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        elapsed = time.monotonic() - self.started
+        stats['elapsed_seconds'] = elapsed
+        stats['requests_per_minute'] = (stats['read'] + stats['write']) * 60 / elapsed if elapsed else 0.0
+        return stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+class SheetWriteBuffer:
+    # Collects rows per worksheet and appends them in as few API calls as
+    # possible. A worksheet is flushed early once it holds max_rows rows,
+    # except the held ones, which only go out (in max_rows chunks) when
+    # flush() is told to include them.
+    def __init__(self, append_rows, max_rows=MAX_ROWS_PER_APPEND, held=()):
+        self.append_rows = append_rows
+        self.max_rows = max_rows
+        self.held = set(held)
+        self.pending = {}
+
+    def add(self, sheet, row):
+        _, rows = self.pending.setdefault(sheet.title, (sheet, []))
+        rows.append(row)
+        if len(rows) >= self.max_rows and sheet.title not in self.held:
+            self.flush_sheet(sheet.title)
+
+    def flush_sheet(self, title):
+        sheet, rows = self.pending.pop(title, (None, []))
+        for start in range(0, len(rows), self.max_rows):
+            batch = rows[start:start + self.max_rows]
+            print(f"Appending {len(batch)} rows to sheet {title}")
+            self.append_rows(sheet, batch)
+
+    def flush(self, held=True):
+        # Worksheets are flushed in the order they were first written to
+        for title in list(self.pending):
+            if held or title not in self.held:
+                self.flush_sheet(title)
+
+def call_directly(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+class GameIndex:
+    # Local SQLite copy of the GAME DB GameID and hash columns. Only rows added
+    # since the last sync are downloaded; if the last synced row no longer
+    # matches the sheet, the index is rebuilt from scratch.
+    def __init__(self, path=GAME_INDEX_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS games (row INTEGER PRIMARY KEY, game_id INTEGER, hash TEXT)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS games_hash ON games (hash)')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != GAME_INDEX_VERSION:
+            self.conn.execute('DELETE FROM games')
+            self.conn.execute(f'PRAGMA user_version = {GAME_INDEX_VERSION}')
+        self.conn.commit()
+
+    def last_synced_row(self):
+        row = self.conn.execute('SELECT MAX(row) FROM games').fetchone()[0]
+        return row or 1  # row 1 is the header
+
+    def stored_row(self, row):
+        return self.conn.execute('SELECT game_id, hash FROM games WHERE row = ?', (row,)).fetchone()
+
+    @staticmethod
+    def fetch_rows(sheet, start_row, read=call_directly):
+        from gspread.utils import rowcol_to_a1
+        id_column = rowcol_to_a1(1, GAME_ID_COLUMN)[:-1]
+        hash_column = rowcol_to_a1(1, HASH_COLUMN)[:-1]
+        game_ids, hashes = read(sheet.batch_get, [f'{id_column}{start_row}:{id_column}',
+                                                  f'{hash_column}{start_row}:{hash_column}'])
+        rows = []
+        for offset in range(max(len(game_ids), len(hashes))):
+            game_id = game_ids[offset][0] if offset < len(game_ids) and game_ids[offset] else ''
+            hash_value = hashes[offset][0] if offset < len(hashes) and hashes[offset] else ''
+            game_id = int(game_id) if str(game_id).isdigit() else None
+            rows.append((start_row + offset, game_id, hash_value or None))
+        return rows
+
+    def rebuild(self, sheet, read=call_directly):
+        print("Rebuilding the local game index from the sheet")
+        rows = self.fetch_rows(sheet, 2, read)
+        self.conn.execute('DELETE FROM games')
+        self.store(rows)
+
+    def store(self, rows):
+        self.conn.executemany('INSERT OR REPLACE INTO games (row, game_id, hash) VALUES (?, ?, ?)', rows)
+        self.conn.commit()
+
+    def sync(self, sheet, read=call_directly):
+        # read(func, *args) makes each sheet API call, e.g. through the
+        # scheduler so every call takes its own read token
+        last_row = self.last_synced_row()
+        if last_row == 1:
+            self.rebuild(sheet, read)
+            return
+
+        # Re-read the last synced row along with the new ones to detect drift
+        rows = self.fetch_rows(sheet, last_row, read)
+        if not rows or rows[0][1:] != self.stored_row(last_row):
+            self.rebuild(sheet, read)
+            return
+        self.store(rows[1:])
+        if len(rows) > 1:
+            print(f"Synced {len(rows) - 1} new games into the local game index")
+
+    def hashes(self):
+        return {row[0] for row in self.conn.execute('SELECT hash FROM games WHERE hash IS NOT NULL')}
+
+    def max_game_id(self):
+        return self.conn.execute('SELECT MAX(game_id) FROM games').fetchone()[0] or 0
+
+class SheetsSink(StorageSink):
+    # Replicates rows to the F DB, O DB and GAME DB worksheets. Rows are
+    # buffered per worksheet and appended through the scheduler; known hashes
+    # and GameIDs come from the local GAME DB index.
+    def __init__(self, client, index=None, scheduler=None):
+        self.index = index or GameIndex()
+        self.scheduler = scheduler or SheetsScheduler()
+        # A GAME DB row marks its game as uploaded, so it is held back until
+        # the game's player rows are in
+        self.write_buffer = SheetWriteBuffer(self.append_rows, held=(GAME_DB_SHEET,))
+        self.sheets = {
+            FRIENDLY_PLAYERS: client.get_sheet(F_DB_SHEET),
+            OPPONENT_PLAYERS: client.get_sheet(O_DB_SHEET),
+            GAMES: client.get_sheet(GAME_DB_SHEET),
+        }
+        if self.sheets[GAMES]:
+            with metrics.span('sheets.index_sync'):
+                self.index.sync(self.sheets[GAMES], read=self.read)
+
+    def exponential_backoff(self, func, *args, kind='write', **kwargs):
+        # Rate-limited call with jittered exponential backoff, on this thread
+        return self.scheduler.call(kind, func, *args, **kwargs)
+
+    def read(self, func, *args, **kwargs):
+        return self.exponential_backoff(func, *args, kind='read', **kwargs)
+
+    def append_rows(self, sheet, rows):
+        # Runs on the scheduler's pool; rows for one worksheet stay in order
+        self.scheduler.submit(sheet.title, 'write', sheet.append_rows, rows)
+
+    def write_row(self, table, row):
+        sheet = self.sheets[table]
+        print(f"Staging data for sheet {sheet.title}: {row}")
+        self.write_buffer.add(sheet, row)
+
+    def flush(self):
+        # Player rows first; if any of them fail, wait() raises and no GAME DB
+        # row is written, so the next run uploads the games again
+        self.write_buffer.flush(held=False)
+        self.scheduler.wait()
+        self.write_buffer.flush()
+        self.scheduler.wait()
+
+    def read_rows(self, table):
+        # Every data row of a worksheet, without the header
+        return self.read(self.sheets[table].get_values)[1:]
+
+    def hashes(self):
+        return self.index.hashes()
+
+    def max_game_id(self):
+        return self.index.max_game_id()
+
 class GameDataProcessor:
-    def __init__(self, client):
-        self.client = client
-        self.f_db_sheet = self.client.get_sheet(F_DB_SHEET)
-        self.o_db_sheet = self.client.get_sheet(O_DB_SHEET)
-        self.game_db_sheet = self.client.get_sheet(GAME_DB_SHEET)
-        self.existing_hashes = self.game_db_sheet.col_values(41) if self.game_db_sheet else []
+    def __init__(self, sinks, roster=None, unattended=False):
+        # Sinks are flushed in order; put the primary store last so a failed
+        # upload leaves nothing recorded as done
+        self.sinks = list(sinks)
+        self.roster = roster
+        self.unattended = unattended
+        self.existing_hashes = set()
+        for sink in self.sinks:
+            self.existing_hashes |= sink.hashes()
         self.next_game_id = self.get_next_game_id()
 
     def get_next_game_id(self):
-        records = self.game_db_sheet.get_all_records() if self.game_db_sheet else []
-        if not records:
-            return 1
-        last_game_id = max(int(record['GameID']) for record in records if str(record['GameID']).isdigit())
-        return last_game_id + 1
+        return max([0] + [sink.max_game_id() for sink in self.sinks]) + 1
 
-    def convert_to_number(self, value):
-        try:
-            return int(value)
-        except ValueError:
-            try:
-                return float(value)
-            except ValueError:
-                return value
-
-    def exponential_backoff(self, func, *args, max_retries=5, **kwargs):
-        delay = 8
-        for _ in range(max_retries):
-            try:
-                return func(*args, **kwargs)
-            except gspread.exceptions.APIError as e:
-                if e.response.status_code == 429:
-                    print(f"Rate limit exceeded. Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    delay *= 2  # exponential backoff
-                else:
-                    raise
-        raise Exception("Max retries exceeded")
-
-    def log_data_to_sheet(self, sheet, data):
-        data = [self.convert_to_number(item) for item in data]
-        print(f"Appending data to sheet {sheet.title}: {data}")
-        self.exponential_backoff(sheet.append_row, data)
+    def log_data_to_sheet(self, table, data):
+        for sink in self.sinks:
+            sink.write_row(table, data)
 
     def process_json_file(self, file_path):
-        with open(file_path, 'r') as json_file:
-            data = json.load(json_file)
-            hash_value = data.get('hash')
-
-            if hash_value in self.existing_hashes:
-                print(f"Hash {hash_value} already exists.")
-                return
-
-            team1_name = data.get('team1_name', 'team1')
-            team2_name = data.get('team2_name', 'team2')
-
-            print(f"\nTeam 1: {team1_name}")
-            for player in data['players']:
-                if player.get('team') == 'team1':
-                    print(f"  Player {player.get('player_number')}: {player.get('name').lower()}")
-
-            print(f"\nTeam 2: {team2_name}")
-            for player in data['players']:
-                if player.get('team') == 'team2':
-                    print(f"  Player {player.get('player_number')}: {player.get('name').lower()}")
-
-            friendly_team = input(f"\nWhich team is friendly? (1 for '{team1_name}', 2 for '{team2_name}'): ").strip()
-            is_team1_friendly = friendly_team == '1'
-            is_team2_friendly = friendly_team == '2'
-
-            team1_quarters = data.get('teams', {}).get('team1_quarters', {})
-            team2_quarters = data.get('teams', {}).get('team2_quarters', {})
-            team1_total = sum(int(team1_quarters.get(q, 0)) for q in ['quarter_1', 'quarter_2', 'quarter_3', 'quarter_4'])
-            team2_total = sum(int(team2_quarters.get(q, 0)) for q in ['quarter_1', 'quarter_2', 'quarter_3', 'quarter_4'])
-
-            team1_result, team2_result = ('W', 'L') if team1_total > team2_total else ('L', 'W')
-
-            team1_stats, team2_stats = self.initialize_team_stats(), self.initialize_team_stats()
-
-            # Create a dictionary to store players by team and position
-            players_by_team_and_position = {'team1': {}, 'team2': {}}
-            for player in data['players']:
-                team = player.get('team')
-                position = player.get('position')
-                if team not in players_by_team_and_position:
-                    players_by_team_and_position[team] = {}
-                if position not in players_by_team_and_position[team]:
-                    players_by_team_and_position[team][position] = []
-                players_by_team_and_position[team][position].append(player)
-
-            for player in data['players']:
-                player_team = player.get('team')
-                result = team1_result if player_team == 'team1' else team2_result
-                team_stats = team1_stats if player_team == 'team1' else team2_stats
-
-                for stat in team_stats.keys():
-                    team_stats[stat] += int(player.get(stat, 0))
-
-                PM2, PA2 = self.calculate_player_stats(player)
-                if player_team == 'team1':
-                    team1_stats['2PM'] += PM2
-                    team1_stats['2PA'] += PA2
-                else:
-                    team2_stats['2PM'] += PM2
-                    team2_stats['2PA'] += PA2
-
-                # Find the matchup player
-                opponent_team = 'team2' if player_team == 'team1' else 'team1'
-                position = player.get('position')
-                matchup_player = players_by_team_and_position[opponent_team].get(position, [{}])[0]
-                matchup_name = matchup_player.get('name', '').lower()
-
-                timestamp = datetime.now().isoformat()
-                player_data = self.prepare_player_data(player, result, matchup_name, timestamp, hash_value, PM2, PA2)
-                sheet = self.f_db_sheet if (player_team == 'team1' and is_team1_friendly) or (player_team == 'team2' and is_team2_friendly) else self.o_db_sheet
-                self.log_data_to_sheet(sheet, player_data)
-
-            self.log_game_data(team1_name, team2_name, team1_quarters, team2_quarters, team1_total, team2_total, team1_stats, team2_stats, is_team1_friendly, hash_value)
-            self.next_game_id += 1
-
-    def initialize_team_stats(self):
-        return {
-            'rebounds': 0, 'assists': 0, 'steals': 0, 'blocks': 0,
-            'fouls': 0, 'tos': 0, 'FGM': 0, 'FGA': 0, '3PM': 0, '3PA': 0,
-            '2PM': 0, '2PA': 0, 'FTM': 0, 'FTA': 0
-        }
-
-    def calculate_player_stats(self, player):
-        FGM = int(player.get('FGM', 0))
-        PM3 = int(player.get('3PM', 0))
-        FGA = int(player.get('FGA', 0))
-        PA3 = int(player.get('3PA', 0))
-        PM2 = FGM - PM3
-        PA2 = FGA - PA3
-        return PM2, PA2
-
-    def prepare_player_data(self, player, result, matchup_name, timestamp, hash_value, PM2, PA2):
-        return [
-            self.next_game_id,
-            player.get('team', ''),
-            player.get('player_number', ''),
-            player.get('name', '').lower(),
-            player.get('position', ''),
-            player.get('grade', ''),
-            player.get('points', ''),
-            player.get('rebounds', ''),
-            player.get('assists', ''),
-            player.get('steals', ''),
-            player.get('blocks', ''),
-            player.get('fouls', ''),
-            player.get('tos', ''),
-            player.get('FGM', ''),
-            player.get('FGA', ''),
-            player.get('3PM', ''),
-            player.get('3PA', ''),
-            PM2,
-            PA2,
-            player.get('FTM', ''),
-            player.get('FTA', ''),
-            result,
-            matchup_name,
-            timestamp,
-            hash_value
-        ]
-
-    def log_game_data(self, team1_name, team2_name, team1_quarters, team2_quarters, team1_total, team2_total, team1_stats, team2_stats, is_team1_friendly, hash_value):
-        if is_team1_friendly:
-            team_f_name, team_o_name = team1_name, team2_name
-            team_f_quarters, team_o_quarters = team1_quarters, team2_quarters
-            team_f_total, team_o_total = team1_total, team2_total
-            team_f_stats, team_o_stats = team1_stats, team2_stats
-        else:
-            team_f_name, team_o_name = team2_name, team1_name
-            team_f_quarters, team_o_quarters = team2_quarters, team1_quarters
-            team_f_total, team_o_total = team2_total, team1_total
-            team_f_stats, team_o_stats = team2_stats, team1_stats
-
-        game_data = [
-            self.next_game_id,
-            team_f_name,
-            team_o_name,
-            team_f_quarters.get('quarter_1', 0),
-            team_o_quarters.get('quarter_1', 0),
-            team_f_quarters.get('quarter_2', 0),
-            team_o_quarters.get('quarter_2', 0),
-            team_f_quarters.get('quarter_3', 0),
-            team_o_quarters.get('quarter_3', 0),
-            team_f_quarters.get('quarter_4', 0),
-            team_o_quarters.get('quarter_4', 0),
-            team_f_total,
-            team_o_total,
-            team_f_stats['rebounds'],
-            team_o_stats['rebounds'],
-            team_f_stats['assists'],
-            team_o_stats['assists'],
-            team_f_stats['steals'],
-            team_o_stats['steals'],
-            team_f_stats['blocks'],
-            team_o_stats['blocks'],
-            team_f_stats['fouls'],
-            team_o_stats['fouls'],
-            team_f_stats['tos'],
-            team_o_stats['tos'],
-            team_f_stats['FGM'],
-            team_o_stats['FGM'],
-            team_f_stats['FGA'],
-            team_o_stats['FGA'],
-            team_f_stats['3PM'],
-            team_o_stats['3PM'],
-            team_f_stats['3PA'],
-            team_o_stats['3PA'],
-            team_f_stats['2PM'],
-            team_o_stats['2PM'],
-            team_f_stats['2PA'],
-            team_o_stats['2PA'],
-            team_f_stats['FTM'],
-            team_o_stats['FTM'],
-            team_f_stats['FTA'],
-            team_o_stats['FTA'],
-            datetime.now().isoformat(),
-            hash_value
-        ]
-        self.log_data_to_sheet(self.game_db_sheet, game_data)
-
-    def process_json_files(self):
+        try:
+            game = load_game(file_path)
+        except (KeyError, ValueError) as e:
+            print(f"Could not read {os.path.basename(file_path)}: {e}")
+            return False
+        rows = self.build_game_rows(game)
+        if rows is None:
+            return False
+        for table, row in rows:
+            self.log_data_to_sheet(table, row)
+        return True
+
+    def build_game_rows(self, game):
+        # [(table, row)] for one game, [] for a game that is already stored, or
+        # None when nobody could say which team is friendly. Takes the next
+        # GameID and marks the game as seen.
+        hash_value = game.hash
+        if hash_value in self.existing_hashes:
+            print(f"Hash {hash_value} already exists.")
+            return []
+
+        team1_name, team2_name = game.team_names
+        for team, team_name in (('team1', team1_name), ('team2', team2_name)):
+            print(f"\n{'Team 1' if team == 'team1' else 'Team 2'}: {team_name}")
+            for player in game.team_players(team):
+                print(f"  Player {player.player_number}: {player.name.lower()}")
+
+        friendly_team = self.choose_friendly_team(game.players, team1_name, team2_name)
+        if friendly_team is None:
+            return None
+        friendly_team = 'team1' if friendly_team == '1' else 'team2'
+
+        team1_result, team2_result = ('W', 'L') if game.total('team1') > game.total('team2') else ('L', 'W')
+
+        # First player at each position on each team, for the matchup column
+        players_by_team_and_position = {'team1': {}, 'team2': {}}
+        for player in game.players:
+            players_by_team_and_position.setdefault(player.team, {}).setdefault(player.position, player)
+
+        rows = []
+        for player in game.players:
+            result = team1_result if player.team == 'team1' else team2_result
+            opponent_team = 'team2' if player.team == 'team1' else 'team1'
+            matchup_player = players_by_team_and_position[opponent_team].get(player.position)
+            matchup_name = matchup_player.name.lower() if matchup_player is not None else ''
+
+            timestamp = datetime.now().isoformat()
+            player_data = game.player_row(player, self.next_game_id, result, matchup_name, timestamp)
+            table = FRIENDLY_PLAYERS if player.team == friendly_team else OPPONENT_PLAYERS
+            rows.append((table, player_data))
+
+        rows.append((GAMES, game.game_row(self.next_game_id, friendly_team, datetime.now().isoformat())))
+        self.next_game_id += 1
+        # Catch duplicates within this run too, before the rows are written
+        self.existing_hashes.add(hash_value)
+        return rows
+
+    def choose_friendly_team(self, players, team1_name, team2_name):
+        # Returns '1' or '2', or None when the game should go to the review queue
+        if self.roster is not None:
+            team, scores, matches = self.roster.classify(players)
+            for ocr_name, roster_name, player_team, score in matches:
+                print(f"  Roster match: {ocr_name.lower()} -> {roster_name} ({player_team}, {score:.2f})")
+            if team is not None:
+                print(f"Friendly team from roster: {team} (team1 {scores['team1']:.2f}, team2 {scores['team2']:.2f})")
+                return team[-1]
+            print(f"Roster match is ambiguous (team1 {scores['team1']:.2f}, team2 {scores['team2']:.2f})")
+
+        if self.unattended:
+            return None
+        while True:
+            try:
+                answer = input(f"\nWhich team is friendly? (1 for '{team1_name}', 2 for '{team2_name}'): ").strip()
+            except EOFError:
+                # No one left to answer; leave the game for review
+                return None
+            if answer in ('1', '2'):
+                return answer
+            print("Please enter 1 or 2.")
+
+    def process_json_files(self, move_files=True):
+        processed_files = []
+        review_files = []
         for filename in os.listdir(TO_PROCESS_FOLDER):
             if filename.endswith('_results.json'):
                 file_path = os.path.join(TO_PROCESS_FOLDER, filename)
-                self.process_json_file(file_path)
-                processed_file_path = os.path.join(PROCESSED_FOLDER, filename)
-                shutil.move(file_path, processed_file_path)
-                print(f"Moved processed file to {PROCESSED_FOLDER}")
-
-def main():
-    client = GoogleSheetsClient()
-    processor = GameDataProcessor(client)
-    processor.process_json_files()
+                with metrics.span('upload.game'):
+                    handled = self.process_json_file(file_path)
+                if handled:
+                    processed_files.append(filename)
+                else:
+                    review_files.append(filename)
+
+        # Write everything that was staged, then move the files that are now stored
+        for sink in self.sinks:
+            with metrics.span(f'upload.flush.{type(sink).__name__}'):
+                sink.flush()
+        if not move_files:
+            return
+        for filename in processed_files:
+            move_result(filename, PROCESSED_FOLDER)
+            print(f"Moved {filename} to {PROCESSED_FOLDER}")
+        for filename in review_files:
+            # Needs a human to pick the friendly team; move it back to retry
+            os.makedirs(REVIEW_FOLDER, exist_ok=True)
+            move_result(filename, REVIEW_FOLDER)
+            print(f"Moved {filename} to {REVIEW_FOLDER} for review")
+
+def move_result(filename, folder):
+    # The JSON and, when there is one, its binary record
+    shutil.move(os.path.join(TO_PROCESS_FOLDER, filename), os.path.join(folder, filename))
+    binary_filename = os.path.basename(record_path(filename))
+    if os.path.exists(os.path.join(TO_PROCESS_FOLDER, binary_filename)):
+        shutil.move(os.path.join(TO_PROCESS_FOLDER, binary_filename), os.path.join(folder, binary_filename))
+
+def add_upload_arguments(parser):
+    parser.add_argument('--database', default=DATABASE_PATH,
+                        help='Local SQLite database every game is stored in')
+    parser.add_argument('--local-only', action='store_true',
+                        help='Only write to the local database, without Google Sheets')
+    parser.add_argument('--season-stats', default=SEASON_STATS_PATH,
+                        help='File the running season aggregates are kept in')
+    parser.add_argument('--import-sheets', action='store_true',
+                        help='Copy every row already in the sheets into the local database first')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Write to in-memory fake worksheets instead of Google Sheets')
+    parser.add_argument('--fake-quota', type=int, metavar='N',
+                        help='With --dry-run, make the fake API reject more than N reads or writes per minute')
+    parser.add_argument('--read-quota', type=int, default=READ_REQUESTS_PER_MINUTE,
+                        help='Sheets read requests allowed per minute')
+    parser.add_argument('--write-quota', type=int, default=WRITE_REQUESTS_PER_MINUTE,
+                        help='Sheets write requests allowed per minute')
+    parser.add_argument('--upload-workers', type=int, default=UPLOAD_WORKERS,
+                        help='Sheets API calls allowed in flight at once')
+    parser.add_argument('--roster', default=ROSTER_FILE,
+                        help='JSON list of our club players, used to pick the friendly team automatically')
+    parser.add_argument('--unattended', action='store_true',
+                        help='Never prompt; games the roster cannot decide go to the review folder')
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help='Rebuild the local game index from the GAME DB sheet before processing')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Log extracted NBA 2K game data to Google Sheets.')
+    add_upload_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+def open_sinks(args, scheduler):
+    # The sheets (unless local only), the local database and the season
+    # aggregates, in the order they are flushed
+    store = SQLiteSink(':memory:' if args.dry_run else args.database)
+    client = None
+    if args.dry_run and not args.local_only:
+        from fake_sheets import FakeSheetsClient
+        client = FakeSheetsClient(headers={GAME_DB_SHEET: ['GameID']}, quota_per_minute=args.fake_quota)
+        index = GameIndex(':memory:')
+    elif not args.local_only:
+        client = GoogleSheetsClient()
+        index = GameIndex()
+        if args.rebuild_index:
+            game_db_sheet = client.get_sheet(GAME_DB_SHEET)
+            if game_db_sheet:
+                index.rebuild(game_db_sheet, read=lambda func, *args: scheduler.call('read', func, *args))
+    sinks = []
+    if client is not None:
+        sheets_sink = SheetsSink(client, index, scheduler)
+        if args.import_sheets:
+            for table in (FRIENDLY_PLAYERS, OPPONENT_PLAYERS, GAMES):
+                rows = sheets_sink.read_rows(table)
+                store.import_rows(table, rows)
+                print(f"Imported {len(rows)} rows from sheet {sheets_sink.sheets[table].title}")
+        sinks.append(sheets_sink)
+    sinks.append(store)
+    season_stats = SeasonStats(None if args.dry_run else args.season_stats)
+    if season_stats.outdated:
+        # The database is flushed before the season stats, so it holds every
+        # game the old file had counted
+        print(f"{args.season_stats} was written by an older version, recounting it from the local database")
+    if args.import_sheets or season_stats.outdated:
+        season_stats.rebuild(store)
+    sinks.append(season_stats)
+    return sinks, store, client
+
+def close_sinks(scheduler, store, client):
+    scheduler.shutdown()
+    if store is not None:
+        store.close()
+    if client is not None:
+        stats = scheduler.stats()
+        print(f"Sheets API: {stats['read']} reads, {stats['write']} writes, {stats['retries']} retries, "
+              f"{stats['throttle_seconds']:.1f}s throttled, {stats['requests_per_minute']:.1f} requests/min")
+
+def main(argv=None):
+    args = parse_args(argv)
+    enable_from_args(args)
+    scheduler = SheetsScheduler(args.read_quota, args.write_quota, args.upload_workers)
+    store = client = None
+    try:
+        sinks, store, client = open_sinks(args, scheduler)
+        roster = RosterIndex.load_if_exists(args.roster)
+        processor = GameDataProcessor(sinks, roster=roster, unattended=args.unattended)
+        processor.process_json_files(move_files=not args.dry_run)
+    finally:
+        close_sinks(scheduler, store, client)
+    if args.dry_run and client is not None:
+        print(f"API calls made: {client.call_counts()}")
+    if metrics.enabled:
+        for line in metrics.report_lines():
+            print(f"Metrics: {line}")
+        export_from_args(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
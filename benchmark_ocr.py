@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import torch
+from automate_2k import (OCRProcessor, ReaderPool, add_model_arguments, configure_torch_threads, device_from_args,
+                         field_accuracy, layout_from_args, reference_pairs, result_fields)
+from digit_classifier import DigitClassifier
+from generate_boxscores import BENCHMARK_IMAGE_FOLDER, BENCHMARK_JSON_FOLDER
+from metrics import PERCENTILES, metrics
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCHMARK_REPORT_PATH = './benchmark/report.json'
+
+REGIONS_IN_REPORT = 10
+
+
+def stage_summary():
+    # The OCR spans recorded during the run, in milliseconds
+    summary = {}
+    for name, stats in metrics.span_summary().items():
+        if not name.startswith('ocr.'):
+            continue
+        summary[name[len('ocr.'):]] = {
+            'calls': stats['count'],
+            'mean_ms': stats['mean_seconds'] * 1000,
+            **{f'p{percentile}_ms': stats[f'p{percentile}_seconds'] * 1000 for percentile in PERCENTILES},
+        }
+    return summary
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def field_type(field):
+    # 'player3_FGM' -> 'FGM', 'team1_quarter_2' -> 'quarter'
+    if field.startswith('team'):
+        return 'quarter'
+    return field.split('_', 1)[1]
+
+
+def accuracy_report(pairs, output_folder):
+    by_type = {}
+    correct = total = 0
+    missing = []
+    for image_path, expected in pairs:
+        output_json_path = os.path.join(output_folder, f'{os.path.basename(image_path)}_results.json')
+        if not os.path.exists(output_json_path):
+            missing.append(os.path.basename(image_path))
+            continue
+        with open(output_json_path, 'r') as json_file:
+            actual = json.load(json_file)
+        image_correct, image_total, wrong = field_accuracy(expected, actual)
+        correct += image_correct
+        total += image_total
+        wrong = set(wrong)
+        for field in result_fields(expected):
+            counts = by_type.setdefault(field_type(field), [0, 0])
+            counts[0] += field not in wrong
+            counts[1] += 1
+    return {
+        'overall': correct / total if total else 0.0,
+        'fields': {name: counts[0] / counts[1] for name, counts in sorted(by_type.items())},
+        'missing_results': missing,
+    }
+
+
+def run_benchmark(image_folder, json_folder, processor_kwargs, trace_memory=False):
+    pairs = reference_pairs(image_folder, json_folder)
+    if not pairs:
+        raise ValueError(f'No screenshot/JSON pairs found in {image_folder} and {json_folder}; '
+                         f'generate some with generate_boxscores.py')
+
+    # process_images moves its inputs, so it runs on a scratch copy of the corpus
+    with tempfile.TemporaryDirectory(prefix='ocr_benchmark_') as work_folder:
+        input_folder = os.path.join(work_folder, 'images')
+        output_folder = os.path.join(work_folder, 'json')
+        done_folder = os.path.join(work_folder, 'processed')
+        for folder in (input_folder, output_folder, done_folder):
+            os.makedirs(folder)
+        for image_path, _ in pairs:
+            shutil.copy(image_path, input_folder)
+
+        processor = OCRProcessor(image_output_folder=done_folder, **processor_kwargs)
+        start = time.perf_counter()
+        processor.reader
+        model_load_seconds = time.perf_counter() - start
+
+        metrics.enable(track_regions=True)
+        metrics.reset()
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        processor.process_images(input_folder, output_folder)
+        elapsed = time.perf_counter() - start
+        python_peak_mb = None
+        if trace_memory:
+            python_peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+        accuracy = accuracy_report(pairs, output_folder)
+
+    return {
+        'images': len(pairs),
+        'total_seconds': elapsed,
+        'images_per_second': len(pairs) / elapsed if elapsed else 0.0,
+        'model_load_seconds': model_load_seconds,
+        'stages': stage_summary(),
+        'counters': dict(metrics.counters),
+        'slowest_regions': dict(metrics.slowest_regions(REGIONS_IN_REPORT)),
+        'peak_rss_mb': peak_rss_mb(),
+        'python_peak_mb': python_peak_mb,
+        'accuracy': accuracy,
+    }
+
+
+def compare_reports(baseline, report):
+    speedup = report['images_per_second'] / max(baseline['images_per_second'], 1e-9)
+    accuracy_delta = report['accuracy']['overall'] - baseline['accuracy']['overall']
+    logging.info(f'Against baseline: {speedup:.2f}x images/sec, {accuracy_delta:+.2%} accuracy')
+    for stage, stats in report['stages'].items():
+        before = baseline['stages'].get(stage)
+        if before:
+            logging.info(f"  {stage}: p50 {before['p50_ms']:.1f} -> {stats['p50_ms']:.1f} ms")
+    for name, value in report['accuracy']['fields'].items():
+        before = baseline['accuracy']['fields'].get(name)
+        if before is not None and abs(value - before) > 1e-9:
+            logging.info(f'  {name} accuracy: {before:.2%} -> {value:.2%}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark OCR speed and accuracy on a screenshot corpus.')
+    parser.add_argument('--images', default=BENCHMARK_IMAGE_FOLDER, help='Screenshots to process')
+    parser.add_argument('--json', default=BENCHMARK_JSON_FOLDER, help='Ground truth *_results.json files')
+    parser.add_argument('--output', default=BENCHMARK_REPORT_PATH, help='Where to write the JSON report')
+    parser.add_argument('--baseline', help='Earlier report to compare against')
+    add_model_arguments(parser, cache=False)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Also report peak Python/NumPy allocations (slows the run down)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Read the baseline first, it may be the report this run overwrites
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+    configure_torch_threads(args.threads, args.interop_threads)
+    device = device_from_args(args)
+    layout, anchor = layout_from_args(args)
+    processor_kwargs = {
+        'languages': args.languages,
+        'device': device,
+        'quantize': args.quantize,
+        'batched': args.batched,
+        'digit_classifier': DigitClassifier(args.digit_templates) if args.digit_templates else None,
+        'min_digit_confidence': args.digit_confidence,
+        'validate': not args.no_validate,
+        'layout': layout,
+        'anchor': anchor,
+    }
+    try:
+        report = run_benchmark(args.images, args.json, processor_kwargs, args.trace_memory)
+    finally:
+        ReaderPool.shutdown()
+
+    report['timestamp'] = datetime.now().isoformat()
+    report['config'] = {
+        'device': device,
+        'quantize': args.quantize,
+        'batched': args.batched,
+        'digit_templates': args.digit_templates,
+        'validate': not args.no_validate,
+        'layout': layout.path,
+        'aligned': anchor is not None,
+        'threads': torch.get_num_threads(),
+        'corpus': os.path.abspath(args.images),
+    }
+    report['platform'] = {
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+    logging.info(f"{report['images']} images in {report['total_seconds']:.2f}s "
+                 f"({report['images_per_second']:.2f} images/sec), "
+                 f"{report['accuracy']['overall']:.2%} of fields correct")
+    for stage, stats in report['stages'].items():
+        logging.info(f"  {stage}: p50 {stats['p50_ms']:.1f} ms, p90 {stats['p90_ms']:.1f} ms, "
+                     f"p99 {stats['p99_ms']:.1f} ms")
+    if report['peak_rss_mb'] is not None:
+        logging.info(f"Peak RSS: {report['peak_rss_mb']:.0f} MB")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as report_file:
+        json.dump(report, report_file, indent=4)
+    logging.info(f'Report saved to {args.output}')
+
+    if baseline is not None:
+        compare_reports(baseline, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import logging
+import argparse
+import numpy as np
+import cv2
+
+DIGIT_TEMPLATES_PATH = './glyph_templates.npz'
+
+# Every segmented glyph is normalized to this size (width, height)
+GLYPH_SIZE = (12, 20)
+# Components shorter than this fraction of the tallest one are treated as noise
+MIN_GLYPH_HEIGHT_RATIO = 0.4
+MIN_GLYPH_AREA = 6
+# Distances are mean squared pixel differences on the normalized glyph
+MAX_GLYPH_DISTANCE = 0.12
+
+
+def normalize_glyph(glyph):
+    # Scale to fit GLYPH_SIZE keeping the aspect ratio, so narrow glyphs such
+    # as '1' and '/' aren't stretched into blocks
+    target_width, target_height = GLYPH_SIZE
+    height, width = glyph.shape
+    scale = min(target_width / width, target_height / height)
+    new_width = max(1, int(round(width * scale)))
+    new_height = max(1, int(round(height * scale)))
+    resized = cv2.resize(glyph, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+    canvas = np.zeros((target_height, target_width), dtype=np.float32)
+    left = (target_width - new_width) // 2
+    top = (target_height - new_height) // 2
+    canvas[top:top + new_height, left:left + new_width] = resized / 255.0
+    return canvas.ravel()
+
+
+def segment_glyphs(image):
+    # Split a BGR crop into normalized glyph bitmaps, left to right
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Text is the minority of the cell, whichever way round the colors are
+    if np.count_nonzero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    crop_height, crop_width = binary.shape
+    boxes = []
+    for left, top, width, height, area in stats[1:count]:
+        # Drop table borders and separators running along the cell edges
+        if width >= 0.9 * crop_width or height >= 0.95 * crop_height or area < MIN_GLYPH_AREA:
+            continue
+        boxes.append((left, top, width, height))
+    if not boxes:
+        return []
+
+    tallest = max(height for _, _, _, height in boxes)
+    boxes = sorted(box for box in boxes if box[3] >= MIN_GLYPH_HEIGHT_RATIO * tallest)
+
+    glyphs = []
+    for left, top, width, height in boxes:
+        glyphs.append(normalize_glyph(binary[top:top + height, left:left + width]))
+    return glyphs
+
+
+class DigitClassifier:
+    # Nearest-neighbour recognizer for the fixed box-score digit font. Only
+    # handles cells whose allowlist is digits (and '/'); returns a confidence
+    # so uncertain cells can fall back to EasyOCR.
+    def __init__(self, templates_path=DIGIT_TEMPLATES_PATH, max_distance=MAX_GLYPH_DISTANCE):
+        data = np.load(templates_path)
+        self.templates = data['glyphs'].astype(np.float32)
+        self.labels = data['labels']
+        self.max_distance = max_distance
+        self._template_norms = (self.templates ** 2).sum(axis=1)
+
+    @staticmethod
+    def supports(allowlist):
+        return bool(allowlist) and set(allowlist) <= set('0123456789/')
+
+    def classify(self, image, allowlist='0123456789/'):
+        glyphs = segment_glyphs(image)
+        if not glyphs:
+            return '', 0.0
+
+        allowed = np.isin(self.labels, list(allowlist))
+        if not allowed.any():
+            return '', 0.0
+        templates = self.templates[allowed]
+        labels = self.labels[allowed]
+        template_norms = self._template_norms[allowed]
+
+        glyphs = np.stack(glyphs)
+        # Squared distances between every glyph and every template at once
+        distances = (glyphs ** 2).sum(axis=1)[:, None] + template_norms[None, :] - 2.0 * glyphs @ templates.T
+        distances = np.maximum(distances, 0.0) / glyphs.shape[1]
+
+        best = distances.argmin(axis=1)
+        best_labels = labels[best]
+        best_distances = distances[np.arange(len(glyphs)), best]
+
+        # Confidence compares the best match with the best match of any other
+        # label; a glyph far from every template gets no confidence at all
+        other = np.where(labels[None, :] == best_labels[:, None], np.inf, distances)
+        runner_up = other.min(axis=1)
+        margin = np.where(np.isfinite(runner_up), 1.0 - best_distances / np.maximum(runner_up, 1e-6), 1.0)
+        margin[best_distances > self.max_distance] = 0.0
+
+        return ''.join(best_labels), float(np.clip(margin, 0.0, 1.0).min())
+
+
+def expected_region_texts(results):
+    # Text each numeric region should read, from a verified results JSON
+    texts = {}
+    for player in results.get('players', []):
+        prefix = f"player{player['player_number']}"
+        for stat in ('points', 'rebounds', 'assists', 'steals', 'blocks', 'fouls', 'tos'):
+            texts[f'{prefix}_{stat}'] = str(player.get(stat, ''))
+        texts[f'{prefix}_FGMFGA'] = f"{player.get('FGM', '')}/{player.get('FGA', '')}"
+        texts[f'{prefix}_3PM3PA'] = f"{player.get('3PM', '')}/{player.get('3PA', '')}"
+        texts[f'{prefix}_FTMFTA'] = f"{player.get('FTM', '')}/{player.get('FTA', '')}"
+    for team in ('team1', 'team2'):
+        for quarter, value in results.get('teams', {}).get(f'{team}_quarters', {}).items():
+            texts[f'{team}_q{quarter[-1]}'] = str(value)
+    return texts
+
+
+def build_templates(image_folder, json_folder, output_path=DIGIT_TEMPLATES_PATH, max_per_label=50):
+    # Imported here so using the classifier doesn't need the OCR stack
+    from automate_2k import OCRProcessor, reference_pairs
+
+    processor = OCRProcessor()
+    samples = {}
+    pairs = reference_pairs(image_folder, json_folder)
+    for image_path, results in pairs:
+        with open(image_path, 'rb') as image_file:
+            image = processor.decode_image(image_file.read())
+        cropped_images, region_names = processor.crop_and_save_regions(image)
+        expected = expected_region_texts(results)
+
+        for cropped_image, region_name in zip(cropped_images, region_names):
+            text = expected.get(region_name)
+            if not text or not set(text) <= set('0123456789/'):
+                continue
+            glyphs = segment_glyphs(cropped_image)
+            # Only trust cells where segmentation found exactly one glyph per character
+            if len(glyphs) != len(text):
+                continue
+            for glyph, char in zip(glyphs, text):
+                samples.setdefault(char, []).append(glyph)
+
+    if not samples:
+        raise ValueError(f'No usable glyphs found in {json_folder} / {image_folder}')
+
+    glyphs, labels = [], []
+    for char, char_glyphs in sorted(samples.items()):
+        # Keep an even spread of exemplars when there are more than needed
+        step = max(1, len(char_glyphs) // max_per_label)
+        for glyph in char_glyphs[::step][:max_per_label]:
+            glyphs.append(glyph)
+            labels.append(char)
+
+    np.savez_compressed(output_path, glyphs=np.stack(glyphs), labels=np.array(labels))
+    logging.info(f'Saved {len(glyphs)} glyph templates from {len(pairs)} screenshots to {output_path}')
+    return {char: len(char_glyphs) for char, char_glyphs in samples.items()}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Build digit glyph templates from verified screenshots.')
+    parser.add_argument('--images', default='./processed/images/', help='Folder with the original screenshots')
+    parser.add_argument('--json', default='./processed/json/', help='Folder with the verified *_results.json files')
+    parser.add_argument('--output', default=DIGIT_TEMPLATES_PATH, help='Where to write the templates')
+    parser.add_argument('--max-per-label', type=int, default=50, help='Exemplars kept per character')
+    args = parser.parse_args()
+
+    counts = build_templates(args.images, args.json, args.output, args.max_per_label)
+    for char, count in sorted(counts.items()):
+        logging.info(f"  '{char}': {count} samples")
+
+
+if __name__ == "__main__":
+    main()
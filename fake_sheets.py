@@ -0,0 +1,111 @@
+import json
+import time
+import threading
+from collections import deque
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+# In-memory stand-ins for the gspread objects automate_sheet.py uses, for
+# dry runs and for exercising the write path without touching the API.
+# With a quota set they answer 429 like the real API once a kind of request
+# (read or write) goes over its per-window limit.
+
+WRITE_CALLS = ('append_row', 'append_rows')
+
+
+class FakeResponse:
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = json.dumps({'error': {'code': status_code, 'message': message, 'status': 'RESOURCE_EXHAUSTED'}})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeQuota:
+    # Sliding-window request counter shared by all worksheets of a client
+    def __init__(self, requests_per_window, window_seconds=60.0):
+        self.requests_per_window = requests_per_window
+        self.window_seconds = window_seconds
+        self.requests = {'read': deque(), 'write': deque()}
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def check(self, kind):
+        with self.lock:
+            now = time.monotonic()
+            requests = self.requests[kind]
+            while requests and now - requests[0] >= self.window_seconds:
+                requests.popleft()
+            if len(requests) >= self.requests_per_window:
+                self.rejected += 1
+                raise APIError(FakeResponse(429, f'Quota exceeded for {kind} requests'))
+            requests.append(now)
+
+
+class FakeWorksheet:
+    def __init__(self, title, header=None, quota=None):
+        self.title = title
+        self.rows = [list(header)] if header else []
+        self.calls = {}
+        self.quota = quota
+        self.lock = threading.Lock()
+
+    def record_call(self, name):
+        if self.quota is not None:
+            self.quota.check('write' if name in WRITE_CALLS else 'read')
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def append_row(self, values, **kwargs):
+        self.record_call('append_row')
+        self.rows.append(list(values))
+
+    def append_rows(self, values, **kwargs):
+        self.record_call('append_rows')
+        self.rows.extend(list(row) for row in values)
+
+    def col_values(self, col, **kwargs):
+        self.record_call('col_values')
+        return [row[col - 1] if len(row) >= col else '' for row in self.rows]
+
+    def get_all_records(self, **kwargs):
+        self.record_call('get_all_records')
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        return [dict(zip(header, row)) for row in self.rows[1:]]
+
+    def get_values(self, range_name=None, **kwargs):
+        self.record_call('get_values')
+        return self.read_range(range_name)
+
+    def batch_get(self, ranges, **kwargs):
+        self.record_call('batch_get')
+        return [self.read_range(range_name) for range_name in ranges]
+
+    def read_range(self, range_name):
+        if range_name is None:
+            return [list(row) for row in self.rows]
+        grid = a1_range_to_grid_range(range_name)
+        start_row = grid.get('startRowIndex', 0)
+        end_row = grid.get('endRowIndex', len(self.rows))
+        start_col = grid.get('startColumnIndex', 0)
+        end_col = grid.get('endColumnIndex')
+        return [row[start_col:end_col] for row in self.rows[start_row:end_row]]
+
+
+class FakeSheetsClient:
+    # Matches GoogleSheetsClient.get_sheet; worksheets are created on first use
+    def __init__(self, headers=None, quota_per_minute=None, window_seconds=60.0):
+        self.headers = headers or {}
+        self.worksheets = {}
+        self.quota = FakeQuota(quota_per_minute, window_seconds) if quota_per_minute else None
+
+    def get_sheet(self, sheet_name):
+        if sheet_name not in self.worksheets:
+            self.worksheets[sheet_name] = FakeWorksheet(sheet_name, self.headers.get(sheet_name), self.quota)
+        return self.worksheets[sheet_name]
+
+    def call_counts(self):
+        return {title: dict(sheet.calls) for title, sheet in self.worksheets.items()}
@@ -0,0 +1,205 @@
+import os
+import json
+import random
+import hashlib
+import logging
+import argparse
+import numpy as np
+import cv2
+from automate_2k import OCRProcessor
+from digit_classifier import expected_region_texts
+from layout import Layout
+
+BENCHMARK_IMAGE_FOLDER = './benchmark/images/'
+BENCHMARK_JSON_FOLDER = './benchmark/json/'
+
+GRADES = ('A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F')
+NAME_PARTS = ('ace', 'buck', 'dime', 'flash', 'glide', 'hoop', 'king', 'lob', 'mamba', 'nova',
+              'rook', 'slick', 'splash', 'swish', 'tank', 'vert', 'wolf', 'zone')
+
+BACKGROUND_COLOR = (28, 22, 20)
+ROW_COLORS = ((48, 40, 36), (40, 33, 30))
+TEXT_COLOR = (235, 235, 235)
+FONT = cv2.FONT_HERSHEY_DUPLEX
+FONT_THICKNESS = 3
+# Cap height of the text at the reference resolution
+TEXT_HEIGHT = 38
+CELL_MARGIN = 8
+
+# --misalign: HUD scale range, largest capture offset in reference pixels, and
+# the share of frames put inside bars of another aspect ratio
+MISALIGN_HUD_SCALES = (0.85, 1.0)
+MISALIGN_MAX_SHIFT = 40
+MISALIGN_LETTERBOX_RATE = 0.3
+LETTERBOX_ASPECTS = (21 / 9, 16 / 10, 4 / 3)
+
+
+def random_name(rng):
+    name = rng.choice(NAME_PARTS) + rng.choice(NAME_PARTS)
+    if rng.random() < 0.5:
+        name += str(rng.randint(1, 99))
+    return name.capitalize() if rng.random() < 0.5 else name
+
+
+def random_player(rng, player_number):
+    # Shooting lines that add up: points = 2*FGM + 3PM + FTM
+    fga = rng.randint(0, 24)
+    fg3a = rng.randint(0, fga)
+    fg3m = sum(rng.random() < 0.35 for _ in range(fg3a))
+    fg2m = sum(rng.random() < 0.5 for _ in range(fga - fg3a))
+    fta = rng.randint(0, 10)
+    ftm = sum(rng.random() < 0.75 for _ in range(fta))
+    fgm = fg2m + fg3m
+    return {
+        'player_number': player_number,
+        'position': OCRProcessor.get_position(player_number),
+        'team': OCRProcessor.get_team(player_number),
+        'name': random_name(rng),
+        'grade': rng.choice(GRADES),
+        'points': str(2 * fgm + fg3m + ftm),
+        'rebounds': str(rng.randint(0, 15)),
+        'assists': str(rng.randint(0, 14)),
+        'steals': str(rng.randint(0, 6)),
+        'blocks': str(rng.randint(0, 5)),
+        'fouls': str(rng.randint(0, 5)),
+        'tos': str(rng.randint(0, 7)),
+        'FGM': str(fgm),
+        'FGA': str(fga),
+        '3PM': str(fg3m),
+        '3PA': str(fg3a),
+        'FTM': str(ftm),
+        'FTA': str(fta),
+    }
+
+
+def split_quarters(rng, total):
+    cuts = sorted(rng.randint(0, total) for _ in range(3))
+    scores = [b - a for a, b in zip([0] + cuts, cuts + [total])]
+    return {f'quarter_{i + 1}': str(score) for i, score in enumerate(scores)}
+
+
+def random_game(rng):
+    players = [random_player(rng, number) for number in range(1, 11)]
+    teams = {}
+    for team in ('team1', 'team2'):
+        total = sum(int(player['points']) for player in players if player['team'] == team)
+        teams[f'{team}_quarters'] = split_quarters(rng, total)
+    results = {'players': players, 'teams': teams}
+    results_json_str = json.dumps(results, sort_keys=True)
+    results['hash'] = hashlib.sha256(results_json_str.encode('utf-8')).hexdigest()
+    return results
+
+
+def region_texts(results):
+    # What each region shows on screen, keyed by region name
+    texts = expected_region_texts(results)
+    for player in results['players']:
+        texts[f"player{player['player_number']}_name"] = player['name']
+        texts[f"player{player['player_number']}_grade"] = player['grade']
+    return texts
+
+
+def draw_text(image, text, region, centered):
+    x, y, width, height = region['x'], region['y'], region['width'], region['height']
+    (unit_width, unit_height), _ = cv2.getTextSize(text, FONT, 1.0, FONT_THICKNESS)
+    scale = min(TEXT_HEIGHT / unit_height, (width - 2 * CELL_MARGIN) / max(unit_width, 1))
+    (text_width, text_height), _ = cv2.getTextSize(text, FONT, scale, FONT_THICKNESS)
+    left = x + (width - text_width) // 2 if centered else x + CELL_MARGIN
+    baseline = y + (height + text_height) // 2
+    cv2.putText(image, text, (int(left), int(baseline)), FONT, scale, TEXT_COLOR, FONT_THICKNESS, cv2.LINE_AA)
+
+
+def render_boxscore(results, layout):
+    # Draw the scoreboard at the reference resolution, with every value in its region
+    reference_width, reference_height = layout.reference_size
+    image = np.full((reference_height, reference_width, 3), BACKGROUND_COLOR, dtype=np.uint8)
+    texts = region_texts(results)
+    for region in layout.regions:
+        if region['name'].endswith('_name'):
+            row = int(region['name'][6:].split('_')[0]) - 1
+            cv2.rectangle(image, (region['x'] - CELL_MARGIN, region['y']),
+                          (reference_width - CELL_MARGIN * 20, region['y'] + region['height']),
+                          ROW_COLORS[row % 2], thickness=-1)
+    for region in layout.regions:
+        draw_text(image, texts[region['name']], region, centered='name' not in region['name'])
+    return image
+
+
+def misalign(image, rng):
+    # A capture that doesn't line up with the layout: the HUD scaled down
+    # around the center, shifted a little, and sometimes inside black bars
+    height, width = image.shape[:2]
+    scale = rng.uniform(*MISALIGN_HUD_SCALES)
+    dx, dy = rng.uniform(-MISALIGN_MAX_SHIFT, MISALIGN_MAX_SHIFT), rng.uniform(-MISALIGN_MAX_SHIFT, MISALIGN_MAX_SHIFT)
+    matrix = np.float32([[scale, 0, (1 - scale) * width / 2 + dx], [0, scale, (1 - scale) * height / 2 + dy]])
+    image = cv2.warpAffine(image, matrix, (width, height), borderValue=BACKGROUND_COLOR)
+    if rng.random() >= MISALIGN_LETTERBOX_RATE:
+        return image
+    aspect = rng.choice(LETTERBOX_ASPECTS)
+    frame_width, frame_height = max(width, round(height * aspect)), max(height, round(width / aspect))
+    frame = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+    left, top = (frame_width - width) // 2, (frame_height - height) // 2
+    frame[top:top + height, left:left + width] = image
+    return frame
+
+
+def degrade(image, rng, noise):
+    if noise > 0:
+        noise_image = np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).normal(0, noise, image.shape)
+        image = np.clip(image + noise_image, 0, 255).astype(np.uint8)
+    return image
+
+
+def encode_image(image, jpeg_quality):
+    if jpeg_quality:
+        return '.jpg', cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])[1]
+    return '.png', cv2.imencode('.png', image)[1]
+
+
+def generate_corpus(count, image_folder=BENCHMARK_IMAGE_FOLDER, json_folder=BENCHMARK_JSON_FOLDER,
+                    scales=(1.0,), noise=0.0, jpeg_quality=0, seed=0, misaligned=False):
+    rng = random.Random(seed)
+    layout = Layout.load()
+    os.makedirs(image_folder, exist_ok=True)
+    os.makedirs(json_folder, exist_ok=True)
+
+    written = 0
+    for index in range(count):
+        results = random_game(rng)
+        image = render_boxscore(results, layout)
+        if misaligned:
+            image = misalign(image, rng)
+        for scale in scales:
+            width, height = int(image.shape[1] * scale), int(image.shape[0] * scale)
+            scaled = image if scale == 1.0 else cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            extension, encoded = encode_image(degrade(scaled, rng, noise), jpeg_quality)
+            filename = f'synthetic_{index:04d}_{width}x{height}{extension}'
+            encoded.tofile(os.path.join(image_folder, filename))
+            with open(os.path.join(json_folder, f'{filename}_results.json'), 'w') as json_file:
+                json.dump(results, json_file, indent=4)
+            written += 1
+    logging.info(f'Wrote {written} synthetic box scores to {image_folder} (ground truth in {json_folder})')
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render synthetic box score screenshots with known results.')
+    parser.add_argument('--count', type=int, default=20, help='Number of games to generate')
+    parser.add_argument('--images', default=BENCHMARK_IMAGE_FOLDER)
+    parser.add_argument('--json', default=BENCHMARK_JSON_FOLDER, help='Where the ground truth JSON goes')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0],
+                        help='Resolutions to render, as fractions of 3840x2160 (e.g. 1.0 0.5)')
+    parser.add_argument('--noise', type=float, default=0.0, help='Standard deviation of added pixel noise')
+    parser.add_argument('--jpeg-quality', type=int, default=0,
+                        help='Save as JPEG at this quality instead of PNG to add compression artifacts')
+    parser.add_argument('--misalign', action='store_true',
+                        help='Scale and shift the scoreboard and add letterbox bars, like odd captures')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate_corpus(args.count, args.images, args.json, args.scales, args.noise, args.jpeg_quality, args.seed,
+                    args.misalign)
+
+
+if __name__ == "__main__":
+    main()
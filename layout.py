@@ -0,0 +1,367 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+import numpy as np
+import cv2
+
+# Where the scoreboard cells are, described once at a reference resolution in
+# a layout file and compiled into pixel boxes per input resolution. Before
+# cropping, black letterbox/pillarbox bars are trimmed and, when an anchor
+# template has been built, the scoreboard is located on a small grayscale
+# copy of the frame to correct capture offsets and HUD scaling.
+
+LAYOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'boxscore_layout.json')
+ANCHOR_PATH = './layout_anchor.npz'
+LAYOUT_VERSION = 1
+
+# Rows/columns at the frame edges darker than this (0-255) are letterbox bars
+LETTERBOX_LEVEL = 16
+# Pixel step used when sampling the frame for bars
+LETTERBOX_STEP = 8
+# Relative difference from the reference aspect ratio still treated as equal
+ASPECT_TOLERANCE = 0.02
+
+# Width of the grayscale copy of the frame the anchor is matched on
+ALIGN_WIDTH = 640
+# The scales are compared on a copy reduced this much further, then the best
+# match is refined within this many working pixels
+ALIGN_COARSE_REDUCTION = 4
+ALIGN_SEARCH_MARGIN = 6
+# HUD scales tried first, then refined around the best one by halving the step
+ALIGN_SCALES = (0.8, 0.85, 0.9, 0.95, 1.0, 1.05)
+ALIGN_REFINE_STEPS = (0.025, 0.0125, 0.00625)
+# Normalized correlation below which the anchor is considered not found
+ALIGN_MIN_SCORE = 0.5
+MAX_ANCHOR_IMAGES = 50
+
+
+def compile_regions(data):
+    # Regions in the order the grids list them, row by row
+    regions = []
+    for grid in data['grids']:
+        for row, y in enumerate(grid['rows'], start=1):
+            for column in grid['columns']:
+                regions.append({
+                    'name': grid['region'].format(row=row, column=column['name']),
+                    'x': column['x'],
+                    'y': y + column.get('y', 0),
+                    'width': column['width'],
+                    'height': column.get('height', grid['height'])
+                })
+    return regions
+
+
+def regions_bounds(regions):
+    # Smallest (x, y, width, height) rectangle around every region
+    left = min(region['x'] for region in regions)
+    top = min(region['y'] for region in regions)
+    right = max(region['x'] + region['width'] for region in regions)
+    bottom = max(region['y'] + region['height'] for region in regions)
+    return left, top, right - left, bottom - top
+
+
+class Alignment:
+    # Where the layout sits in a frame: the content rectangle left after
+    # trimming bars, and a scale and offset (in reference pixels) applied to
+    # the layout inside it. Values are rounded so repeated captures from the
+    # same setup share one compiled region table.
+    __slots__ = ('content', 'scale', 'dx', 'dy', 'score')
+
+    def __init__(self, content, scale=1.0, dx=0.0, dy=0.0, score=None):
+        self.content = tuple(int(value) for value in content)
+        self.scale = round(float(scale), 3)
+        self.dx = round(float(dx))
+        self.dy = round(float(dy))
+        self.score = score
+
+    @property
+    def key(self):
+        return self.content, self.scale, self.dx, self.dy
+
+    def __repr__(self):
+        score = '' if self.score is None else f', score {self.score:.2f}'
+        return f'Alignment(content {self.content}, scale {self.scale}, offset ({self.dx}, {self.dy}){score})'
+
+
+class Layout:
+    def __init__(self, data, path=None):
+        if data.get('version', LAYOUT_VERSION) != LAYOUT_VERSION:
+            raise ValueError(f"Unsupported layout version {data.get('version')} in {path}")
+        self.path = path
+        self.name = data.get('name', os.path.basename(path or 'layout'))
+        self.reference_size = tuple(data['reference_size'])
+        self.regions = compile_regions(data)
+        self.region_names = [region['name'] for region in self.regions]
+        self.anchor_box = tuple(data.get('anchor', {}).get('box') or regions_bounds(self.regions))
+        layout_json = json.dumps({'reference_size': self.reference_size, 'regions': self.regions,
+                                  'anchor_box': self.anchor_box}, sort_keys=True)
+        self.key = hashlib.sha256(layout_json.encode('utf-8')).hexdigest()
+        self._coords = np.array([[region['x'], region['y'], region['width'], region['height']]
+                                 for region in self.regions], dtype=np.float64)
+        self._tables = {}
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or LAYOUT_PATH
+        with open(path, 'r') as layout_file:
+            return cls(json.load(layout_file), path)
+
+    def boxes(self, width, height, alignment=None):
+        # Pixel boxes (left, upper, right, lower) for every region, compiled
+        # once per resolution and alignment instead of once per region per image
+        key = (width, height) if alignment is None else (width, height) + alignment.key
+        table = self._tables.get(key)
+        if table is None:
+            table = self.compile_boxes(width, height, alignment)
+            self._tables[key] = table
+        return table
+
+    def compile_boxes(self, width, height, alignment=None):
+        reference_width, reference_height = self.reference_size
+        content_left, content_top, content_right, content_bottom = (0, 0, width, height) if alignment is None \
+            else alignment.content
+        scale, dx, dy = (1.0, 0, 0) if alignment is None else (alignment.scale, alignment.dx, alignment.dy)
+        content_width, content_height = content_right - content_left, content_bottom - content_top
+
+        x, y, region_width, region_height = self._coords.T
+        left = content_left + ((x * scale + dx) * content_width / reference_width).astype(int)
+        upper = content_top + ((y * scale + dy) * content_height / reference_height).astype(int)
+        right = left + (region_width * scale * content_width / reference_width).astype(int)
+        lower = upper + (region_height * scale * content_height / reference_height).astype(int)
+        boxes = np.stack([np.clip(left, 0, width), np.clip(upper, 0, height),
+                          np.clip(right, 0, width), np.clip(lower, 0, height)], axis=1)
+        return boxes.tolist()
+
+
+def bright_lines(lines):
+    return lines.reshape(len(lines), -1).max(axis=1) > LETTERBOX_LEVEL
+
+
+def picture_edges(image, sampled):
+    # First and one past the last bright line along axis 0, refined to the
+    # pixel inside the LETTERBOX_STEP bands around the sampled ones
+    start = max(0, (sampled[0] - 1) * LETTERBOX_STEP + 1)
+    first = start + int(np.argmax(bright_lines(image[start:sampled[0] * LETTERBOX_STEP + 1])))
+    start = sampled[-1] * LETTERBOX_STEP
+    band = bright_lines(image[start:start + LETTERBOX_STEP])
+    return first, start + len(band) - int(np.argmax(band[::-1]))
+
+
+def content_bounds(image, reference_size):
+    # (left, top, right, bottom) of the picture inside letterbox or pillarbox
+    # bars. A trim that doesn't leave the reference aspect ratio is dark
+    # scenery rather than bars; a frame of another aspect ratio without
+    # detectable bars is assumed to be centered.
+    height, width = image.shape[:2]
+    reference_aspect = reference_size[0] / reference_size[1]
+    if min(image[0].max(), image[-1].max(), image[:, 0].max(), image[:, -1].max()) <= LETTERBOX_LEVEL:
+        sample = image[::LETTERBOX_STEP, ::LETTERBOX_STEP]
+        bright = (sample.max(axis=2) if sample.ndim == 3 else sample) > LETTERBOX_LEVEL
+        rows, columns = np.flatnonzero(bright.any(axis=1)), np.flatnonzero(bright.any(axis=0))
+        if len(rows) and len(columns):
+            top, bottom = picture_edges(image, rows)
+            left, right = picture_edges(image.swapaxes(0, 1), columns)
+            if abs((right - left) / (bottom - top) / reference_aspect - 1) <= ASPECT_TOLERANCE:
+                return left, top, right, bottom
+
+    if abs(width / height / reference_aspect - 1) <= ASPECT_TOLERANCE:
+        return 0, 0, width, height
+    if width / height > reference_aspect:
+        content_width = int(round(height * reference_aspect))
+        left = (width - content_width) // 2
+        return left, 0, left + content_width, height
+    content_height = int(round(width / reference_aspect))
+    top = (height - content_height) // 2
+    return 0, top, width, top + content_height
+
+
+def working_image(image, content, reference_size):
+    # Grayscale copy of the content area at ALIGN_WIDTH, in the reference
+    # aspect ratio. Large frames are first thinned out to twice that size,
+    # which is much cheaper than area-averaging all of a 4K frame.
+    left, top, right, bottom = content
+    size = (ALIGN_WIDTH, int(round(ALIGN_WIDTH * reference_size[1] / reference_size[0])))
+    picture = image[top:bottom, left:right]
+    if picture.shape[1] > 2 * size[0] and picture.shape[0] > 2 * size[1]:
+        picture = cv2.resize(picture, (2 * size[0], 2 * size[1]), interpolation=cv2.INTER_NEAREST)
+    picture = cv2.resize(picture, size, interpolation=cv2.INTER_AREA)
+    if picture.ndim == 3:
+        picture = cv2.cvtColor(picture, cv2.COLOR_BGR2GRAY)
+    return picture.astype(np.float32)
+
+
+def anchor_patch(working, layout):
+    # The anchor box of a frame that is already aligned with the layout
+    factor = ALIGN_WIDTH / layout.reference_size[0]
+    x, y, width, height = layout.anchor_box
+    left, top = int(round(x * factor)), int(round(y * factor))
+    return working[top:top + int(round(height * factor)), left:left + int(round(width * factor))]
+
+
+def peak_offset(scores, index, axis):
+    # Sub-pixel position of the correlation peak from a parabola through its neighbours
+    position = list(index)
+    if position[axis] == 0 or position[axis] == scores.shape[axis] - 1:
+        return 0.0
+    position[axis] -= 1
+    before = scores[tuple(position)]
+    position[axis] += 2
+    after = scores[tuple(position)]
+    curvature = before - 2 * scores[index] + after
+    return 0.0 if curvature >= 0 else 0.5 * (before - after) / curvature
+
+
+class Anchor:
+    # Average anchor-box patch of box score screenshots known to line up with
+    # the layout. Names and numbers average out; the panel, row bands and
+    # headers that every box score shares remain.
+    def __init__(self, template, layout_key):
+        self.template = template.astype(np.float32)
+        self.layout_key = layout_key
+        self._scaled = {}
+
+    @classmethod
+    def build(cls, image_paths, layout):
+        patches = []
+        for path in image_paths[:MAX_ANCHOR_IMAGES]:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            content = content_bounds(image, layout.reference_size)
+            patches.append(anchor_patch(working_image(image, content, layout.reference_size), layout))
+        if not patches:
+            raise ValueError('No readable box score screenshots to build the layout anchor from')
+        return cls(np.mean(patches, axis=0), layout.key)
+
+    @classmethod
+    def load(cls, path, layout):
+        data = np.load(path)
+        if str(data['layout_key']) != layout.key or int(data['align_width']) != ALIGN_WIDTH:
+            raise ValueError(f'{path} was built for another layout; rebuild it with layout.py build-anchor')
+        return cls(data['template'], layout.key)
+
+    @classmethod
+    def load_if_exists(cls, path, layout):
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path, layout)
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f'Not aligning screenshots: {e}')
+            return None
+
+    def save(self, path):
+        np.savez_compressed(path, template=self.template, layout_key=np.array(self.layout_key),
+                            align_width=np.array(ALIGN_WIDTH))
+
+    def scaled(self, scale, reduction=1):
+        template = self._scaled.get((scale, reduction))
+        if template is None:
+            height, width = self.template.shape
+            size = (max(1, int(round(width * scale / reduction))), max(1, int(round(height * scale / reduction))))
+            template = cv2.resize(self.template, size, interpolation=cv2.INTER_AREA)
+            self._scaled[(scale, reduction)] = template
+        return template
+
+    @staticmethod
+    def match(image, template, origin=(0, 0)):
+        # Best correlation and the sub-pixel (x, y) of the template's corner
+        if template.shape[0] > image.shape[0] or template.shape[1] > image.shape[1]:
+            return -1.0, origin
+        scores = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+        row, column = np.unravel_index(np.argmax(scores), scores.shape)
+        return float(scores[row, column]), (origin[0] + column + peak_offset(scores, (row, column), 1),
+                                            origin[1] + row + peak_offset(scores, (row, column), 0))
+
+    def align(self, image, layout, content=None):
+        # Best scale and position of the anchor, or None when it can't be
+        # found. Scales are compared on a coarse copy of the working image;
+        # the refinement only searches a small window around that match.
+        content = content or content_bounds(image, layout.reference_size)
+        working = working_image(image, content, layout.reference_size)
+        coarse = cv2.resize(working, (working.shape[1] // ALIGN_COARSE_REDUCTION,
+                                      working.shape[0] // ALIGN_COARSE_REDUCTION), interpolation=cv2.INTER_AREA)
+        coarse_matches = {scale: self.match(coarse, self.scaled(scale, ALIGN_COARSE_REDUCTION))
+                          for scale in ALIGN_SCALES}
+        best = max(coarse_matches, key=lambda scale: coarse_matches[scale][0])
+        corner_x, corner_y = (int(value * ALIGN_COARSE_REDUCTION) for value in coarse_matches[best][1])
+
+        def refine(scale):
+            template = self.scaled(scale)
+            left, top = max(0, corner_x - ALIGN_SEARCH_MARGIN), max(0, corner_y - ALIGN_SEARCH_MARGIN)
+            window = working[top:corner_y + ALIGN_SEARCH_MARGIN + template.shape[0],
+                             left:corner_x + ALIGN_SEARCH_MARGIN + template.shape[1]]
+            return self.match(window, template, (left, top))
+
+        matches = {best: refine(best)}
+        for step in ALIGN_REFINE_STEPS:
+            for scale in (round(best - step, 5), round(best + step, 5)):
+                if scale not in matches:
+                    matches[scale] = refine(scale)
+            best = max(matches, key=lambda scale: matches[scale][0])
+
+        score, (column, row) = matches[best]
+        if score < ALIGN_MIN_SCORE:
+            return None
+        # Where the anchor box's corner landed, back in reference pixels
+        factor = ALIGN_WIDTH / layout.reference_size[0]
+        x, y, _, _ = layout.anchor_box
+        return Alignment(content, best, column / factor - best * x, row / factor - best * y, score)
+
+
+def build_anchor(image_folder, layout_path=None, output_path=ANCHOR_PATH):
+    layout = Layout.load(layout_path)
+    paths = [os.path.join(image_folder, filename) for filename in sorted(os.listdir(image_folder))
+             if filename.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    anchor = Anchor.build(paths, layout)
+    anchor.save(output_path)
+    logging.info(f'Saved the {layout.name} anchor from {min(len(paths), MAX_ANCHOR_IMAGES)} screenshots '
+                 f'to {output_path}')
+    return anchor
+
+
+def check_alignment(image_paths, layout_path=None, anchor_path=ANCHOR_PATH):
+    layout = Layout.load(layout_path)
+    anchor = Anchor.load(anchor_path, layout)
+    failed = 0
+    for path in image_paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f'{path}: could not be read')
+            failed += 1
+            continue
+        alignment = anchor.align(image, layout)
+        if alignment is None:
+            print(f'{path}: anchor not found, content {content_bounds(image, layout.reference_size)}')
+            failed += 1
+        else:
+            print(f'{path}: {alignment}')
+    return 1 if failed else 0
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Build and check the anchor used to align screenshots '
+                                                 'with the box score layout.')
+    parser.add_argument('--layout', help='Layout file (default: boxscore_layout.json next to this script)')
+    parser.add_argument('--anchor', default=ANCHOR_PATH, help='Anchor template file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build-anchor', help='Average the anchor area of screenshots that '
+                                                              'line up with the layout')
+    build_parser.add_argument('--images', default='./processed/images/',
+                              help='Folder with correctly read screenshots')
+    check_parser = subparsers.add_parser('check', help='Show the alignment found for screenshots')
+    check_parser.add_argument('images', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build-anchor':
+        build_anchor(args.images, args.layout, args.anchor)
+    else:
+        sys.exit(check_alignment(args.images, args.layout, args.anchor))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+PROMETHEUS_PREFIX = 'automate2k'
+
+# Returned by span() when metrics are off, so a disabled span costs one call
+NULL_SPAN = nullcontext()
+
+
+class Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    # Timing spans, counters and an optional per-region breakdown for the OCR
+    # and upload pipelines. Everything is a no-op until enable() is called.
+    def __init__(self):
+        self.enabled = False
+        self.track_regions = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self, track_regions=False):
+        self.enabled = True
+        self.track_regions = track_regions
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}
+            self.counters = {}
+            self.regions = {}
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.spans.setdefault(name, []).append(seconds)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def region(self, region_name, seconds=None, **counts):
+        # Per-cell timings and events such as cache hits or fallbacks
+        if not self.track_regions:
+            return
+        with self.lock:
+            stats = self.regions.setdefault(region_name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            if seconds is not None:
+                stats['calls'] += 1
+                stats['seconds'] += seconds
+                stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            for name, amount in counts.items():
+                stats[name] = stats.get(name, 0) + amount
+
+    def span_summary(self):
+        with self.lock:
+            spans = {name: np.array(samples) for name, samples in self.spans.items()}
+        summary = {}
+        for name, samples in sorted(spans.items()):
+            summary[name] = {'count': len(samples), 'total_seconds': float(samples.sum()),
+                             'mean_seconds': float(samples.mean()), 'max_seconds': float(samples.max())}
+            for percentile in PERCENTILES:
+                summary[name][f'p{percentile}_seconds'] = float(np.percentile(samples, percentile))
+        return summary
+
+    def slowest_regions(self, limit=None):
+        with self.lock:
+            regions = {name: dict(stats) for name, stats in self.regions.items()}
+        ranked = sorted(regions.items(), key=lambda item: item[1]['seconds'], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def summary(self):
+        summary = {'spans': self.span_summary(), 'counters': dict(self.counters)}
+        if self.track_regions:
+            summary['regions'] = dict(self.slowest_regions())
+        return summary
+
+    def report_lines(self, region_limit=10):
+        lines = []
+        for name, stats in self.span_summary().items():
+            lines.append(f"{name}: {stats['count']} calls, {stats['total_seconds']:.2f}s total, "
+                         f"p50 {stats['p50_seconds'] * 1000:.1f} ms, p99 {stats['p99_seconds'] * 1000:.1f} ms")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{name}: {value}')
+        if self.track_regions:
+            for name, stats in self.slowest_regions(region_limit):
+                events = ', '.join(f'{key} {value}' for key, value in stats.items()
+                                   if key not in ('calls', 'seconds', 'max_seconds'))
+                lines.append(f"region {name}: {stats['seconds'] * 1000:.1f} ms over {stats['calls']} reads"
+                             + (f' ({events})' if events else ''))
+        return lines
+
+    def write_json(self, path):
+        write_atomic(path, json.dumps(self.summary(), indent=4))
+
+    def write_prometheus(self, path):
+        # Textfile collector format; spans become summaries, counters counters
+        lines = [f'# HELP {PROMETHEUS_PREFIX}_stage_seconds Time spent per pipeline stage',
+                 f'# TYPE {PROMETHEUS_PREFIX}_stage_seconds summary']
+        for name, stats in self.span_summary().items():
+            for percentile in PERCENTILES:
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{stage="{name}",quantile="{percentile / 100}"}} '
+                             f"{stats[f'p{percentile}_seconds']}")
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{stage="{name}"}} {stats["total_seconds"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines += [f'# HELP {PROMETHEUS_PREFIX}_events_total Pipeline events',
+                  f'# TYPE {PROMETHEUS_PREFIX}_events_total counter']
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{PROMETHEUS_PREFIX}_events_total{{event="{name}"}} {value}')
+        if self.track_regions:
+            lines += [f'# HELP {PROMETHEUS_PREFIX}_region_seconds_total Recognition time per scoreboard cell',
+                      f'# TYPE {PROMETHEUS_PREFIX}_region_seconds_total counter']
+            for name, stats in self.slowest_regions():
+                lines.append(f'{PROMETHEUS_PREFIX}_region_seconds_total{{region="{name}"}} {stats["seconds"]}')
+        write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as output_file:
+        output_file.write(text)
+    os.replace(temp_path, path)
+
+
+def add_metrics_arguments(parser, regions=False):
+    parser.add_argument('--metrics-json', metavar='PATH', help='Write stage timings and counters to a JSON file')
+    parser.add_argument('--metrics-prom', metavar='PATH', help='Write stage timings as a Prometheus textfile')
+    if regions:
+        parser.add_argument('--metrics-regions', action='store_true',
+                            help='Also time every scoreboard cell and report the slowest ones')
+
+
+def enable_from_args(args):
+    if args.metrics_json or args.metrics_prom or getattr(args, 'metrics_regions', False):
+        metrics.enable(track_regions=getattr(args, 'metrics_regions', False))
+
+
+def export_from_args(args):
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+
+metrics = Metrics()
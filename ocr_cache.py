@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+import cv2
+
+RESULT_CACHE_FOLDER = './cache/results/'
+RESULT_CACHE_VERSION = 3
+
+# Each region is reduced to a CELL_SIZE thumbnail of its text: the ink
+# (distance from the cell's background color) is centered on its centroid
+# and scaled to a fixed vertical spread, so shifted, re-encoded and
+# re-captured copies of a cell line up to a fraction of a pixel.
+CELL_SIZE = (64, 16)
+CELL_SPREAD = 3.0
+# Ink below this share of a cell's contrast is compression noise
+INK_FLOOR = 0.1
+# Cells with less contrast than this are treated as empty
+MIN_CELL_CONTRAST = 32
+CELL_BLUR = 0.7
+# A near-hit is only used when no thumbnail pixel (ink from 0 to 255) moved
+# by more than this. On generated box scores, JPEG 40-85 re-saves, 1-2 pixel
+# shifts, brightness changes and re-captures at 1080p, 1440p and 2160p stayed
+# under 40, while a single changed digit moved at least 97.
+MAX_THUMBNAIL_DIFFERENCE = 64
+# Loose hash prefilter: the same copies differ by at most 7 bits in their
+# worst cell, out of 256
+MAX_CELL_DISTANCE = 24
+# Candidates whose thumbnails are loaded and compared, closest hash first
+MAX_CANDIDATES = 5
+# The hash is the thumbnail pooled 2x2 and thresholded against its mean
+HASH_POOL = 2
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def layout_key(regions):
+    layout_json = json.dumps({'version': RESULT_CACHE_VERSION, 'regions': regions}, sort_keys=True)
+    return hashlib.sha256(layout_json.encode('utf-8')).hexdigest()
+
+
+def cell_thumbnail(image):
+    width, height = CELL_SIZE
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    ink = np.abs(gray - np.median(gray))
+    contrast = ink.max()
+    if contrast < MIN_CELL_CONTRAST:
+        return np.zeros((height, width), dtype=np.uint8)
+    ink = np.clip((ink - INK_FLOOR * contrast) / ((1 - INK_FLOOR) * contrast), 0, 1)
+    moments = cv2.moments(ink)
+    center_x, center_y = moments['m10'] / moments['m00'], moments['m01'] / moments['m00']
+    spread_x = max(np.sqrt(moments['mu20'] / moments['m00']), 0.5)
+    spread_y = max(np.sqrt(moments['mu02'] / moments['m00']), 0.5)
+    # Long text (names) is shrunk to fit the width instead of being cut off
+    scale = min(CELL_SPREAD / spread_y, (width - 8) / (4 * spread_x))
+    if scale < 1:
+        ink = cv2.GaussianBlur(ink, (0, 0), 0.5 / scale)
+    matrix = np.float32([[scale, 0, width / 2 - center_x * scale], [0, scale, height / 2 - center_y * scale]])
+    thumbnail = cv2.GaussianBlur(cv2.warpAffine(ink, matrix, CELL_SIZE, flags=cv2.INTER_LINEAR), (0, 0), CELL_BLUR)
+    return np.round(thumbnail * 255).astype(np.uint8)
+
+
+def scoreboard_thumbnails(cropped_images):
+    return np.stack([cell_thumbnail(image) for image in cropped_images])
+
+
+def scoreboard_hash(thumbnails):
+    # Coarse enough to survive what the thumbnails tolerate; it only picks
+    # the candidates whose thumbnails are compared
+    count, height, width = thumbnails.shape
+    pooled = thumbnails.reshape(count, height // HASH_POOL, HASH_POOL, width // HASH_POOL, HASH_POOL).mean(axis=(2, 4))
+    cells = pooled.reshape(count, -1)
+    return np.packbits(cells > cells.mean(axis=1, keepdims=True), axis=1)
+
+
+def thumbnail_difference(first, second):
+    # Largest per-pixel change in any cell
+    return int(np.abs(first.astype(np.int16) - second.astype(np.int16)).max())
+
+
+class ResultCache:
+    # On-disk cache of formatted OCR results keyed by the exact image bytes,
+    # with a fallback for re-encoded or re-captured screenshots. The hash only
+    # narrows down the candidates; the stored cell thumbnails decide whether
+    # one really shows the same box score.
+    def __init__(self, layout, cache_folder=RESULT_CACHE_FOLDER, max_entries=500, max_cell_distance=MAX_CELL_DISTANCE,
+                 max_thumbnail_difference=MAX_THUMBNAIL_DIFFERENCE, max_candidates=MAX_CANDIDATES):
+        self.layout = layout
+        self.cache_folder = cache_folder
+        self.max_entries = max_entries
+        self.max_cell_distance = max_cell_distance
+        self.max_thumbnail_difference = max_thumbnail_difference
+        self.max_candidates = max_candidates
+        self.index_path = os.path.join(cache_folder, 'index.json')
+        os.makedirs(cache_folder, exist_ok=True)
+        self.entries = self.load_index()
+        self._phashes = None
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            logging.warning(f'Result cache index {self.index_path} is unreadable, starting empty')
+            return {}
+        if index.get('layout') != self.layout:
+            logging.info('Region layout changed, invalidating the result cache')
+            self.clear(index.get('entries', {}))
+            return {}
+        return index.get('entries', {})
+
+    def save_index(self):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as index_file:
+            json.dump({'layout': self.layout, 'entries': self.entries}, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_folder, f'{key}.json')
+
+    def thumbnails_path(self, key):
+        return os.path.join(self.cache_folder, f'{key}.npz')
+
+    def remove_files(self, key):
+        for path in (self.entry_path(key), self.thumbnails_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self, entries=None):
+        for key in entries if entries is not None else self.entries:
+            self.remove_files(key)
+        if entries is None:
+            self.entries = {}
+            self._phashes = None
+            self.save_index()
+
+    def read_entry(self, key):
+        try:
+            with open(self.entry_path(key), 'r') as entry_file:
+                results = json.load(entry_file)
+        except (OSError, ValueError):
+            self.entries.pop(key, None)
+            self._phashes = None
+            return None
+        self.entries[key]['last_used'] = time.time()
+        self.save_index()
+        return results
+
+    def get_exact(self, key):
+        if key not in self.entries:
+            return None
+        return self.read_entry(key)
+
+    def get_similar(self, thumbnails):
+        if not self.entries:
+            return None
+        phash = scoreboard_hash(thumbnails)
+        if self._phashes is None:
+            keys = list(self.entries)
+            hashes = np.stack([np.frombuffer(bytes.fromhex(self.entries[key]['phash']), dtype=np.uint8)
+                               for key in keys])
+            self._phashes = (keys, hashes.reshape(len(keys), *phash.shape))
+
+        keys, hashes = self._phashes
+        if hashes.shape[1:] != phash.shape:
+            return None
+        # Hamming distance per cell; every cell has to be close, not just the total
+        distances = np.unpackbits(hashes ^ phash, axis=2).sum(axis=2)
+        worst_cell = distances.max(axis=1)
+        for index in np.argsort(worst_cell, kind='stable')[:self.max_candidates]:
+            if worst_cell[index] > self.max_cell_distance:
+                break
+            if self.same_thumbnails(keys[index], thumbnails):
+                return self.read_entry(keys[index])
+        return None
+
+    def same_thumbnails(self, key, thumbnails):
+        try:
+            with np.load(self.thumbnails_path(key)) as data:
+                cached = data['thumbnails']
+        except (OSError, ValueError, KeyError):
+            return False
+        if cached.shape != thumbnails.shape:
+            return False
+        return thumbnail_difference(cached, thumbnails) <= self.max_thumbnail_difference
+
+    def put(self, key, thumbnails, results):
+        with open(self.entry_path(key), 'w') as entry_file:
+            json.dump(results, entry_file)
+        np.savez_compressed(self.thumbnails_path(key), thumbnails=thumbnails)
+        self.entries[key] = {'phash': scoreboard_hash(thumbnails).tobytes().hex(), 'last_used': time.time()}
+        self._phashes = None
+
+        # Evict least recently used entries past the size bound
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries, key=lambda k: self.entries[k]['last_used'])
+            for old_key in by_age[:len(self.entries) - self.max_entries]:
+                del self.entries[old_key]
+                self.remove_files(old_key)
+        self.save_index()
+
+
+REGION_CACHE_PATH = './cache/regions.json'
+# Versioned separately from the result cache, whose entries change more often
+REGION_CACHE_VERSION = 2
+# Images recognized between writes of the cache file; the owner saves it
+# once more when the run ends
+REGION_CACHE_SAVE_INTERVAL = 25
+
+# Preprocessed crops are normalized to this size before hashing
+REGION_KEY_SIZE = (96, 32)
+
+
+def region_key(processed_image, allowlist):
+    gray = cv2.cvtColor(processed_image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, REGION_KEY_SIZE, interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    digest = hashlib.sha1(np.packbits(binary > 0).tobytes())
+    digest.update((allowlist or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RegionCache:
+    # LRU memo of recognized text per cell, keyed on the normalized crop and
+    # allowlist. Persisted as JSON between runs. A read-only copy (in an OCR
+    # worker process) keeps its new entries and counts for the process that
+    # owns the file to merge.
+    def __init__(self, path=REGION_CACHE_PATH, max_entries=20000, read_only=False,
+                 save_interval=REGION_CACHE_SAVE_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.save_interval = save_interval
+        self.unsaved_images = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.added = []
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            logging.warning(f'Region cache {self.path} is unreadable, starting empty')
+            return
+        if data.get('version') != REGION_CACHE_VERSION:
+            return
+        self.entries = OrderedDict(data.get('entries', []))
+
+    def save(self):
+        if self.read_only or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as cache_file:
+            json.dump({'version': REGION_CACHE_VERSION, 'entries': list(self.entries.items())}, cache_file)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+        self.unsaved_images = 0
+
+    def checkpoint(self):
+        # Called once per image; writes the file every save_interval images
+        self.unsaved_images += 1
+        if self.unsaved_images >= self.save_interval:
+            self.save()
+
+    def clear(self):
+        self.entries.clear()
+        self.dirty = True
+        self.save()
+
+    def get(self, key):
+        texts = self.entries.get(key)
+        if texts is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return list(texts)
+
+    def put(self, key, texts):
+        self.entries[key] = list(texts)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+        if self.read_only:
+            self.added.append((key, list(texts)))
+
+    def take_changes(self):
+        # New entries and hit/miss counts since the last call
+        changes = {'entries': self.added, 'hits': self.hits, 'misses': self.misses}
+        self.added, self.hits, self.misses = [], 0, 0
+        return changes
+
+    def merge(self, changes):
+        for key, texts in changes['entries']:
+            self.put(key, texts)
+        self.hits += changes['hits']
+        self.misses += changes['misses']
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self.entries),
+        }
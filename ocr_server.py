@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import queue
+import logging
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Only the standard library is imported at module level, and the model is
+# only loaded by serve, so the client side starts quickly.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 16
+REQUEST_TIMEOUT = 300
+# Times a client waits out a busy (503) server before giving up on an image
+SUBMIT_RETRIES = 5
+
+
+class OCRJob:
+    def __init__(self, data):
+        self.data = data
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class OCRService:
+    # Owns the warm OCRProcessor. HTTP threads enqueue jobs and a single
+    # worker thread runs them, since the model isn't safe to share across
+    # threads. A full queue is reported back instead of piling up requests.
+    def __init__(self, processor, queue_size=DEFAULT_QUEUE_SIZE):
+        self.processor = processor
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                job.result = self.processor.process_image_data(job.data)
+            except Exception as e:
+                logging.exception('OCR request failed')
+                job.error = str(e)
+            finally:
+                job.done.set()
+                self.jobs.task_done()
+
+    def submit(self, data):
+        job = OCRJob(data)
+        self.jobs.put_nowait(job)
+        return job
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': 'not found'})
+            return
+        self.send_json(200, {'status': 'ok', 'queued': self.service.jobs.qsize()})
+
+    def do_POST(self):
+        if self.path != '/ocr':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            # {"path": "..."} reads a screenshot the server can see on disk
+            try:
+                with open(json.loads(body)['path'], 'rb') as image_file:
+                    data = image_file.read()
+            except (ValueError, KeyError, OSError) as e:
+                self.send_json(400, {'error': f'could not read image path: {e}'})
+                return
+        else:
+            data = body
+        if not data:
+            self.send_json(400, {'error': 'empty request'})
+            return
+
+        try:
+            job = self.service.submit(data)
+        except queue.Full:
+            self.send_json(503, {'error': 'server busy'}, headers={'Retry-After': '1'})
+            return
+
+        if not job.done.wait(REQUEST_TIMEOUT):
+            self.send_json(504, {'error': 'timed out waiting for OCR'})
+        elif job.error is not None:
+            self.send_json(500, {'error': job.error})
+        else:
+            self.send_json(200, job.result)
+
+    def log_message(self, format, *args):
+        logging.info(f'{self.address_string()} - {format % args}')
+
+
+def serve(args):
+    from automate_2k import (OCRProcessor, ReaderPool, RegionCache, configure_torch_threads, device_from_args,
+                             layout_from_args)
+    from digit_classifier import DigitClassifier
+
+    configure_torch_threads(args.threads, args.interop_threads)
+    digit_classifier = DigitClassifier(args.digit_templates) if args.digit_templates else None
+    layout, anchor = layout_from_args(args)
+    region_cache = None if args.no_cache else RegionCache()
+    processor = OCRProcessor(languages=args.languages, device=device_from_args(args), quantize=args.quantize,
+                             batched=args.batched, use_cache=not args.no_cache, region_cache=region_cache,
+                             digit_classifier=digit_classifier, min_digit_confidence=args.digit_confidence,
+                             validate=not args.no_validate, layout=layout, anchor=anchor)
+    # Load the model now so the first request doesn't pay for it
+    processor.reader
+
+    OCRRequestHandler.service = OCRService(processor, args.queue_size)
+    server = ThreadingHTTPServer((args.host, args.port), OCRRequestHandler)
+    logging.info(f'OCR server listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info('Stopping OCR server')
+    finally:
+        server.server_close()
+        if region_cache is not None:
+            region_cache.save()
+        ReaderPool.shutdown()
+
+
+def retry_delay(retry_after):
+    # Retry-After in seconds; the server doesn't send the HTTP-date form
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def post_image(url, body, content_type):
+    for attempt in range(SUBMIT_RETRIES + 1):
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code != 503 or attempt == SUBMIT_RETRIES:
+                raise
+            delay = retry_delay(e.headers.get('Retry-After'))
+            print(f'Server busy, retrying in {delay:g} seconds...', file=sys.stderr)
+            time.sleep(delay)
+
+
+def submit(args):
+    url = f'{args.url.rstrip("/")}/ocr'
+    failed = False
+    for path in args.images:
+        try:
+            if args.by_path:
+                body = json.dumps({'path': os.path.abspath(path)}).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                with open(path, 'rb') as image_file:
+                    body = image_file.read()
+                content_type = 'application/octet-stream'
+        except OSError as e:
+            print(f'{path}: {e.strerror}', file=sys.stderr)
+            failed = True
+            continue
+
+        try:
+            results = post_image(url, body, content_type)
+        except urllib.error.HTTPError as e:
+            print(f'{path}: {e.code} {e.read().decode("utf-8", "replace")}', file=sys.stderr)
+            failed = True
+            continue
+        except (urllib.error.URLError, OSError) as e:
+            # The server is down or unreachable; the remaining images would fail the same way
+            print(f'{path}: could not reach the OCR server at {args.url} ({getattr(e, "reason", e)})',
+                  file=sys.stderr)
+            return 1
+
+        if args.output:
+            output_json_path = os.path.join(args.output, f'{os.path.basename(path)}_results.json')
+            with open(output_json_path, 'w') as json_file:
+                json.dump(results, json_file, indent=4)
+            print(f'{path}: saved to {output_json_path}')
+        else:
+            print(json.dumps(results, indent=4))
+    return 1 if failed else 0
+
+
+def main():
+    from automate_2k import add_model_arguments
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Local OCR server that keeps the EasyOCR model warm.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the OCR server')
+    serve_parser.add_argument('--host', default=DEFAULT_HOST)
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                              help='Requests allowed to wait before the server answers 503')
+    # Same options and defaults as automate_2k.py, so a screenshot gives the same result either way
+    add_model_arguments(serve_parser)
+
+    submit_parser = subparsers.add_parser('submit', help='Send screenshots to a running server')
+    submit_parser.add_argument('images', nargs='+')
+    submit_parser.add_argument('--url', default=f'http://{DEFAULT_HOST}:{DEFAULT_PORT}')
+    submit_parser.add_argument('--output', help='Write <image>_results.json files here instead of printing')
+    submit_parser.add_argument('--by-path', action='store_true',
+                               help='Send the file path instead of the bytes (server must see the same disk)')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+    else:
+        sys.exit(submit(args))
+
+
+if __name__ == "__main__":
+    main()
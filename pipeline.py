@@ -0,0 +1,288 @@
+import os
+import json
+import shutil
+import logging
+import argparse
+from automate_2k import (IMAGE_INPUT_FOLDER, IMAGE_OUTPUT_FOLDER, OCRProcessor, ReaderPool, RegionCache,
+                         add_model_arguments, configure_torch_threads, device_from_args, layout_from_args)
+from automate_sheet import (PROCESSED_FOLDER, REVIEW_FOLDER, GameDataProcessor, SheetsScheduler,
+                            add_upload_arguments, close_sinks, open_sinks)
+from digit_classifier import DigitClassifier
+from metrics import add_metrics_arguments, enable_from_args, export_from_args, metrics
+from records import GameRecord
+from roster import RosterIndex
+from storage import FRIENDLY_PLAYERS, GAMES, OPPONENT_PLAYERS
+from validation import derived_cells
+
+# Screenshots -> OCR -> rows -> sheets and local stores in one process, with
+# the results handed over in memory instead of through ./toProcess/json/.
+# Every step is written to an append-only journal first, so a run that stops
+# halfway resumes where it was: finished OCR is not redone, and rows already
+# committed to a sink are not sent to it again.
+
+JOURNAL_PATH = './pipeline_journal.jsonl'
+# Screenshots that could not be read or staged
+REVIEW_IMAGE_FOLDER = './review/images/'
+# Games OCRed and staged before their rows are committed
+BATCH_SIZE = 10
+TABLES = (FRIENDLY_PLAYERS, OPPONENT_PLAYERS, GAMES)
+
+
+class Journal:
+    # One JSON object per line, flushed and fsynced before the step it records
+    # is built on. Events, per screenshot:
+    #   ocr_done        the formatted OCR result
+    #   rows_staged     the rows built from it ('staged'), or 'duplicate'/'review'
+    #   stage_failed    reading or staging it raised; the error message
+    #   rows_committed  a sink (or one worksheet of the sheets) stored them
+    #   file_moved      the result was written out and the screenshot moved
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.file = None
+        if path:
+            self.repair()
+            self.file = open(path, 'a')
+
+    def repair(self):
+        # A crash mid-write leaves a partial last line; drop it so the next
+        # entry starts on a line of its own
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as journal_file:
+            data = journal_file.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                logging.warning(f'Dropping an incomplete entry at the end of {self.path}')
+                journal_file.truncate(end)
+
+    def entries(self):
+        if not self.path or not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as journal_file:
+            return [json.loads(line) for line in journal_file if line.strip()]
+
+    def append(self, event, **fields):
+        if self.file is None:
+            return
+        self.file.write(json.dumps({'event': event, **fields}) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def replay(self):
+        # {image: state} in the order the screenshots were first seen
+        states = {}
+        for entry in self.entries():
+            event = entry['event']
+            if event == 'rows_committed':
+                for image in entry['images']:
+                    states[image]['committed'].add(entry['sink'])
+                continue
+            state = states.setdefault(entry['image'], new_state())
+            if event == 'ocr_done':
+                state['results'] = entry['results']
+            elif event == 'rows_staged':
+                state['status'] = entry['status']
+                state['rows'] = entry['rows']
+            elif event == 'stage_failed':
+                state['status'] = 'failed'
+            elif event == 'file_moved':
+                state['moved'] = True
+        return states
+
+    def compact(self, states):
+        # Keep only the screenshots that are not finished
+        if self.file is None:
+            return
+        self.file.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as journal_file:
+            for entry in self.entries():
+                images = entry['images'] if entry['event'] == 'rows_committed' else [entry['image']]
+                if any(not states[image]['moved'] for image in images):
+                    journal_file.write(json.dumps(entry) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, 'a')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def new_state():
+    return {'results': None, 'status': None, 'rows': None, 'committed': set(), 'moved': False}
+
+
+def commit_key(sink, table=None):
+    return type(sink).__name__ if table is None else f'{type(sink).__name__}:{table}'
+
+
+class Pipeline:
+    def __init__(self, ocr_processor, game_processor, journal, input_folder=IMAGE_INPUT_FOLDER,
+                 batch_size=BATCH_SIZE, move_files=True):
+        self.ocr = ocr_processor
+        self.games = game_processor
+        self.journal = journal
+        self.input_folder = input_folder
+        self.batch_size = batch_size
+        self.move_files = move_files
+
+    def resume(self, states):
+        # GameIDs and hashes of staged games stay taken even if some sinks
+        # haven't stored them yet
+        for state in states.values():
+            for table, row in state['rows'] or []:
+                if table == GAMES:
+                    self.games.next_game_id = max(self.games.next_game_id, row[0] + 1)
+                    self.games.existing_hashes.add(row[-1])
+        unfinished = [image for image, state in states.items() if not state['moved']]
+        if unfinished:
+            logging.info(f'Resuming {len(unfinished)} screenshots from {self.journal.path}')
+        return unfinished
+
+    def run(self):
+        states = self.journal.replay()
+        queue = self.resume(states)
+        queue += [filename for filename in self.ocr.list_images(self.input_folder) if filename not in states]
+        for start in range(0, len(queue), self.batch_size):
+            batch = queue[start:start + self.batch_size]
+            for image in batch:
+                self.stage(image, states.setdefault(image, new_state()))
+            self.commit(batch, states)
+            for image in batch:
+                self.finish(image, states[image])
+        self.journal.compact(states)
+        return {image: states[image] for image in queue}
+
+    def stage(self, image, state):
+        if state['status'] == 'failed':
+            return
+        try:
+            self.read_and_build(image, state)
+        except Exception as e:
+            # One bad screenshot goes to review instead of stopping the batch
+            logging.exception(f'Failed to process {image}; moving it to {REVIEW_IMAGE_FOLDER}')
+            state['status'] = 'failed'
+            state['rows'] = None
+            self.journal.append('stage_failed', image=image, error=f'{type(e).__name__}: {e}')
+
+    def read_and_build(self, image, state):
+        if state['results'] is None:
+            path = os.path.join(self.input_folder, image)
+            logging.info(f'Processing file: {path}')
+            with metrics.span('pipeline.ocr'):
+                state['results'] = self.ocr.process_image(path)
+            self.journal.append('ocr_done', image=image, results=state['results'])
+        if state['status'] is None:
+            derived = derived_cells(state['results'])
+            if derived:
+                logging.warning(f"{image}: {', '.join(derived)} filled in from the shooting line, "
+                                f"sending it to review")
+                rows = None
+            else:
+                try:
+                    rows = self.games.build_game_rows(GameRecord.from_json(state['results']))
+                except (KeyError, ValueError) as e:
+                    logging.warning(f'Could not read the result for {image}: {e}')
+                    rows = None
+            state['status'] = 'review' if rows is None else 'staged' if rows else 'duplicate'
+            state['rows'] = [list(table_row) for table_row in rows or []]
+            self.journal.append('rows_staged', image=image, status=state['status'], rows=state['rows'])
+
+    def commit(self, batch, states):
+        # Sinks in their flush order. Idempotent ones take the whole batch in
+        # one flush. The sheets are committed one worksheet at a time, so after
+        # a failure only the worksheet being appended to at that moment can
+        # end up with the batch twice.
+        for sink in self.games.sinks:
+            for table in ((None,) if sink.idempotent else TABLES):
+                key = commit_key(sink, table)
+                images = [image for image in batch if states[image]['rows'] and key not in states[image]['committed']]
+                if not images:
+                    continue
+                for image in images:
+                    for row_table, row in states[image]['rows']:
+                        if table is None or row_table == table:
+                            sink.write_row(row_table, row)
+                with metrics.span(f'pipeline.commit.{type(sink).__name__}'):
+                    sink.flush()
+                self.journal.append('rows_committed', images=images, sink=key)
+                for image in images:
+                    states[image]['committed'].add(key)
+
+    def finish(self, image, state):
+        failed = state['status'] == 'failed'
+        folder = REVIEW_FOLDER if failed or state['status'] == 'review' else PROCESSED_FOLDER
+        if self.move_files:
+            with metrics.span('pipeline.move'):
+                if state['results'] is not None:
+                    os.makedirs(folder, exist_ok=True)
+                    self.ocr.write_results(image, state['results'], folder)
+                image_folder = REVIEW_IMAGE_FOLDER if failed else self.ocr.image_output_folder
+                os.makedirs(image_folder, exist_ok=True)
+                source = os.path.join(self.input_folder, image)
+                # Already gone if the run stopped right after moving it
+                if os.path.exists(source):
+                    shutil.move(source, os.path.join(image_folder, image))
+            if state['status'] == 'review':
+                logging.info(f'{image} needs review; its result is in {folder}')
+        self.journal.append('file_moved', image=image, folder=folder)
+        state['moved'] = True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Read box score screenshots and log them in one pass.')
+    parser.add_argument('--journal', default=JOURNAL_PATH, help='Write-ahead journal used to resume a stopped run')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='Games read before their rows are committed together')
+    add_model_arguments(parser)
+    add_upload_arguments(parser)
+    add_metrics_arguments(parser, regions=True)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    enable_from_args(args)
+    configure_torch_threads(args.threads, args.interop_threads)
+    digit_classifier = DigitClassifier(args.digit_templates) if args.digit_templates else None
+    region_cache = None if args.no_cache else RegionCache()
+    layout, anchor = layout_from_args(args)
+    ocr_processor = OCRProcessor(languages=args.languages, device=device_from_args(args),
+                                 quantize=args.quantize, batched=args.batched, use_cache=not args.no_cache,
+                                 region_cache=region_cache, digit_classifier=digit_classifier,
+                                 min_digit_confidence=args.digit_confidence, image_output_folder=IMAGE_OUTPUT_FOLDER,
+                                 validate=not args.no_validate, layout=layout, anchor=anchor)
+
+    # A dry run writes to fake sheets and an in-memory database, so it keeps
+    # no journal and leaves the screenshots where they are
+    journal = Journal(None if args.dry_run else args.journal)
+    scheduler = SheetsScheduler(args.read_quota, args.write_quota, args.upload_workers)
+    store = client = None
+    try:
+        sinks, store, client = open_sinks(args, scheduler)
+        game_processor = GameDataProcessor(sinks, roster=RosterIndex.load_if_exists(args.roster),
+                                           unattended=args.unattended)
+        processed = Pipeline(ocr_processor, game_processor, journal, batch_size=args.batch_size,
+                          move_files=not args.dry_run).run()
+        counts = {}
+        for state in processed.values():
+            counts[state['status']] = counts.get(state['status'], 0) + 1
+        logging.info(f"Logged {counts.get('staged', 0)} games, skipped {counts.get('duplicate', 0)} duplicates, "
+                     f"{counts.get('review', 0)} sent to review, {counts.get('failed', 0)} failed")
+    finally:
+        journal.close()
+        close_sinks(scheduler, store, client)
+        if region_cache is not None:
+            region_cache.save()
+        ReaderPool.shutdown()
+    if metrics.enabled:
+        for line in metrics.report_lines():
+            logging.info(f'Metrics: {line}')
+        export_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
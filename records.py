@@ -0,0 +1,228 @@
+import os
+import json
+import struct
+from operator import attrgetter
+from storage import GAME_COLUMNS, GAME_STATS, PLAYER_COLUMNS
+
+# Typed form of a *_results.json box score. Stats are parsed into ints once,
+# when the OCR result is written, and the sheet/database rows are built from
+# the records through column mappings computed at import time.
+
+# Player stats as stored on the record, in sheet column order (fg2m and fg2a
+# are derived)
+PLAYER_STATS = ('points', 'rebounds', 'assists', 'steals', 'blocks', 'fouls', 'tos',
+                'fgm', 'fga', 'fg3m', 'fg3a', 'ftm', 'fta')
+# Record attribute -> key in the results JSON
+JSON_KEYS = {'fgm': 'FGM', 'fga': 'FGA', 'fg3m': '3PM', 'fg3a': '3PA', 'ftm': 'FTM', 'fta': 'FTA'}
+POSITIONS = ('PG', 'SG', 'SF', 'PF', 'C')
+QUARTERS = 4
+
+# Compact binary file written next to each JSON result (<image>_results.bin)
+RECORD_MAGIC = b'A2KR'
+RECORD_VERSION = 1
+HEADER = struct.Struct('<4sB')
+STRING_LENGTH = struct.Struct('<H')
+QUARTER_SCORES = struct.Struct(f'<{2 * QUARTERS}H')
+PLAYER_VALUES = struct.Struct(f'<{len(PLAYER_STATS)}H')
+
+# Sheet row layouts. Player rows: game_id, then the record attributes up to
+# result, then result, matchup, timestamp, hash.
+PLAYER_COLUMN_NAMES = [name for name, _ in PLAYER_COLUMNS]
+PLAYER_ROW_FIELDS = PLAYER_COLUMN_NAMES[PLAYER_COLUMN_NAMES.index('team'):PLAYER_COLUMN_NAMES.index('result')]
+NAME_COLUMN = PLAYER_COLUMN_NAMES.index('name')
+player_row_values = attrgetter(*PLAYER_ROW_FIELDS)
+team_stat_values = [attrgetter(stat) for stat in GAME_STATS]
+# Game rows alternate friendly/opponent values; (side, stat) per column between
+# the team names and the timestamp
+GAME_ROW_FIELDS = [tuple(name.split('_', 1)) for name, _ in GAME_COLUMNS[3:-2]]
+
+
+def parse_stat(value, label):
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    if text == '':
+        return 0
+    if not text.isdigit():
+        raise ValueError(f'{label} is not a number: {value!r}')
+    return int(text)
+
+
+def team_of(player_number):
+    return 'team1' if player_number <= 5 else 'team2'
+
+
+def position_of(player_number):
+    return POSITIONS[(player_number - 1) % len(POSITIONS)]
+
+
+class PlayerRecord:
+    __slots__ = ('player_number', 'team', 'position', 'name', 'grade') + PLAYER_STATS
+
+    def __init__(self, player_number, name, grade, stats, team=None, position=None):
+        self.player_number = player_number
+        self.team = team or team_of(player_number)
+        self.position = position or position_of(player_number)
+        self.name = name
+        self.grade = grade
+        for stat, value in zip(PLAYER_STATS, stats):
+            setattr(self, stat, value)
+
+    @property
+    def fg2m(self):
+        return self.fgm - self.fg3m
+
+    @property
+    def fg2a(self):
+        return self.fga - self.fg3a
+
+    @classmethod
+    def from_json(cls, player):
+        number = int(player['player_number'])
+        stats = [parse_stat(player.get(JSON_KEYS.get(stat, stat), 0), f'player{number} {stat}')
+                 for stat in PLAYER_STATS]
+        return cls(number, player.get('name', ''), player.get('grade', ''), stats,
+                   player.get('team'), player.get('position'))
+
+    def to_json(self):
+        player = {'player_number': self.player_number, 'position': self.position, 'team': self.team,
+                  'name': self.name, 'grade': self.grade}
+        for stat in PLAYER_STATS:
+            player[JSON_KEYS.get(stat, stat)] = str(getattr(self, stat))
+        return player
+
+
+class GameRecord:
+    __slots__ = ('players', 'quarters', 'team_names', 'hash')
+
+    def __init__(self, players, quarters, team_names=('team1', 'team2'), hash_value=None):
+        self.players = players
+        # {'team1': (q1, q2, q3, q4), 'team2': (...)}
+        self.quarters = quarters
+        self.team_names = team_names
+        self.hash = hash_value
+
+    @classmethod
+    def from_json(cls, results):
+        players = [PlayerRecord.from_json(player) for player in results['players']]
+        quarters = {}
+        for team in ('team1', 'team2'):
+            scores = results.get('teams', {}).get(f'{team}_quarters', {})
+            quarters[team] = tuple(parse_stat(scores.get(f'quarter_{quarter}', 0), f'{team} quarter {quarter}')
+                                   for quarter in range(1, QUARTERS + 1))
+        team_names = (results.get('team1_name', 'team1'), results.get('team2_name', 'team2'))
+        return cls(players, quarters, team_names, results.get('hash'))
+
+    def to_json(self):
+        results = {'players': [player.to_json() for player in self.players],
+                   'teams': {f'{team}_quarters': {f'quarter_{quarter + 1}': str(score)
+                                                  for quarter, score in enumerate(self.quarters[team])}
+                             for team in ('team1', 'team2')}}
+        if self.team_names != ('team1', 'team2'):
+            results['team1_name'], results['team2_name'] = self.team_names
+        if self.hash is not None:
+            results['hash'] = self.hash
+        return results
+
+    def team_players(self, team):
+        return [player for player in self.players if player.team == team]
+
+    def total(self, team):
+        return sum(self.quarters[team])
+
+    def team_stats(self, team):
+        players = self.team_players(team)
+        return {stat: sum(values(player) for player in players) for stat, values in zip(GAME_STATS, team_stat_values)}
+
+    def player_row(self, player, game_id, result, matchup, timestamp):
+        row = [game_id, *player_row_values(player), result, matchup, timestamp, self.hash]
+        row[NAME_COLUMN] = player.name.lower()
+        return row
+
+    def game_row(self, game_id, friendly_team, timestamp):
+        opponent_team = 'team2' if friendly_team == 'team1' else 'team1'
+        names = dict(zip(('team1', 'team2'), self.team_names))
+        sides = {'f': friendly_team, 'o': opponent_team}
+        stats = {side: self.team_stats(team) for side, team in sides.items()}
+        row = [game_id, names[friendly_team], names[opponent_team]]
+        for side, field in GAME_ROW_FIELDS:
+            if field.startswith('q'):
+                row.append(self.quarters[sides[side]][int(field[1:]) - 1])
+            elif field == 'total':
+                row.append(self.total(sides[side]))
+            else:
+                row.append(stats[side][field])
+        return row + [timestamp, self.hash]
+
+    def to_bytes(self):
+        parts = [HEADER.pack(RECORD_MAGIC, RECORD_VERSION)]
+        for text in (self.hash or '', *self.team_names):
+            parts.append(pack_string(text))
+        parts.append(QUARTER_SCORES.pack(*self.quarters['team1'], *self.quarters['team2']))
+        parts.append(struct.pack('<B', len(self.players)))
+        for player in self.players:
+            parts.append(struct.pack('<B', player.player_number))
+            parts.append(pack_string(player.name))
+            parts.append(pack_string(player.grade))
+            parts.append(PLAYER_VALUES.pack(*(getattr(player, stat) for stat in PLAYER_STATS)))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version = HEADER.unpack_from(data)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise ValueError(f'Unsupported record file (magic {magic!r}, version {version})')
+        offset = HEADER.size
+        hash_value, offset = unpack_string(data, offset)
+        team1_name, offset = unpack_string(data, offset)
+        team2_name, offset = unpack_string(data, offset)
+        scores = QUARTER_SCORES.unpack_from(data, offset)
+        offset += QUARTER_SCORES.size
+        count = data[offset]
+        offset += 1
+        players = []
+        for _ in range(count):
+            number = data[offset]
+            offset += 1
+            name, offset = unpack_string(data, offset)
+            grade, offset = unpack_string(data, offset)
+            players.append(PlayerRecord(number, name, grade, PLAYER_VALUES.unpack_from(data, offset)))
+            offset += PLAYER_VALUES.size
+        quarters = {'team1': scores[:QUARTERS], 'team2': scores[QUARTERS:]}
+        return cls(players, quarters, (team1_name, team2_name), hash_value or None)
+
+
+def pack_string(text):
+    encoded = text.encode('utf-8')
+    return STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def unpack_string(data, offset):
+    (length,) = STRING_LENGTH.unpack_from(data, offset)
+    offset += STRING_LENGTH.size
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def record_path(json_path):
+    return os.path.splitext(json_path)[0] + '.bin'
+
+
+def write_record(json_path, game):
+    temp_path = record_path(json_path) + '.tmp'
+    with open(temp_path, 'wb') as record_file:
+        record_file.write(game.to_bytes())
+    os.replace(temp_path, record_path(json_path))
+
+
+def load_game(json_path):
+    # The binary record when it is at least as new as the JSON; a JSON file
+    # edited by hand after OCR is parsed again instead
+    path = record_path(json_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(json_path):
+        try:
+            with open(path, 'rb') as record_file:
+                return GameRecord.from_bytes(record_file.read())
+        except (ValueError, struct.error, UnicodeDecodeError):
+            pass
+    with open(json_path, 'r') as json_file:
+        return GameRecord.from_json(json.load(json_file))
@@ -0,0 +1,102 @@
+import os
+import re
+import json
+from difflib import SequenceMatcher
+
+ROSTER_FILE = './roster.json'
+
+# Scores are SequenceMatcher ratios (0-1) on normalized names
+MATCH_THRESHOLD = 0.88
+# A team needs this much more matched weight than the other to be picked
+MIN_TEAM_MARGIN = 0.8
+
+# Characters OCR mixes up in gamertags, folded to one form before comparing.
+# This is what turns 'Al Player' and 'AI Player' into the same key.
+OCR_CONFUSABLES = str.maketrans({'l': 'i', '1': 'i', '|': 'i', '0': 'o', '5': 's', '8': 'b'})
+TRAILING_OCR_JUNK = '3a5b'
+
+
+def normalize_name(name):
+    name = re.sub(r'[^a-z0-9| ]', '', str(name).lower())
+    name = name.translate(OCR_CONFUSABLES)
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def name_variants(name):
+    # OCR tends to tack a stray character onto the end of names ('3', 'a',
+    # '5', 'b'), so also try the name without it. The full name comes first.
+    raw = re.sub(r'\s+', ' ', str(name).lower()).strip()
+    candidates = [raw]
+    if ' ' in raw and len(raw.rsplit(' ', 1)[1]) == 1:
+        candidates.append(raw.rsplit(' ', 1)[0])
+    if len(raw) > 4 and raw[-1] in TRAILING_OCR_JUNK:
+        candidates.append(raw[:-1])
+    variants = []
+    for candidate in candidates:
+        normalized = normalize_name(candidate)
+        if normalized and normalized not in variants:
+            variants.append(normalized)
+    return variants
+
+
+class RosterIndex:
+    # Fuzzy lookup of our club's players, used to tell which side of a box
+    # score is the friendly team without asking.
+    def __init__(self, names, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.names = {}
+        for name, aliases in names:
+            for alias in [name] + list(aliases):
+                self.names[normalize_name(alias)] = name
+
+    @classmethod
+    def load(cls, path=ROSTER_FILE, **kwargs):
+        # Either a list of names or {"players": [{"name": ..., "aliases": [...]}]}
+        with open(path, 'r') as roster_file:
+            data = json.load(roster_file)
+        entries = data.get('players', []) if isinstance(data, dict) else data
+        names = []
+        for entry in entries:
+            if isinstance(entry, str):
+                names.append((entry, []))
+            else:
+                names.append((entry['name'], entry.get('aliases', [])))
+        return cls(names, **kwargs)
+
+    @classmethod
+    def load_if_exists(cls, path=ROSTER_FILE, **kwargs):
+        return cls.load(path, **kwargs) if path and os.path.exists(path) else None
+
+    def match(self, name):
+        best_name, best_score = None, 0.0
+        for variant in name_variants(name):
+            # Exact hits on a normalized name or alias need no fuzzy pass
+            if variant in self.names:
+                return self.names[variant], 1.0
+            for known, roster_name in self.names.items():
+                score = SequenceMatcher(None, variant, known).ratio()
+                if score > best_score:
+                    best_name, best_score = roster_name, score
+        if best_score < self.threshold:
+            return None, best_score
+        return best_name, best_score
+
+    def team_scores(self, players):
+        scores = {'team1': 0.0, 'team2': 0.0}
+        matches = []
+        for player in players:
+            roster_name, score = self.match(player.name)
+            if roster_name is not None and player.team in scores:
+                scores[player.team] += score
+                matches.append((player.name, roster_name, player.team, score))
+        return scores, matches
+
+    def classify(self, players, min_margin=MIN_TEAM_MARGIN):
+        # Returns ('team1' | 'team2' | None, scores, matches); None means the
+        # match is too close to call and needs a human
+        scores, matches = self.team_scores(players)
+        if scores['team1'] - scores['team2'] >= min_margin:
+            return 'team1', scores, matches
+        if scores['team2'] - scores['team1'] >= min_margin:
+            return 'team2', scores, matches
+        return None, scores, matches
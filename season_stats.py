@@ -0,0 +1,298 @@
+import os
+import sys
+import csv
+import argparse
+import numpy as np
+from storage import (DATABASE_PATH, FRIENDLY_PLAYERS, GAME_COLUMNS, GAME_STATS, GAMES, OPPONENT_PLAYERS,
+                     PLAYER_COLUMNS, SQLiteSink, StorageSink)
+
+SEASON_STATS_PATH = './season_stats.npz'
+# Bumped when the saved keys change meaning; older files are recounted
+STATS_VERSION = 3
+
+PLAYER_STATS = ('points', 'rebounds', 'assists', 'steals', 'blocks', 'fouls', 'tos',
+                'fgm', 'fga', 'fg3m', 'fg3a', 'fg2m', 'fg2a', 'ftm', 'fta')
+PLAYER_FIELDS = ('games', 'wins') + PLAYER_STATS
+TEAM_FIELDS = ('games', 'wins', 'points', 'points_against') + GAME_STATS + tuple(f'opp_{stat}' for stat in GAME_STATS)
+MATCHUP_FIELDS = ('games', 'wins', 'points', 'fgm', 'fga', 'fg3m', 'fg3a')
+# Made/attempted pairs reported as percentages
+SHOOTING = (('fg_pct', 'fgm', 'fga'), ('fg3_pct', 'fg3m', 'fg3a'), ('fg2_pct', 'fg2m', 'fg2a'), ('ft_pct', 'ftm', 'fta'))
+
+# Player, team and matchup keys start with the side, so a name that shows up
+# on both sides (a gamertag playing for and against us, or a generic CPU
+# name) is counted twice, apart. Unnamed teams keep the OCR defaults, which
+# only say where the team sat on the scoreboard, so they are grouped by side.
+SIDES = {'f': 'friendly', 'o': 'opponent'}
+PLACEHOLDER_TEAMS = ('team1', 'team2')
+
+PLAYER_INDEX = {name: i for i, (name, _) in enumerate(PLAYER_COLUMNS)}
+GAME_INDEX = {name: i for i, (name, _) in enumerate(GAME_COLUMNS)}
+
+
+def as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def player_key(name, side):
+    return f'{SIDES[side]}\t{name}'
+
+
+def matchup_key(player, opponent, side):
+    return f'{SIDES[side]}\t{player}\t{opponent}'
+
+
+def team_key(name, side):
+    if not name or name in PLACEHOLDER_TEAMS:
+        name = '-'
+    return f'{SIDES[side]}\t{name}'
+
+
+class StatTable:
+    # Running sums keyed by name. Rows live in one NumPy array that doubles
+    # when full, so adding a game is a dict lookup and a vector add.
+    def __init__(self, fields, keys=None, values=None):
+        self.fields = fields
+        self.columns = {field: i for i, field in enumerate(fields)}
+        self.keys = list(keys) if keys is not None else []
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+        self.values = np.zeros((max(16, len(self.keys)), len(fields)))
+        if values is not None:
+            self.values[:len(self.keys)] = values
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row(self, key):
+        index = self.rows.get(key)
+        if index is None:
+            index = len(self.keys)
+            if index == len(self.values):
+                self.values = np.vstack([self.values, np.zeros_like(self.values)])
+            self.keys.append(key)
+            self.rows[key] = index
+        return index
+
+    def add(self, key, values):
+        index = self.row(key)
+        self.values[index] += values
+
+    def vector(self, **values):
+        vector = np.zeros(len(self.fields))
+        for field, value in values.items():
+            vector[self.columns[field]] = value
+        return vector
+
+    def totals(self):
+        return self.values[:len(self.keys)]
+
+    def column(self, field):
+        return self.totals()[:, self.columns[field]]
+
+    def get(self, key):
+        index = self.rows.get(key)
+        if index is None:
+            return None
+        return dict(zip(self.fields, self.values[index].tolist()))
+
+
+def summarize(table, keys=None, per_game=()):
+    # Totals plus per-game averages and shooting percentages, computed for
+    # every row at once
+    totals = table.totals()
+    if keys is not None:
+        totals = totals[[table.rows[key] for key in keys]]
+    games = totals[:, table.columns['games']]
+    summary = {field: totals[:, i] for i, field in enumerate(table.fields)}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for field in per_game:
+            summary[f'{field}_per_game'] = np.where(games > 0, summary[field] / games, 0.0)
+        for name, made, attempted in SHOOTING:
+            if made in table.columns:
+                summary[name] = np.where(summary[attempted] > 0, summary[made] / summary[attempted], 0.0)
+        summary['win_pct'] = np.where(games > 0, summary['wins'] / games, 0.0)
+    return summary
+
+
+class SeasonStats(StorageSink):
+    # Incremental per-player, per-team and head-to-head aggregates, fed with
+    # the same rows as the other sinks. Games already counted (by hash) are
+    # skipped, and the tables are saved on flush.
+    idempotent = True
+
+    def __init__(self, path=SEASON_STATS_PATH):
+        self.path = path
+        self.players = StatTable(PLAYER_FIELDS)
+        self.teams = StatTable(TEAM_FIELDS)
+        self.matchups = StatTable(MATCHUP_FIELDS)
+        self.counted = set()
+        self.staged = set()
+        self.outdated = False
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        data = np.load(self.path)
+        if 'version' not in data or int(data['version']) != STATS_VERSION:
+            self.outdated = True
+            return
+        self.players = StatTable(PLAYER_FIELDS, data['player_keys'].tolist(), data['player_values'])
+        self.teams = StatTable(TEAM_FIELDS, data['team_keys'].tolist(), data['team_values'])
+        self.matchups = StatTable(MATCHUP_FIELDS, data['matchup_keys'].tolist(), data['matchup_values'])
+        self.counted = set(data['hashes'].tolist())
+
+    def save(self):
+        if not self.path:
+            return
+        temp_path = self.path + '.tmp.npz'
+        np.savez(temp_path,
+                 player_keys=np.array(self.players.keys, dtype=str), player_values=self.players.totals(),
+                 team_keys=np.array(self.teams.keys, dtype=str), team_values=self.teams.totals(),
+                 matchup_keys=np.array(self.matchups.keys, dtype=str), matchup_values=self.matchups.totals(),
+                 hashes=np.array(sorted(self.counted), dtype=str), version=STATS_VERSION)
+        os.replace(temp_path, self.path)
+
+    def write_row(self, table, row):
+        columns = GAME_INDEX if table == GAMES else PLAYER_INDEX
+        hash_value = row[columns['hash']] if len(row) > columns['hash'] else None
+        if hash_value and hash_value in self.counted:
+            return
+        if hash_value:
+            self.staged.add(hash_value)
+        if table == GAMES:
+            self.add_game(row)
+        else:
+            self.add_player(row, table == FRIENDLY_PLAYERS)
+
+    def add_player(self, row, friendly):
+        name = row[PLAYER_INDEX['name']]
+        side = 'f' if friendly else 'o'
+        won = row[PLAYER_INDEX['result']] == 'W'
+        stats = {stat: as_number(row[PLAYER_INDEX[stat]]) for stat in PLAYER_STATS}
+        self.players.add(player_key(name, side), self.players.vector(games=1, wins=won, **stats))
+
+        opponent = row[PLAYER_INDEX['matchup']]
+        if opponent:
+            matchup_stats = {field: stats[field] for field in MATCHUP_FIELDS[2:]}
+            self.matchups.add(matchup_key(name, opponent, side),
+                              self.matchups.vector(games=1, wins=won, **matchup_stats))
+
+    def add_game(self, row):
+        totals = {side: as_number(row[GAME_INDEX[f'{side}_total']]) for side in ('f', 'o')}
+        for side, other in (('f', 'o'), ('o', 'f')):
+            stats = {stat: as_number(row[GAME_INDEX[f'{side}_{stat}']]) for stat in GAME_STATS}
+            stats.update({f'opp_{stat}': as_number(row[GAME_INDEX[f'{other}_{stat}']]) for stat in GAME_STATS})
+            self.teams.add(team_key(row[GAME_INDEX[f'team_{side}']], side),
+                           self.teams.vector(games=1, wins=totals[side] > totals[other], points=totals[side],
+                                             points_against=totals[other], **stats))
+
+    def flush(self):
+        self.counted |= self.staged
+        self.staged = set()
+        self.save()
+
+    def player_summary(self, friendly_only=False):
+        keys = [key for key in self.players.keys if not friendly_only or key.split('\t')[0] == SIDES['f']]
+        return keys, summarize(self.players, keys, per_game=PLAYER_STATS)
+
+    def team_summary(self):
+        return self.teams.keys, summarize(self.teams, per_game=('points', 'points_against'))
+
+    def matchup_summary(self, player=None):
+        keys = [key for key in self.matchups.keys if player is None or key.split('\t')[1] == player]
+        return keys, summarize(self.matchups, keys, per_game=('points',))
+
+    def rebuild(self, store):
+        # Recount everything from the local database
+        self.players = StatTable(PLAYER_FIELDS)
+        self.teams = StatTable(TEAM_FIELDS)
+        self.matchups = StatTable(MATCHUP_FIELDS)
+        self.counted = set()
+        self.outdated = False
+        player_columns = ', '.join(name for name, _ in PLAYER_COLUMNS)
+        _, rows = store.query(f'SELECT friendly, {player_columns} FROM players ORDER BY game_id')
+        for row in rows:
+            self.write_row(FRIENDLY_PLAYERS if row[0] else OPPONENT_PLAYERS, list(row[1:]))
+        _, rows = store.query(f'SELECT {", ".join(name for name, _ in GAME_COLUMNS)} FROM games ORDER BY game_id')
+        for row in rows:
+            self.write_row(GAMES, list(row))
+        self.flush()
+        return len(self.counted)
+
+
+def format_value(field, value):
+    if field.endswith('_pct'):
+        return f'{value:.3f}'
+    if field.endswith('_per_game'):
+        return f'{value:.1f}'
+    return f'{value:g}'
+
+
+def write_summary(keys, summary, fields, key_names, output_path=None):
+    header = list(key_names) + list(fields)
+    rows = []
+    for i, key in enumerate(keys):
+        rows.append(key.split('\t') + [format_value(field, summary[field][i]) for field in fields])
+    if output_path:
+        with open(output_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} rows to {output_path}")
+        return
+    print('\t'.join(header))
+    for row in rows:
+        print('\t'.join(row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show season aggregates kept by automate_sheet.py.')
+    parser.add_argument('view', choices=('players', 'teams', 'matchups', 'rebuild'))
+    parser.add_argument('--stats-file', default=SEASON_STATS_PATH)
+    parser.add_argument('--database', default=DATABASE_PATH, help='Local database used by rebuild')
+    parser.add_argument('--player', help='With matchups, only show this player')
+    parser.add_argument('--friendly', action='store_true', help='With players, only show our own players')
+    parser.add_argument('--sort', default='games', help='Column to sort by, highest first')
+    parser.add_argument('--export', metavar='CSV', help='Write the table to a CSV file instead of printing it')
+    args = parser.parse_args()
+
+    stats = SeasonStats(args.stats_file)
+    if stats.outdated and args.view != 'rebuild':
+        print(f"{args.stats_file} was written by an older version. Run 'python season_stats.py rebuild' first.",
+              file=sys.stderr)
+        sys.exit(1)
+    if args.view == 'rebuild':
+        if not os.path.exists(args.database):
+            print(f"Database {args.database} not found.", file=sys.stderr)
+            sys.exit(1)
+        store = SQLiteSink(args.database)
+        print(f"Counted {stats.rebuild(store)} games from {args.database}")
+        store.close()
+        return
+
+    if args.view == 'players':
+        keys, summary = stats.player_summary(args.friendly)
+        fields = ('games', 'win_pct') + tuple(f'{stat}_per_game' for stat in PLAYER_STATS[:7]) + tuple(name for name, _, _ in SHOOTING)
+        key_names = ('side', 'name')
+    elif args.view == 'teams':
+        keys, summary = stats.team_summary()
+        fields = ('games', 'wins', 'win_pct', 'points_per_game', 'points_against_per_game', 'fg_pct', 'fg3_pct', 'ft_pct')
+        key_names = ('side', 'team')
+    else:
+        keys, summary = stats.matchup_summary(args.player)
+        fields = ('games', 'wins', 'win_pct', 'points_per_game', 'fg_pct', 'fg3_pct')
+        key_names = ('side', 'name', 'matchup')
+
+    if args.sort not in summary:
+        print(f"Unknown sort column '{args.sort}'. Choose from: {', '.join(summary)}", file=sys.stderr)
+        sys.exit(1)
+    order = np.argsort(-summary[args.sort], kind='stable')
+    keys = [keys[i] for i in order]
+    summary = {field: values[order] for field, values in summary.items()}
+    write_summary(keys, summary, fields, key_names, args.export)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import sys
+import time
+import sqlite3
+import argparse
+
+DATABASE_PATH = './boxscores.sqlite3'
+
+# Logical tables rows are written to; each sink decides where they end up
+FRIENDLY_PLAYERS = 'friendly_players'
+OPPONENT_PLAYERS = 'opponent_players'
+GAMES = 'games'
+
+# Column layouts of the F DB / O DB and GAME DB rows, in sheet order
+PLAYER_COLUMNS = (
+    ('game_id', 'INTEGER'), ('team', 'TEXT'), ('player_number', 'INTEGER'), ('name', 'TEXT'),
+    ('position', 'TEXT'), ('grade', 'TEXT'), ('points', 'INTEGER'), ('rebounds', 'INTEGER'),
+    ('assists', 'INTEGER'), ('steals', 'INTEGER'), ('blocks', 'INTEGER'), ('fouls', 'INTEGER'),
+    ('tos', 'INTEGER'), ('fgm', 'INTEGER'), ('fga', 'INTEGER'), ('fg3m', 'INTEGER'), ('fg3a', 'INTEGER'),
+    ('fg2m', 'INTEGER'), ('fg2a', 'INTEGER'), ('ftm', 'INTEGER'), ('fta', 'INTEGER'), ('result', 'TEXT'),
+    ('matchup', 'TEXT'), ('timestamp', 'TEXT'), ('hash', 'TEXT'),
+)
+GAME_STATS = ('rebounds', 'assists', 'steals', 'blocks', 'fouls', 'tos', 'fgm', 'fga',
+              'fg3m', 'fg3a', 'fg2m', 'fg2a', 'ftm', 'fta')
+GAME_COLUMNS = (
+    (('game_id', 'INTEGER'), ('team_f', 'TEXT'), ('team_o', 'TEXT'))
+    + tuple((f'{side}_q{quarter}', 'INTEGER') for quarter in range(1, 5) for side in ('f', 'o'))
+    + (('f_total', 'INTEGER'), ('o_total', 'INTEGER'))
+    + tuple((f'{side}_{stat}', 'INTEGER') for stat in GAME_STATS for side in ('f', 'o'))
+    + (('timestamp', 'TEXT'), ('hash', 'TEXT'))
+)
+
+
+class StorageSink:
+    # Destination for the rows GameDataProcessor produces. Rows may be held
+    # until flush(); hashes() and max_game_id() let a sink take part in
+    # duplicate detection and GameID numbering. An idempotent sink can be
+    # sent the same rows again without storing them twice.
+    idempotent = False
+
+    def write_row(self, table, row):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def hashes(self):
+        return set()
+
+    def max_game_id(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class SQLiteSink(StorageSink):
+    # Local database with typed columns. Friendly and opponent player rows
+    # share one table, told apart by the friendly flag.
+    idempotent = True
+
+    def __init__(self, path=DATABASE_PATH):
+        self.conn = sqlite3.connect(path)
+        player_columns = ', '.join(f'{name} {column_type}' for name, column_type in PLAYER_COLUMNS)
+        game_columns = ', '.join(f'{name} {column_type}' for name, column_type in GAME_COLUMNS[1:])
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS players (friendly INTEGER, {player_columns})')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS games (game_id INTEGER PRIMARY KEY, {game_columns})')
+        self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS players_key ON players (game_id, team, player_number)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS players_name ON players (name)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS games_hash ON games (hash)')
+        self.conn.commit()
+        self.pending = []
+
+    @staticmethod
+    def insert_statement(table):
+        if table == GAMES:
+            columns = [name for name, _ in GAME_COLUMNS]
+            target = 'games'
+        else:
+            columns = ['friendly'] + [name for name, _ in PLAYER_COLUMNS]
+            target = 'players'
+        placeholders = ', '.join('?' for _ in columns)
+        return f'INSERT OR REPLACE INTO {target} ({", ".join(columns)}) VALUES ({placeholders})'
+
+    @staticmethod
+    def to_record(table, row):
+        # Blank cells are stored as NULL; padded or trimmed to the layout
+        width = len(GAME_COLUMNS) if table == GAMES else len(PLAYER_COLUMNS)
+        values = [None if value == '' else value for value in list(row)[:width]]
+        values += [None] * (width - len(values))
+        if table != GAMES:
+            values.insert(0, 1 if table == FRIENDLY_PLAYERS else 0)
+        return values
+
+    def write_row(self, table, row):
+        self.pending.append((table, self.to_record(table, row)))
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            for table in (FRIENDLY_PLAYERS, OPPONENT_PLAYERS, GAMES):
+                records = [record for row_table, record in self.pending if row_table == table]
+                if records:
+                    self.conn.executemany(self.insert_statement(table), records)
+        print(f"Stored {len(self.pending)} rows in the local database")
+        self.pending = []
+
+    def import_rows(self, table, rows):
+        # Used to backfill from the sheets; rows already stored are replaced
+        for row in rows:
+            self.write_row(table, row)
+        self.flush()
+
+    def hashes(self):
+        return {row[0] for row in self.conn.execute('SELECT hash FROM games WHERE hash IS NOT NULL')}
+
+    def max_game_id(self):
+        return self.conn.execute('SELECT MAX(game_id) FROM games').fetchone()[0] or 0
+
+    def query(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        columns = [description[0] for description in cursor.description or []]
+        return columns, cursor.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a SQL query against the local box score database.')
+    parser.add_argument('sql', help="e.g. \"SELECT name, AVG(points) FROM players WHERE friendly = 1 GROUP BY name\"")
+    parser.add_argument('--database', default=DATABASE_PATH)
+    args = parser.parse_args()
+
+    store = SQLiteSink(args.database)
+    start = time.perf_counter()
+    try:
+        columns, rows = store.query(args.sql)
+    except sqlite3.Error as e:
+        print(f"Query failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    if columns:
+        print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join('' if value is None else str(value) for value in row))
+    print(f"{len(rows)} rows in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
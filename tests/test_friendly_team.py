@@ -0,0 +1,30 @@
+import builtins
+from automate_sheet import GameDataProcessor
+
+
+def answer_with(monkeypatch, answers):
+    answers = iter(answers)
+
+    def fake_input(prompt):
+        answer = next(answers, None)
+        if answer is None:
+            raise EOFError
+        return answer
+    monkeypatch.setattr(builtins, 'input', fake_input)
+
+
+def test_prompts_until_answer_is_a_team(monkeypatch):
+    answer_with(monkeypatch, ['', '3', 'team1', ' 2 '])
+    processor = GameDataProcessor([])
+    assert processor.choose_friendly_team([], 'Home', 'Away') == '2'
+
+
+def test_closed_input_sends_game_to_review(monkeypatch):
+    answer_with(monkeypatch, ['x'])
+    assert GameDataProcessor([]).choose_friendly_team([], 'Home', 'Away') is None
+
+
+def test_unattended_never_prompts(monkeypatch):
+    answer_with(monkeypatch, ['1'])
+    processor = GameDataProcessor([], unattended=True)
+    assert processor.choose_friendly_team([], 'Home', 'Away') is None
@@ -0,0 +1,79 @@
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import ocr_server
+
+
+class BusyThenOKHandler(BaseHTTPRequestHandler):
+    # Answers 503 to the first busy_answers requests, then echoes the size
+    busy_answers = 0
+    requests = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        type(self).requests += 1
+        if type(self).requests <= self.busy_answers:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            self.wfile.write(b'{"error": "server busy"}')
+            return
+        payload = json.dumps({'size': len(body)}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    BusyThenOKHandler.requests = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BusyThenOKHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def submit_args(url, images):
+    return argparse.Namespace(images=images, url=url, output=None, by_path=False)
+
+
+def test_submit_waits_out_busy_server(server, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(BusyThenOKHandler, 'busy_answers', 2)
+    image = tmp_path / 'box.png'
+    image.write_bytes(b'12345')
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    assert ocr_server.submit(submit_args(url, [str(image)])) == 0
+    captured = capsys.readouterr()
+    assert json.loads(captured.out) == {'size': 5}
+    assert captured.err.count('Server busy') == 2
+
+
+def test_submit_gives_up_when_always_busy(server, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(BusyThenOKHandler, 'busy_answers', 100)
+    image = tmp_path / 'box.png'
+    image.write_bytes(b'12345')
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    assert ocr_server.submit(submit_args(url, [str(image)])) == 1
+    assert BusyThenOKHandler.requests == ocr_server.SUBMIT_RETRIES + 1
+    assert '503' in capsys.readouterr().err
+
+
+def test_submit_reports_unreachable_server(server, tmp_path, capsys):
+    image = tmp_path / 'box.png'
+    image.write_bytes(b'12345')
+    port = server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    assert ocr_server.submit(submit_args(f'http://127.0.0.1:{port}', [str(image), str(image)])) == 1
+    err = capsys.readouterr().err
+    assert 'could not reach the OCR server' in err
+    assert 'Traceback' not in err
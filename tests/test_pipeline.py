@@ -0,0 +1,125 @@
+import os
+import json
+import pipeline
+from pipeline import Journal, Pipeline
+from storage import GAMES
+
+
+class FakeOCR:
+    def __init__(self, image_output_folder, broken):
+        self.image_output_folder = image_output_folder
+        self.broken = broken
+        self.read = []
+
+    @staticmethod
+    def list_images(input_folder):
+        return sorted(os.listdir(input_folder))
+
+    def process_image(self, path):
+        self.read.append(os.path.basename(path))
+        if path.endswith(self.broken):
+            raise RuntimeError('decoder error')
+        return {'players': [], 'hash': path}
+
+    @staticmethod
+    def write_results(image, results, folder):
+        with open(f'{folder}/{image}.json', 'w') as results_file:
+            json.dump(results, results_file)
+
+
+class FakeSink:
+    idempotent = True
+
+    def __init__(self):
+        self.rows = []
+
+    def write_row(self, table, row):
+        self.rows.append((table, row))
+
+    def flush(self):
+        pass
+
+
+class FakeGames:
+    def __init__(self):
+        self.sinks = [FakeSink()]
+        self.next_game_id = 1
+        self.existing_hashes = set()
+
+    def build_game_rows(self, game):
+        rows = [(GAMES, [self.next_game_id, game.hash])]
+        self.next_game_id += 1
+        return rows
+
+
+class RecordingJournal(Journal):
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.events = []
+
+    def append(self, event, **fields):
+        self.events.append({'event': event, **fields})
+        super().append(event, **fields)
+
+
+def make_folders(tmp_path, monkeypatch, images):
+    folders = {name: tmp_path / name for name in ('input', 'images', 'processed', 'review', 'review_images')}
+    for folder in folders.values():
+        folder.mkdir()
+    monkeypatch.setattr(pipeline, 'PROCESSED_FOLDER', str(folders['processed']))
+    monkeypatch.setattr(pipeline, 'REVIEW_FOLDER', str(folders['review']))
+    monkeypatch.setattr(pipeline, 'REVIEW_IMAGE_FOLDER', str(folders['review_images']))
+    for image in images:
+        (folders['input'] / image).write_bytes(b'')
+    return folders
+
+
+def test_failed_screenshot_goes_to_review_and_batch_continues(tmp_path, monkeypatch):
+    folders = make_folders(tmp_path, monkeypatch, ('a.png', 'b.png', 'c.png'))
+    games = FakeGames()
+    journal = RecordingJournal()
+    ocr = FakeOCR(str(folders['images']), broken='b.png')
+    states = Pipeline(ocr, games, journal, input_folder=str(folders['input'])).run()
+
+    assert [states[image]['status'] for image in ('a.png', 'b.png', 'c.png')] == ['staged', 'failed', 'staged']
+    assert [row[0] for _, row in games.sinks[0].rows] == [1, 2]
+    assert {'event': 'stage_failed', 'image': 'b.png', 'error': 'RuntimeError: decoder error'} in journal.events
+    assert sorted(os.listdir(folders['images'])) == ['a.png', 'c.png']
+    assert os.listdir(folders['review_images']) == ['b.png']
+    assert os.listdir(folders['input']) == []
+
+
+def test_resumed_run_does_not_retry_failed_screenshot(tmp_path, monkeypatch):
+    folders = make_folders(tmp_path, monkeypatch, ('b.png',))
+    journal_path = tmp_path / 'journal.jsonl'
+    journal_path.write_text(json.dumps({'event': 'stage_failed', 'image': 'b.png', 'error': 'RuntimeError'}) + '\n')
+    journal = Journal(str(journal_path))
+    ocr = FakeOCR(str(folders['images']), broken='b.png')
+    states = Pipeline(ocr, FakeGames(), journal, input_folder=str(folders['input'])).run()
+    journal.close()
+
+    assert ocr.read == []
+    assert states['b.png']['status'] == 'failed'
+    assert os.listdir(folders['review_images']) == ['b.png']
+    assert journal_path.read_text() == ''
+
+
+class DerivingOCR(FakeOCR):
+    def process_image(self, path):
+        results = super().process_image(path)
+        if path.endswith('derived.png'):
+            results['validation'] = {'violations': [], 'corrections': {
+                'player3_points': {'from': '12', 'to': '14', 'source': 'derived'}}}
+        return results
+
+
+def test_derived_points_send_the_game_to_review(tmp_path, monkeypatch):
+    folders = make_folders(tmp_path, monkeypatch, ('derived.png', 'read.png'))
+    games = FakeGames()
+    ocr = DerivingOCR(str(folders['images']), broken='none')
+    states = Pipeline(ocr, games, RecordingJournal(), input_folder=str(folders['input'])).run()
+
+    assert states['derived.png']['status'] == 'review'
+    assert states['read.png']['status'] == 'staged'
+    assert [row[1] for _, row in games.sinks[0].rows] == [os.path.join(str(folders['input']), 'read.png')]
+    assert os.listdir(folders['review']) == ['derived.png.json']
@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+from automate_2k import MAT_MAX_CHANNELS, OCRProcessor
+
+
+@pytest.mark.parametrize('cells', [1, MAT_MAX_CHANNELS // 3, MAT_MAX_CHANNELS // 3 + 1, 200])
+def test_stacked_preprocessing_matches_per_cell(cells):
+    rng = np.random.default_rng(cells)
+    crops = [rng.integers(0, 256, (18, 40, 3), dtype=np.uint8) for _ in range(cells)] + \
+            [rng.integers(0, 256, (18, 120, 3), dtype=np.uint8)]
+    names = [f'player{index}_points' for index in range(cells)] + ['player1_name']
+    processed = OCRProcessor(validate=False).preprocess_regions(crops, names)
+    for crop, name, image in zip(crops, names, processed):
+        np.testing.assert_array_equal(image, OCRProcessor.preprocess_region(crop, name))
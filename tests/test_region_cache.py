@@ -0,0 +1,30 @@
+import json
+import ocr_cache
+from ocr_cache import REGION_CACHE_VERSION, RegionCache
+
+
+def test_saves_every_interval_and_on_request(tmp_path):
+    path = tmp_path / 'regions.json'
+    cache = RegionCache(str(path), save_interval=3)
+    for image in range(2):
+        cache.put(f'key{image}', [str(image)])
+        cache.checkpoint()
+    assert not path.exists()
+    cache.put('key2', ['2'])
+    cache.checkpoint()
+    assert len(json.loads(path.read_text())['entries']) == 3
+
+    cache.put('key3', ['3'])
+    cache.checkpoint()
+    cache.save()
+    assert RegionCache(str(path)).get('key3') == ['3']
+
+
+def test_result_cache_version_does_not_invalidate_regions(tmp_path, monkeypatch):
+    path = tmp_path / 'regions.json'
+    cache = RegionCache(str(path))
+    cache.put('key', ['12'])
+    cache.save()
+    monkeypatch.setattr(ocr_cache, 'RESULT_CACHE_VERSION', ocr_cache.RESULT_CACHE_VERSION + 1)
+    assert RegionCache(str(path)).get('key') == ['12']
+    assert json.loads(path.read_text())['version'] == REGION_CACHE_VERSION
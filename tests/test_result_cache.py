@@ -0,0 +1,61 @@
+import copy
+import random
+import cv2
+import numpy as np
+import pytest
+from automate_2k import OCRProcessor
+from generate_boxscores import random_game, render_boxscore
+from ocr_cache import ResultCache, scoreboard_thumbnails
+
+# Screenshots are rendered at the layout's reference size (3840x2160) and
+# cached as a 1080p PNG
+
+
+@pytest.fixture(scope='module')
+def processor():
+    return OCRProcessor(validate=False)
+
+
+@pytest.fixture(scope='module')
+def game():
+    return random_game(random.Random(7))
+
+
+def capture(processor, reference, size=(1920, 1080), quality=0, shift=(0, 0)):
+    image = cv2.resize(reference, size, interpolation=cv2.INTER_AREA)
+    if shift != (0, 0):
+        matrix = np.float32([[1, 0, shift[0]], [0, 1, shift[1]]])
+        image = cv2.warpAffine(image, matrix, size, borderMode=cv2.BORDER_REPLICATE)
+    if quality:
+        image = cv2.imdecode(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+    cropped_images, _ = processor.crop_and_save_regions(image)
+    return scoreboard_thumbnails(cropped_images)
+
+
+def cache_with(processor, tmp_path, reference):
+    cache = ResultCache('layout', cache_folder=str(tmp_path))
+    cache.put('original', capture(processor, reference), {'hash': 'original'})
+    return cache
+
+
+@pytest.mark.parametrize('copy_kwargs', [
+    {'quality': 60},
+    {'quality': 40},
+    {'shift': (1, 1)},
+    {'size': (2560, 1440)},
+    {'size': (3840, 2160), 'quality': 85},
+], ids=['jpeg60', 'jpeg40', 'shift1', 'capture1440', 'capture2160'])
+def test_copies_of_a_box_score_hit(processor, game, tmp_path, copy_kwargs):
+    reference = render_boxscore(game, processor.layout)
+    cache = cache_with(processor, tmp_path, reference)
+    assert cache.get_similar(capture(processor, reference, **copy_kwargs)) == {'hash': 'original'}
+
+
+@pytest.mark.parametrize('old, new', [('5', '8'), ('8', '0'), ('1', '7'), ('3', '8'), ('6', '8'), ('9', '8')])
+def test_a_changed_digit_misses(processor, game, tmp_path, old, new):
+    original, edited = copy.deepcopy(game), copy.deepcopy(game)
+    original['players'][0]['points'] = f'1{old}'
+    edited['players'][0]['points'] = f'1{new}'
+    cache = cache_with(processor, tmp_path, render_boxscore(original, processor.layout))
+    for copy_kwargs in ({}, {'quality': 85}, {'size': (2560, 1440)}):
+        assert cache.get_similar(capture(processor, render_boxscore(edited, processor.layout), **copy_kwargs)) is None
@@ -0,0 +1,38 @@
+import season_stats
+from season_stats import PLAYER_INDEX, SeasonStats
+from storage import FRIENDLY_PLAYERS, OPPONENT_PLAYERS, PLAYER_COLUMNS
+
+
+def player_row(game, name, points, result, matchup=''):
+    row = [''] * len(PLAYER_COLUMNS)
+    row[PLAYER_INDEX['name']] = name
+    row[PLAYER_INDEX['points']] = points
+    row[PLAYER_INDEX['result']] = result
+    row[PLAYER_INDEX['matchup']] = matchup
+    row[PLAYER_INDEX['hash']] = f'hash{game}'
+    return row
+
+
+def test_same_name_on_both_sides_is_kept_apart():
+    stats = SeasonStats(None)
+    stats.write_row(FRIENDLY_PLAYERS, player_row(1, 'ai player', 20, 'W', 'cpu guard'))
+    stats.write_row(OPPONENT_PLAYERS, player_row(1, 'cpu guard', 8, 'L', 'ai player'))
+    stats.write_row(OPPONENT_PLAYERS, player_row(2, 'ai player', 30, 'W', 'cpu guard'))
+    stats.flush()
+
+    assert stats.players.get('friendly\tai player')['points'] == 20
+    assert stats.players.get('opponent\tai player')['points'] == 30
+    keys, summary = stats.player_summary(friendly_only=True)
+    assert keys == ['friendly\tai player']
+    keys, _ = stats.matchup_summary('ai player')
+    assert keys == ['friendly\tai player\tcpu guard', 'opponent\tai player\tcpu guard']
+
+
+def test_files_from_before_sided_player_keys_are_outdated(tmp_path, monkeypatch):
+    path = str(tmp_path / 'season_stats.npz')
+    stats = SeasonStats(path)
+    stats.write_row(FRIENDLY_PLAYERS, player_row(1, 'ai player', 20, 'W'))
+    stats.flush()
+    assert not SeasonStats(path).outdated
+    monkeypatch.setattr(season_stats, 'STATS_VERSION', season_stats.STATS_VERSION + 1)
+    assert SeasonStats(path).outdated
@@ -0,0 +1,52 @@
+from automate_sheet import SheetWriteBuffer
+from fake_sheets import FakeWorksheet
+
+
+def make_buffer(max_rows, held=()):
+    appended = []
+
+    def append_rows(sheet, rows):
+        appended.append((sheet.title, len(rows)))
+        sheet.append_rows(rows)
+
+    return SheetWriteBuffer(append_rows, max_rows=max_rows, held=held), appended
+
+
+def test_flushes_early_at_max_rows():
+    buffer, appended = make_buffer(max_rows=3)
+    sheet = FakeWorksheet('F DB')
+    for row in range(7):
+        buffer.add(sheet, [row])
+    assert appended == [('F DB', 3), ('F DB', 3)]
+    buffer.flush()
+    assert appended[-1] == ('F DB', 1)
+    assert sheet.rows == [[row] for row in range(7)]
+
+
+def test_one_append_per_worksheet_in_first_written_order():
+    buffer, appended = make_buffer(max_rows=100)
+    sheets = [FakeWorksheet(title) for title in ('O DB', 'F DB', 'GAME DB')]
+    for row in range(4):
+        for sheet in sheets:
+            buffer.add(sheet, [sheet.title, row])
+    buffer.flush()
+    assert appended == [('O DB', 4), ('F DB', 4), ('GAME DB', 4)]
+    assert all(sheet.calls == {'append_rows': 1} for sheet in sheets)
+
+    buffer.flush()
+    assert len(appended) == 3
+
+
+def test_held_worksheet_waits_for_full_flush():
+    buffer, appended = make_buffer(max_rows=2, held=('GAME DB',))
+    players, games = FakeWorksheet('F DB'), FakeWorksheet('GAME DB')
+    for row in range(3):
+        buffer.add(players, [row])
+        buffer.add(games, [row])
+    assert appended == [('F DB', 2)]
+    buffer.flush(held=False)
+    assert appended == [('F DB', 2), ('F DB', 1)]
+    assert games.rows == []
+    buffer.flush()
+    assert appended[2:] == [('GAME DB', 2), ('GAME DB', 1)]
+    assert games.rows == [[row] for row in range(3)]
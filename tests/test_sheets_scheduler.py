@@ -0,0 +1,140 @@
+import threading
+import time
+import pytest
+from gspread.exceptions import APIError
+import automate_sheet
+import fake_sheets
+from automate_sheet import SheetsScheduler, TokenBucket
+from fake_sheets import FakeQuota, FakeResponse, FakeWorksheet
+
+
+class FakeClock:
+    # Stands in for the time module; sleeping only moves the clock
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(automate_sheet, 'time', clock)
+    monkeypatch.setattr(fake_sheets, 'time', clock)
+    # Take the longest backoff instead of a random one
+    monkeypatch.setattr(automate_sheet.random, 'uniform', lambda low, high: high)
+    return clock
+
+
+def failing(status_code, times):
+    calls = []
+
+    def func():
+        calls.append(status_code)
+        if len(calls) <= times:
+            raise APIError(FakeResponse(status_code, 'error'))
+        return len(calls)
+    return func, calls
+
+
+def test_token_bucket_bursts_then_blocks_until_refilled(clock):
+    bucket = TokenBucket(600)
+    assert [bucket.acquire() for _ in range(60)] == [0.0] * 60
+    assert bucket.acquire() == pytest.approx(1 / 9)
+    clock.now += 10.0
+    assert bucket.acquire() == 0.0
+
+
+def test_token_bucket_stays_under_quota_in_any_window(clock):
+    # A burst of 12 and a refill of one token a second
+    bucket = TokenBucket(72, burst=12)
+    times = []
+    for _ in range(300):
+        bucket.acquire()
+        times.append(clock.now)
+    for index, start in enumerate(times):
+        in_window = sum(1 for moment in times[index:] if moment - start < 60.0)
+        assert in_window <= 72
+    assert times[-1] == 288.0
+
+
+def test_call_retries_429_from_quota(clock):
+    scheduler = SheetsScheduler(read_per_minute=6000, write_per_minute=6000, base_delay=1.0)
+    sheet = FakeWorksheet('F DB', quota=FakeQuota(requests_per_window=2, window_seconds=1.0))
+    for row in range(3):
+        scheduler.call('write', sheet.append_rows, [[row]])
+    scheduler.shutdown()
+    assert sheet.rows == [[0], [1], [2]]
+    assert clock.sleeps == [1.0]
+    assert scheduler.stats()['retries'] == 1
+
+
+def test_call_backs_off_exponentially_up_to_max_delay(clock):
+    scheduler = SheetsScheduler(read_per_minute=6000, write_per_minute=6000, max_retries=6,
+                                base_delay=1.0, max_delay=8.0)
+    func, calls = failing(503, times=5)
+    assert scheduler.call('read', func) == 6
+    scheduler.shutdown()
+    assert clock.sleeps == [1.0, 2.0, 4.0, 8.0, 8.0]
+
+
+def test_call_gives_up_after_max_retries(clock):
+    scheduler = SheetsScheduler(max_retries=3, base_delay=1.0)
+    func, calls = failing(429, times=10)
+    with pytest.raises(Exception, match='Max retries exceeded'):
+        scheduler.call('write', func)
+    scheduler.shutdown()
+    assert len(calls) == 3
+    assert scheduler.stats()['failures'] == 1
+
+
+def test_call_does_not_retry_other_errors(clock):
+    scheduler = SheetsScheduler()
+    func, calls = failing(400, times=1)
+    with pytest.raises(APIError):
+        scheduler.call('write', func)
+    scheduler.shutdown()
+    assert calls == [400]
+    assert clock.sleeps == []
+
+
+def test_submit_keeps_per_key_order():
+    scheduler = SheetsScheduler(read_per_minute=60000, write_per_minute=60000, workers=4)
+    order = {'F DB': [], 'O DB': [], 'GAME DB': []}
+    running = {key: threading.Lock() for key in order}
+
+    def record(key, index):
+        # Fails if two calls for the same key overlap
+        assert running[key].acquire(blocking=False)
+        time.sleep(0.001)
+        order[key].append(index)
+        running[key].release()
+
+    for index in range(20):
+        for key in order:
+            scheduler.submit(key, 'write', record, key, index)
+    scheduler.wait()
+    scheduler.shutdown()
+    assert all(indexes == list(range(20)) for indexes in order.values())
+
+
+def test_wait_reraises_first_error():
+    scheduler = SheetsScheduler(read_per_minute=6000, write_per_minute=6000)
+    sheet = FakeWorksheet('F DB')
+    func, calls = failing(400, times=1)
+    scheduler.submit('F DB', 'write', sheet.append_rows, [[1]])
+    scheduler.submit('O DB', 'write', func)
+    with pytest.raises(APIError):
+        scheduler.wait()
+    assert sheet.rows == [[1]]
+    # The error is reported once
+    scheduler.submit('F DB', 'write', sheet.append_rows, [[2]])
+    scheduler.wait()
+    scheduler.shutdown()
+    assert sheet.rows == [[1], [2]]
@@ -0,0 +1,59 @@
+import pytest
+from gspread.exceptions import APIError
+from automate_sheet import F_DB_SHEET, GAME_DB_SHEET, O_DB_SHEET, GameIndex, SheetsScheduler, SheetsSink
+from fake_sheets import FakeResponse, FakeSheetsClient
+from storage import FRIENDLY_PLAYERS, GAMES, OPPONENT_PLAYERS
+
+
+def failing_append_rows(values, **kwargs):
+    raise APIError(FakeResponse(429, 'Quota exceeded for write requests'))
+
+
+def make_sink(max_rows=None):
+    client = FakeSheetsClient(headers={GAME_DB_SHEET: ['GameID']})
+    scheduler = SheetsScheduler(read_per_minute=6000, write_per_minute=6000, max_retries=2, base_delay=0.0)
+    sink = SheetsSink(client, GameIndex(':memory:'), scheduler)
+    if max_rows is not None:
+        sink.write_buffer.max_rows = max_rows
+    return sink, client, scheduler
+
+
+def write_games(sink, count):
+    for game_id in range(1, count + 1):
+        for player in range(5):
+            sink.write_row(FRIENDLY_PLAYERS, [game_id, 'f', player])
+            sink.write_row(OPPONENT_PLAYERS, [game_id, 'o', player])
+        sink.write_row(GAMES, [game_id, f'hash{game_id}'])
+
+
+def test_game_rows_follow_player_rows():
+    sink, client, scheduler = make_sink()
+    write_games(sink, 3)
+    sink.flush()
+    scheduler.shutdown()
+    assert len(client.get_sheet(F_DB_SHEET).rows) == 15
+    assert len(client.get_sheet(O_DB_SHEET).rows) == 15
+    assert client.get_sheet(GAME_DB_SHEET).rows[1:] == [[1, 'hash1'], [2, 'hash2'], [3, 'hash3']]
+
+
+@pytest.mark.parametrize('max_rows', [None, 2])
+def test_failed_player_rows_hold_back_game_rows(max_rows):
+    sink, client, scheduler = make_sink(max_rows)
+    client.get_sheet(F_DB_SHEET).append_rows = failing_append_rows
+    write_games(sink, 3)
+    with pytest.raises(Exception):
+        sink.flush()
+    scheduler.shutdown()
+    assert client.get_sheet(F_DB_SHEET).rows == []
+    # The games were not recorded as uploaded, so the next run sends them again
+    assert client.get_sheet(GAME_DB_SHEET).rows == [['GameID']]
+    assert sink.hashes() == set()
+
+
+def test_held_worksheet_is_chunked_on_flush():
+    sink, client, scheduler = make_sink(max_rows=2)
+    write_games(sink, 5)
+    sink.flush()
+    scheduler.shutdown()
+    assert len(client.get_sheet(GAME_DB_SHEET).rows) == 6
+    assert client.call_counts()[GAME_DB_SHEET]['append_rows'] == 3
@@ -0,0 +1,7 @@
+import argparse
+import automate
+
+
+def test_light_modules_start_within_budget(capsys):
+    status = automate.startup(argparse.Namespace(budget=automate.STARTUP_BUDGET_SECONDS))
+    assert status == 0, capsys.readouterr().out
@@ -0,0 +1,22 @@
+import automate_2k
+from automate_2k import OCRProcessor
+from validation import derived_cells
+
+
+def corrected(**sources):
+    return {'validation': {'violations': [], 'corrections': {
+        cell: {'from': '1', 'to': '2', 'source': source} for cell, source in sources.items()}}}
+
+
+def test_derived_cells_lists_only_derived_corrections():
+    assert derived_cells({}) == []
+    assert derived_cells(corrected(player2_points='reread', team1_q1='reread')) == []
+    assert derived_cells(corrected(player7_points='derived', player2_points='derived', player1_points='reread')) == \
+        ['player2_points', 'player7_points']
+
+
+def test_results_with_derived_points_go_to_review(tmp_path, monkeypatch):
+    review_folder = str(tmp_path / 'review')
+    monkeypatch.setattr(automate_2k, 'REVIEW_FOLDER', review_folder)
+    assert OCRProcessor.results_folder('a.png', corrected(player1_points='reread'), 'out') == 'out'
+    assert OCRProcessor.results_folder('a.png', corrected(player1_points='derived'), 'out') == review_folder
@@ -0,0 +1,177 @@
+from itertools import product
+
+# Box scores repeat a lot of information, so most misreads break an identity:
+#   points = 2*FGM + 3PM + FTM (FGM includes the threes)
+#   FGM <= FGA, 3PM <= 3PA, FTM <= FTA, 3PM <= FGM, 3PA <= FGA
+#   the four quarter scores of a team add up to its players' points, or to
+#   less after overtime (when both teams' quarters add up to the same score)
+# Cell values are tuples parsed from the OCR text: (made, attempted) for the
+# shooting cells, (value,) for everything else, or None when unreadable.
+
+TEAM_PLAYERS = {'team1': range(1, 6), 'team2': range(6, 11)}
+QUARTERS = range(1, 5)
+SHOOTING_CELLS = ('FGMFGA', '3PM3PA', 'FTMFTA')
+CHECKED_CELLS = ('points',) + SHOOTING_CELLS
+PLAYER_FIELDS = ('name', 'grade', 'points', 'rebounds', 'assists', 'steals', 'blocks', 'fouls', 'tos',
+                 'FGM', 'FGA', '3PM', '3PA', 'FTM', 'FTA')
+# Most suspect cells re-read per round, repair rounds per image, values kept
+# per cell (the original read included), and most candidate combinations tried
+MAX_REPAIR_CELLS = 6
+REPAIR_ROUNDS = 2
+MAX_CANDIDATES = 4
+MAX_COMBINATIONS = 4096
+
+
+def parse_cell(region_name, text):
+    text = text.strip()
+    if region_name.endswith(SHOOTING_CELLS):
+        parts = text.split('/')
+        if len(parts) != 2 or not all(part.isdigit() for part in parts):
+            return None
+        return int(parts[0]), int(parts[1])
+    if text == '':
+        return (0,)
+    return (int(text),) if text.isdigit() else None
+
+
+def format_cell(value):
+    return '/'.join(str(part) for part in value)
+
+
+def checked_regions():
+    regions = [f'player{number}_{stat}' for number in range(1, 11) for stat in CHECKED_CELLS]
+    regions += [f'{team}_q{quarter}' for team in TEAM_PLAYERS for quarter in QUARTERS]
+    return regions
+
+
+def find_violations(values):
+    # [(description, cells involved)]
+    violations = []
+    unconfirmed = set()
+    for number in range(1, 11):
+        cells = {stat: f'player{number}_{stat}' for stat in CHECKED_CELLS}
+        for cell in cells.values():
+            if values.get(cell) is None:
+                violations.append((f'{cell} is unreadable', (cell,)))
+        points, fg, three, ft = (values.get(cells[stat]) for stat in CHECKED_CELLS)
+
+        for value, stat, label in ((fg, 'FGMFGA', 'FGM > FGA'), (three, '3PM3PA', '3PM > 3PA'), (ft, 'FTMFTA', 'FTM > FTA')):
+            if value is not None and value[0] > value[1]:
+                violations.append((f'player{number} {label}', (cells[stat],)))
+        if fg is not None and three is not None:
+            if three[0] > fg[0]:
+                violations.append((f'player{number} 3PM > FGM', (cells['FGMFGA'], cells['3PM3PA'])))
+            if three[1] > fg[1]:
+                violations.append((f'player{number} 3PA > FGA', (cells['FGMFGA'], cells['3PM3PA'])))
+        if None in (points, fg, three, ft) or points[0] != 2 * fg[0] + three[0] + ft[0]:
+            unconfirmed.add(cells['points'])
+            if None not in (points, fg, three, ft):
+                violations.append((f'player{number} points != 2*FGM + 3PM + FTM', tuple(cells.values())))
+
+    totals = {}
+    for team, numbers in TEAM_PLAYERS.items():
+        quarter_cells = [f'{team}_q{quarter}' for quarter in QUARTERS]
+        point_cells = [f'player{number}_points' for number in numbers]
+        quarters = [values.get(cell) for cell in quarter_cells]
+        points = [values.get(cell) for cell in point_cells]
+        if None in quarters:
+            violations += [(f'{cell} is unreadable', (cell,)) for cell, value in zip(quarter_cells, quarters)
+                           if value is None]
+        elif None not in points:
+            # Points cells that agree with their own shooting line are not to blame
+            suspects = quarter_cells + [cell for cell in point_cells if cell in unconfirmed]
+            totals[team] = (sum(q[0] for q in quarters), sum(p[0] for p in points), tuple(suspects))
+    # Overtime points are in the players' totals but not in the four quarter
+    # cells. A game only goes to overtime from a tie, so players outscoring
+    # the quarters is fine when both teams' quarters add up to the same score.
+    overtime = len(totals) == len(TEAM_PLAYERS) and len({quarters for quarters, _, _ in totals.values()}) == 1
+    for team, (quarters, points, suspects) in totals.items():
+        if quarters > points or (quarters < points and not overtime):
+            violations.append((f'{team} quarters != sum of player points', suspects))
+    return violations
+
+
+def result_values(results):
+    # Cell values back from a formatted *_results.json, for checking files
+    # that were already written
+    values = {}
+    for player in results.get('players', []):
+        prefix = f"player{player.get('player_number')}_"
+        values[prefix + 'points'] = parse_cell('points', str(player.get('points', '')))
+        for stat, (made, attempted) in zip(SHOOTING_CELLS, (('FGM', 'FGA'), ('3PM', '3PA'), ('FTM', 'FTA'))):
+            values[prefix + stat] = parse_cell(stat, f"{player.get(made, '')}/{player.get(attempted, '')}")
+    for team in TEAM_PLAYERS:
+        quarters = results.get('teams', {}).get(f'{team}_quarters', {})
+        for quarter in QUARTERS:
+            values[f'{team}_q{quarter}'] = parse_cell('quarter', str(quarters.get(f'quarter_{quarter}', '')))
+    return values
+
+
+def result_problems(results):
+    # Everything wrong with a formatted result: missing fields first, then
+    # the arithmetic checks
+    problems = []
+    numbers = sorted(player.get('player_number') for player in results.get('players', []))
+    if numbers != list(range(1, 11)):
+        problems.append(f'expected players 1-10, found {numbers}')
+    for player in results.get('players', []):
+        missing = [field for field in PLAYER_FIELDS if field not in player]
+        if missing:
+            problems.append(f"player{player.get('player_number')} is missing {', '.join(missing)}")
+    for team in TEAM_PLAYERS:
+        if len(results.get('teams', {}).get(f'{team}_quarters', {})) != len(QUARTERS):
+            problems.append(f'{team} does not have {len(QUARTERS)} quarters')
+    if not results.get('hash'):
+        problems.append('no hash')
+    return problems + [description for description, _ in find_violations(result_values(results))]
+
+
+def rank_suspects(violations):
+    # A cell is more suspect the more violations it is part of, and the
+    # fewer other cells share the blame for each
+    scores = {}
+    for _, cells in violations:
+        for cell in cells:
+            scores[cell] = scores.get(cell, 0.0) + 1.0 / len(cells)
+    return sorted(scores, key=lambda cell: scores[cell], reverse=True)
+
+
+def derived_points(cell, values):
+    # What a points cell has to be for the shooting line of its row to add up.
+    # Quarters are never derived: overtime points are in the players' totals
+    # but not in the four quarter cells.
+    prefix = cell[:-len('points')]
+    fg, three, ft = (values.get(prefix + stat) for stat in SHOOTING_CELLS)
+    if None in (fg, three, ft):
+        return None
+    return (2 * fg[0] + three[0] + ft[0],)
+
+
+def derived_cells(results):
+    # Points cells of a formatted result that were filled in from their
+    # shooting line instead of read. The shooting line may be the misread
+    # one, so a person checks these games before they are logged.
+    corrections = results.get('validation', {}).get('corrections', {})
+    return sorted(cell for cell, correction in corrections.items() if correction['source'] == 'derived')
+
+
+def best_combination(values, candidates):
+    # candidates: {cell: [(value, cost, source), ...]} with the current value
+    # first at cost 0. Returns {cell: (value, source)} for the combination
+    # with the fewest violations, then the lowest cost.
+    cells = list(candidates)
+    best_score = (len(find_violations(values)), 0)
+    best_choice = {}
+    for tried, choice in enumerate(product(*(range(len(candidates[cell])) for cell in cells))):
+        if tried >= MAX_COMBINATIONS:
+            break
+        trial = dict(values)
+        cost = 0
+        for cell, option in zip(cells, choice):
+            trial[cell] = candidates[cell][option][0]
+            cost += candidates[cell][option][1]
+        score = (len(find_violations(trial)), cost)
+        if score < best_score:
+            best_score = score
+            best_choice = {cell: candidates[cell][option] for cell, option in zip(cells, choice) if option}
+    return {cell: (value, source) for cell, (value, _, source) in best_choice.items()}
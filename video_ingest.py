@@ -0,0 +1,227 @@
+import os
+import bisect
+import logging
+import numpy as np
+import cv2
+
+VIDEO_INPUT_FOLDER = './toProcess/videos/'
+VIDEO_OUTPUT_FOLDER = './processed/videos/'
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm')
+
+# Scoreboard area thumbnail used to recognize and compare frames (width, height)
+SIGNATURE_SIZE = (160, 60)
+# Correlation with the template above which a frame counts as a box score
+MATCH_THRESHOLD = 0.75
+# Mean absolute thumbnail difference (0-255) below which two samples are the
+# same still screen, and above which the box score on screen has changed
+STABLE_THRESHOLD = 3.0
+CHANGE_THRESHOLD = 12.0
+# Seconds between sampled frames while looking for a box score, and while on one
+SCAN_INTERVAL = 2.0
+SEGMENT_INTERVAL = 0.25
+# A box score has to stay on screen this long to be used
+MIN_SEGMENT_SECONDS = 1.0
+MAX_TEMPLATE_IMAGES = 50
+# OpenCV's FFmpeg backend seeks to the last keyframe at least this many
+# frames before the target and decodes forward from there
+SEEK_PREROLL_FRAMES = 16
+
+
+def scoreboard_bounds(boxes):
+    # Smallest (left, upper, right, lower) rectangle around every region
+    boxes = np.array(boxes)
+    return boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max()
+
+
+def frame_signature(frame, bounds):
+    left, upper, right, lower = bounds
+    gray = cv2.cvtColor(frame[upper:lower, left:right], cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def sharpness(frame, bounds):
+    # Variance of the Laplacian over the scoreboard; motion blur and
+    # mid-transition frames score low
+    left, upper, right, lower = bounds
+    gray = cv2.cvtColor(frame[upper:lower, left:right], cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+class BoxScoreTemplate:
+    # Average scoreboard thumbnail of known box-score screenshots. The text
+    # changes from game to game and averages out; the panel, row bands and
+    # headers that every box score shares remain.
+    def __init__(self, signature):
+        centered = signature - signature.mean()
+        self.signature = centered / (np.linalg.norm(centered) or 1.0)
+
+    @classmethod
+    def from_images(cls, image_paths, region_boxes):
+        signatures = []
+        for path in image_paths[:MAX_TEMPLATE_IMAGES]:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            height, width = image.shape[:2]
+            signatures.append(frame_signature(image, scoreboard_bounds(region_boxes(width, height))))
+        if not signatures:
+            raise ValueError('No readable box score screenshots to build the video template from')
+        return cls(np.mean(signatures, axis=0))
+
+    def match(self, signature):
+        centered = signature - signature.mean()
+        norm = np.linalg.norm(centered)
+        if norm == 0:
+            return 0.0
+        return float((centered / norm * self.signature).sum())
+
+
+class VideoScanner:
+    # Streams a recording and yields the sharpest still frame of every box
+    # score shown in it. While looking for a box score the scanner seeks from
+    # sample to sample whenever that decodes fewer frames than stepping
+    # through them; once a sample shows a box score it goes back over the gap
+    # and steps frame by frame, and at most one frame per box score is kept.
+    def __init__(self, template, region_boxes, scan_interval=SCAN_INTERVAL, segment_interval=SEGMENT_INTERVAL,
+                 min_segment_seconds=MIN_SEGMENT_SECONDS, match_threshold=MATCH_THRESHOLD):
+        self.template = template
+        self.region_boxes = region_boxes
+        self.scan_interval = scan_interval
+        self.segment_interval = segment_interval
+        self.min_segment_seconds = min_segment_seconds
+        self.match_threshold = match_threshold
+
+    @staticmethod
+    def list_videos(input_folder):
+        return [filename for filename in sorted(os.listdir(input_folder))
+                if filename.lower().endswith(VIDEO_EXTENSIONS)]
+
+    @staticmethod
+    def keyframes(video_path):
+        # Keyframe indices from the packet flags; packets are only demuxed,
+        # not decoded. None when the backend can't return raw packets.
+        capture = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+        try:
+            if not capture.isOpened() or not capture.set(cv2.CAP_PROP_FORMAT, -1):
+                return None
+            keyframes = []
+            index = 0
+            while capture.grab():
+                if capture.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    keyframes.append(index)
+                index += 1
+            return keyframes or None
+        finally:
+            capture.release()
+
+    @staticmethod
+    def seek_is_cheaper(position, target, keyframes):
+        # A seek decodes from the keyframe it lands on; it only saves work when
+        # that keyframe lies past the frame a grab would start from
+        if keyframes is None:
+            return False
+        landing = bisect.bisect_right(keyframes, target - SEEK_PREROLL_FRAMES) - 1
+        return landing >= 0 and keyframes[landing] > position
+
+    def finish_segment(self, segment):
+        if segment['best_frame'] is None:
+            return None
+        if segment['end'] - segment['start'] < self.min_segment_seconds:
+            logging.info(f"Skipping box score at {segment['start']:.1f}s, on screen for under "
+                         f"{self.min_segment_seconds}s")
+            return None
+        return segment['best_time'], segment['best_frame']
+
+    def box_score_frames(self, video_path):
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise ValueError(f'Could not open video {video_path}')
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        scan_step = max(1, round(fps * self.scan_interval))
+        segment_step = max(1, round(fps * self.segment_interval))
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        keyframes = self.keyframes(video_path) if scan_step > segment_step else None
+
+        bounds = None
+        segment = None
+        # position is the index of the frame the next read returns
+        position = next_sample = 0
+        # Last sample without a box score, and a box score found past a gap
+        # that is being stepped up to
+        last_miss = candidate = None
+        sampled = seeks = 0
+        try:
+            while True:
+                if next_sample < position or self.seek_is_cheaper(position, next_sample, keyframes):
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, next_sample)
+                    position = next_sample
+                    seeks += 1
+                while position < next_sample and capture.grab():
+                    # Skipped frames are demuxed and decoded but never converted or copied
+                    position += 1
+                if position < next_sample:
+                    break
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                frame_index = position
+                timestamp = frame_index / fps
+                position += 1
+                sampled += 1
+
+                if bounds is None or bounds[0] != frame.shape[:2]:
+                    height, width = frame.shape[:2]
+                    bounds = (frame.shape[:2], scoreboard_bounds(self.region_boxes(width, height)))
+                signature = frame_signature(frame, bounds[1])
+
+                if self.template.match(signature) < self.match_threshold:
+                    if segment is not None:
+                        result = self.finish_segment(segment)
+                        if result is not None:
+                            yield result
+                        segment = None
+                    last_miss = frame_index
+                    if candidate is not None and frame_index < candidate:
+                        next_sample = frame_index + segment_step
+                    else:
+                        candidate = None
+                        next_sample = frame_index + scan_step
+                    continue
+
+                if segment is None and candidate is None and last_miss is not None \
+                        and frame_index - last_miss > segment_step:
+                    # The box score came up somewhere in the gap; step through
+                    # it so the segment starts where the box score does
+                    candidate = frame_index
+                    next_sample = last_miss + segment_step
+                    continue
+                candidate = None
+
+                difference = None
+                if segment is not None:
+                    difference = np.abs(signature - segment['previous']).mean()
+                    if difference > CHANGE_THRESHOLD:
+                        # A different box score replaced the one on screen
+                        result = self.finish_segment(segment)
+                        if result is not None:
+                            yield result
+                        segment = None
+                if segment is None:
+                    segment = {'start': timestamp, 'end': timestamp, 'previous': signature,
+                               'best_frame': None, 'best_time': None, 'best_sharpness': -1.0}
+                elif difference < STABLE_THRESHOLD:
+                    frame_sharpness = sharpness(frame, bounds[1])
+                    if frame_sharpness > segment['best_sharpness']:
+                        segment.update(best_frame=frame, best_time=timestamp, best_sharpness=frame_sharpness)
+                segment['previous'] = signature
+                segment['end'] = timestamp
+                next_sample = frame_index + segment_step
+
+            if segment is not None:
+                result = self.finish_segment(segment)
+                if result is not None:
+                    yield result
+        finally:
+            capture.release()
+            logging.info(f'Sampled {sampled} of {frame_count} frames from {os.path.basename(video_path)} '
+                         f'({seeks} seeks)')